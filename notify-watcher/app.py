@@ -1,23 +1,38 @@
 #!/usr/bin/env python3
+import argparse
 import sys
 import json
 import threading
 import time
 import base64
-import requests
-from flask import Flask, request, jsonify
+import bisect
+import fnmatch
+import hashlib
+import heapq
+import os
+import queue
+import sqlite3
+import random
+import shutil
+import signal
+import re
+import uuid
+from collections import OrderedDict, deque
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
-from PyQt6.QtCore import QTimer
-from PyQt6.QtWidgets import (
-    QApplication, QMainWindow, QLabel, QWidget, QVBoxLayout, QHBoxLayout,
-    QListWidget, QPushButton, QDialog, QLineEdit, QComboBox, QFormLayout, QDialogButtonBox,
-    QInputDialog, QPlainTextEdit, QSpinBox
-)
 from urllib.parse import urlparse
 
+from screenshots import process_screenshot
+
 CONFIG_FILE = "notify-watcher/config.json"
 IGNORE_CONFIG_FILE = "notify-watcher/ignore.json"
+CONFIG_WATCH_INTERVAL = 1.0
+CONFIG_STREAM_HEARTBEAT = 25.0
 PENDING_RULE_FILE = "notify-watcher/pending_rule.json"
+SPOOL_DIR = "notify-watcher/spool"
+SPOOL_DB_FILE = os.path.join(SPOOL_DIR, "outbox.db")
+SPOOL_BLOB_DIR = os.path.join(SPOOL_DIR, "blobs")
+RULES_DB_FILE = "notify-watcher/rules.db"
 RULES_SCHEMA_VERSION = 2
 
 # --- Configuração ---
@@ -28,9 +43,81 @@ def _load_config():
     except (FileNotFoundError, json.JSONDecodeError):
         return {}
 
+def _config_int(key, default, minimum=0):
+    try:
+        return max(minimum, int(_config.get(key, default)))
+    except (TypeError, ValueError):
+        print(f"⚠️ Valor inválido para '{key}' em {CONFIG_FILE}; usando {default}.")
+        return default
+
+def _config_float(key, default, minimum=0.0):
+    try:
+        return max(minimum, float(_config.get(key, default)))
+    except (TypeError, ValueError):
+        print(f"⚠️ Valor inválido para '{key}' em {CONFIG_FILE}; usando {default}.")
+        return default
+
 _config = _load_config()
+if not isinstance(_config, dict):
+    _config = {}  # formato v1: o arquivo inteiro é a lista de regras
 NTFY_TOPIC = _config.get("ntfy_topic", "gemini-notify-r2d2-ax7b9")
+NTFY_BASE_URL = str(_config.get("ntfy_base_url") or "https://ntfy.sh").rstrip("/")
+NTFY_CONNECT_TIMEOUT = _config_float("ntfy_connect_timeout", 3.05, minimum=0.1)
+NTFY_READ_TIMEOUT = _config_float("ntfy_read_timeout", 15.0, minimum=0.1)
+NTFY_MAX_RETRIES = _config_int("ntfy_max_retries", 3)
+NTFY_RETRY_MAX_DELAY = _config_float("ntfy_retry_max_delay", 30.0)
+NTFY_BREAKER_THRESHOLD = _config_int("ntfy_breaker_threshold", 5, minimum=1)
+NTFY_BREAKER_COOLDOWN = _config_float("ntfy_breaker_cooldown", 30.0)
+# "single": mensagem e captura na mesma requisição; "split": duas requisições (modo antigo)
+NTFY_PUBLISH_MODE = str(_config.get("ntfy_publish_mode") or "single").lower()
 NOTIFICATION_METHOD = "ntfy"
+DELIVERY_WORKERS = _config_int("delivery_workers", 4, minimum=1)
+DELIVERY_QUEUE_SIZE = _config_int("delivery_queue_size", 1000, minimum=1)
+SPOOL_ENABLED = bool(_config.get("spool_enabled", True))
+SPOOL_MAX_BYTES = _config_int("spool_max_bytes", 256 * 1024 * 1024, minimum=1024 * 1024)
+SPOOL_REPLAY_INTERVAL = _config_float("spool_replay_interval", 5.0, minimum=0.5)
+SPOOL_REPLAY_MAX_DELAY = _config_float("spool_replay_max_delay", 300.0, minimum=0.5)
+SPOOL_MAX_AGE = _config_float("spool_max_age", 86400.0, minimum=60.0)
+# "waitress" (WSGI multi-thread de produção), "threaded" (Werkzeug com keep-alive) ou "dev"
+SERVER_MODE = str(_config.get("server_mode") or "waitress").lower()
+SERVER_HOST = str(_config.get("server_host") or "127.0.0.1")
+SERVER_PORT = _config_int("server_port", 3000, minimum=1)
+SERVER_THREADS = _config_int("server_threads", 32, minimum=1)
+SERVER_CONNECTION_LIMIT = _config_int("server_connection_limit", 200, minimum=1)
+SERVER_KEEPALIVE_TIMEOUT = _config_float("server_keepalive_timeout", 60.0, minimum=1.0)
+# Cada /config/stream aberto prende um thread do servidor; no waitress sempre sobra
+# uma reserva para /notify e /config, e os streams excedentes recebem 503.
+CONFIG_STREAM_MAX_CLIENTS = _config_int("config_stream_max_clients", 16)
+if SERVER_MODE == "waitress":
+    CONFIG_STREAM_MAX_CLIENTS = min(CONFIG_STREAM_MAX_CLIENTS, SERVER_THREADS - max(2, SERVER_THREADS // 4))
+CONFIG_STREAM_MAX_CLIENTS = max(0, CONFIG_STREAM_MAX_CLIENTS)
+CONFIG_STREAM_RETRY_MS = 60000
+MAX_REQUEST_BYTES = _config_int("max_request_bytes", 16 * 1024 * 1024, minimum=64 * 1024)
+NOTIFY_BATCH_MAX_ITEMS = _config_int("notify_batch_max_items", 200, minimum=1)
+SCREENSHOT_MAX_DIMENSION = _config_int("screenshot_max_dimension", 1600, minimum=64)
+SCREENSHOT_MAX_BYTES = _config_int("screenshot_max_bytes", 600 * 1024, minimum=16 * 1024)
+SCREENSHOT_QUALITY = _config_int("screenshot_quality", 80, minimum=10)
+SCREENSHOT_WORKERS = _config_int("screenshot_workers", 2)
+SCREENSHOT_TIMEOUT = _config_float("screenshot_timeout", 20.0, minimum=1.0)
+SCREENSHOT_CACHE_BYTES = _config_int("screenshot_cache_bytes", 64 * 1024 * 1024)
+SCREENSHOT_DEDUPE_WINDOW = _config_float("screenshot_dedupe_window", 300.0)
+SCREENSHOT_PHASH_DISTANCE = _config_int("screenshot_phash_distance", 6)
+PERSIST_PENDING_RULE = bool(_config.get("persist_pending_rule", True))
+COALESCE_WINDOW = _config_float("coalesce_window", 2.0)
+COALESCE_MAX_EVENTS = _config_int("coalesce_max_events", 20, minimum=2)
+DEDUPE_DBUS_TTL = _config_float("dedupe_dbus_ttl", 2.0)
+DEDUPE_HTTP_TTL = _config_float("dedupe_http_ttl", 30.0)
+DEDUPE_MAX_ENTRIES = _config_int("dedupe_max_entries", 4096, minimum=16)
+DBUS_BACKEND = str(_config.get("dbus_backend") or "auto").lower()
+if DBUS_BACKEND not in ("auto", "gio", "dbus-python"):
+    print(f"⚠️ Valor inválido para 'dbus_backend' em {CONFIG_FILE}; usando auto.")
+    DBUS_BACKEND = "auto"
+DBUS_APP_ALLOWLIST = [str(app) for app in _config.get("dbus_app_allowlist") or [] if app]
+HISTORY_CAPACITY = _config_int("history_capacity", 100_000, minimum=100)
+TRACE_ENABLED = bool(_config.get("trace_enabled", False))
+TRACE_SAMPLE_RATE = min(1.0, _config_float("trace_sample_rate", 0.05))
+TRACE_BUFFER_EVENTS = _config_int("trace_buffer_events", 20_000, minimum=100)
+TRACE_DIR = "notify-watcher/traces"
 IGNORED_APPS = set()
 
 SUPPORTED_RULE_TYPES = {"element", "element_text"}
@@ -58,38 +145,1267 @@ DEFAULT_CONDITION_BY_TYPE = {
 DEFAULT_RULE_NAME = "Regra"
 
 
+# --- Barramento de Eventos ---
+EVENT_PENDING_RULE_SET = "pending_rule_set"
+EVENT_PENDING_RULE_CLEARED = "pending_rule_cleared"
+EVENT_NOTIFICATION_RECEIVED = "notification_received"
+EVENT_DELIVERY_FAILED = "delivery_failed"
+EVENT_IGNORE_LIST_CHANGED = "ignore_list_changed"
+
+
+class BusEvent:
+    __slots__ = ("type", "payload", "timestamp")
+
+    def __init__(self, event_type, payload=None):
+        self.type = event_type
+        self.payload = payload or {}
+        self.timestamp = time.time()
+
+
+class EventBus:
+    """Entrega eventos tipados, no thread de quem emite, a todos os inscritos."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = ()
+
+    def subscribe(self, callback, types=None):
+        entry = (callback, frozenset(types) if types else None)
+        with self._lock:
+            self._subscribers = self._subscribers + (entry,)
+        return entry
+
+    def unsubscribe(self, token):
+        with self._lock:
+            self._subscribers = tuple(entry for entry in self._subscribers if entry is not token)
+
+    def emit(self, event_type, payload=None):
+        subscribers = self._subscribers
+        if not subscribers:
+            return
+        event = BusEvent(event_type, payload)
+        for callback, types in subscribers:
+            if types is not None and event_type not in types:
+                continue
+            try:
+                callback(event)
+            except Exception as exc:
+                print(f"⚠️ Erro em inscrito do evento {event_type}: {exc}")
+
+
+EVENT_BUS = EventBus()
+
+
+# --- Métricas ---
+def _metric_labels(names, values):
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class Counter:
+    """Contador monotônico com rótulos; inc() custa um lock e uma soma."""
+
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_metric_labels(self.labels, key)} {value}" for key, value in values]
+
+
+class Histogram:
+    """Histograma de buckets fixos (segundos) no formato do Prometheus."""
+
+    kind = "histogram"
+    DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][position] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        with self._lock:
+            items = sorted((key, (list(series[0]), series[1], series[2])) for key, series in self._series.items())
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_metric_labels(self.labels + ('le',), key + (le,))} {cumulative}")
+            lines.append(f"{self.name}_sum{_metric_labels(self.labels, key)} {total}")
+            lines.append(f"{self.name}_count{_metric_labels(self.labels, key)} {count}")
+        return lines
+
+
+class Gauge:
+    """Valor lido na hora da coleta, por uma função."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help_text, read):
+        self.name = name
+        self.help = help_text
+        self.labels = ()
+        self._read = read
+
+    def render(self):
+        try:
+            return [f"{self.name} {float(self._read())}"]
+        except Exception:
+            return []
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self.register(Counter(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=Histogram.DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help_text, labels, buckets))
+
+    def gauge(self, name, help_text, read):
+        return self.register(Gauge(name, help_text, read))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+METRICS = MetricsRegistry()
+METRIC_INGEST = METRICS.counter("notify_ingest_total", "Notificações recebidas por origem.", ("source",))
+METRIC_FILTERED = METRICS.counter("notify_filtered_total", "Notificações ignoradas ou duplicadas.", ("source", "reason"))
+METRIC_OUTCOMES = METRICS.counter("notify_ingest_outcomes_total", "Resultado da admissão (fila, resumo, limite...).", ("outcome",))
+METRIC_SCREENSHOT_SECONDS = METRICS.histogram("notify_screenshot_process_seconds", "Decodificação e recompressão de capturas.")
+METRIC_NTFY_SECONDS = METRICS.histogram("notify_ntfy_request_seconds", "Latência de cada requisição ao ntfy.")
+METRIC_NTFY_RESPONSES = METRICS.counter("notify_ntfy_responses_total", "Respostas do ntfy por código HTTP.", ("code",))
+METRIC_DELIVERY_SECONDS = METRICS.histogram(
+    "notify_delivery_seconds", "Tempo do recebimento até a entrega.", ("result",),
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0),
+)
+METRIC_DBUS_SECONDS = METRICS.histogram(
+    "notify_dbus_message_seconds", "Tempo de tratamento de uma mensagem DBus.",
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1),
+)
+METRIC_HTTP_SECONDS = METRICS.histogram("notify_http_request_seconds", "Tempo de atendimento HTTP por endpoint.", ("endpoint",))
+
+
+def _write_json_atomic(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+# --- Tracing (Chrome trace-event) ---
+class _Span:
+    __slots__ = ("tracer", "name", "trace_id", "args", "start", "previous")
+
+    def __init__(self, tracer, name, trace_id, args, previous):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.args = args
+        self.previous = previous
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.time_ns() // 1000
+        return self
+
+    def __exit__(self, *exc_info):
+        end = time.time_ns() // 1000
+        self.tracer._append(self.name, self.trace_id, self.start, end - self.start, self.args)
+        self.tracer._local.trace_id = self.previous
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Tracer:
+    """Spans opcionais e amostrados do pipeline, num buffer limitado em memória.
+
+    trace() abre a raiz de uma notificação (sorteando a amostragem) e span()
+    só registra dentro de uma raiz amostrada no mesmo thread; desligado, os
+    dois devolvem um contexto vazio. link()/resume() carregam o trace pelo
+    event_id até o worker de entrega. dump() gera o JSON aceito pelo
+    Perfetto / chrome://tracing.
+    """
+
+    LINK_LIMIT = 4096
+
+    def __init__(self, enabled=TRACE_ENABLED, sample_rate=TRACE_SAMPLE_RATE, capacity=TRACE_BUFFER_EVENTS):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self._events = deque(maxlen=capacity)
+        self._threads = {}
+        self._links = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def configure(self, enabled=None, sample_rate=None):
+        if enabled is not None:
+            self.enabled = bool(enabled)
+        if sample_rate is not None:
+            self.sample_rate = min(1.0, max(0.0, float(sample_rate)))
+
+    def _append(self, name, trace_id, start, duration, args):
+        thread = threading.current_thread()
+        event = {"name": name, "ph": "X", "ts": start, "dur": duration, "tid": thread.ident, "args": {"trace_id": trace_id, **args}}
+        with self._lock:
+            self._events.append(event)
+            self._threads[thread.ident] = thread.name
+
+    def trace(self, name, trace_id=None, **args):
+        """Raiz de um trace: usa `trace_id` se dado, senão sorteia pela taxa de amostragem."""
+        if not self.enabled:
+            return _NULL_SPAN
+        if trace_id is None:
+            if random.random() >= self.sample_rate:
+                return _NULL_SPAN
+            trace_id = uuid.uuid4().hex[:16]
+        previous = getattr(self._local, "trace_id", None)
+        self._local.trace_id = trace_id
+        return _Span(self, name, trace_id, args, previous)
+
+    def span(self, name, **args):
+        trace_id = getattr(self._local, "trace_id", None) if self.enabled else None
+        if trace_id is None:
+            return _NULL_SPAN
+        return _Span(self, name, trace_id, args, trace_id)
+
+    def link(self, event_id):
+        trace_id = getattr(self._local, "trace_id", None) if self.enabled else None
+        if trace_id is None or not event_id:
+            return
+        with self._lock:
+            self._links[event_id] = trace_id
+            if len(self._links) > self.LINK_LIMIT:
+                self._links.popitem(last=False)
+
+    def resume(self, name, event_id, queued_at=None, **args):
+        """Continua, em outro thread, o trace ligado a `event_id` por link()."""
+        if not self.enabled:
+            return _NULL_SPAN
+        with self._lock:
+            trace_id = self._links.pop(event_id, None)
+        if trace_id is None:
+            return _NULL_SPAN
+        if queued_at is not None:
+            self.record("queue.wait", trace_id, queued_at, time.time())
+        return self.trace(name, trace_id=trace_id, **args)
+
+    def record(self, name, trace_id, start_seconds, end_seconds, **args):
+        """Span com início/fim explícitos (ex.: espera na fila)."""
+        if trace_id is None:
+            return
+        start = int(start_seconds * 1_000_000)
+        self._append(name, trace_id, start, max(0, int(end_seconds * 1_000_000) - start), args)
+
+    def dump(self, clear=False):
+        pid = os.getpid()
+        with self._lock:
+            events = list(self._events)
+            threads = dict(self._threads)
+            if clear:
+                self._events.clear()
+        trace_events = [
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+            for tid, name in threads.items()
+        ]
+        trace_events.extend(dict(event, pid=pid) for event in events)
+        return {"traceEvents": trace_events, "displayTimeUnit": "ms"}
+
+    def dump_to_file(self, directory=TRACE_DIR):
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, time.strftime("trace-%Y%m%d-%H%M%S.json"))
+        with open(path, "w") as f:
+            json.dump(self.dump(), f)
+        print(f"🧵 Trace salvo em {path}.")
+        return path
+
+
+TRACER = Tracer()
+
+
+# --- Armazenamento de Regras ---
+class RuleStore:
+    """Regras com id estável e revisão monotônica, persistidas em config.json.
+
+    Cada regra guarda em `rev` a revisão em que mudou pela última vez e as
+    remoções ficam como marcadores (`removed`), o que permite responder
+    /config?since=<rev> só com a diferença.
+    """
+
+    TOMBSTONE_LIMIT = 1000
+
+    def __init__(self, path=CONFIG_FILE):
+        self.path = path
+        self._lock = threading.RLock()
+        self.revision = 0
+        self._rules = []
+        self._removed = []
+        self._floor = 0
+        self._loaded = False
+
+    @staticmethod
+    def _content(rule):
+        return {key: value for key, value in rule.items() if key != "rev"}
+
+    def _read_file(self):
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}, []
+        except json.JSONDecodeError as exc:
+            print(f"⚠️ Erro ao ler {self.path}: {exc}")
+            return None, None
+        if isinstance(data, dict):
+            rules = data.get("rules", [])
+        else:
+            rules, data = (data if isinstance(data, list) else []), {}
+        return data, [rule for rule in rules if isinstance(rule, dict)]
+
+    def load(self):
+        """Lê o arquivo e reconcilia com a memória; devolve True se algo mudou."""
+        data, incoming = self._read_file()
+        if data is None:
+            return False
+        with self._lock:
+            revision = max(self.revision, int(data.get("revision", 0) or 0))
+            self._floor = max(self._floor, int(data.get("compacted_revision", 0) or 0))
+            if not self._loaded:
+                self._removed = [
+                    item for item in data.get("removed", [])
+                    if isinstance(item, dict) and item.get("id")
+                ]
+            current = {rule["id"]: rule for rule in self._rules}
+            next_revision = revision + 1
+            changed = False
+            rules = []
+            for rule in incoming:
+                rule = dict(rule)
+                if not rule.get("id"):
+                    rule["id"] = uuid.uuid4().hex
+                    changed = True
+                previous = current.pop(rule["id"], None)
+                if previous is not None and self._content(previous) == self._content(rule):
+                    rule["rev"] = previous["rev"]
+                elif not self._loaded and isinstance(rule.get("rev"), int) and rule["rev"] <= revision:
+                    pass  # revisão já persistida numa execução anterior
+                else:
+                    rule["rev"] = next_revision
+                    changed = True
+                rules.append(rule)
+            if self._loaded:
+                for rule_id in current:
+                    self._removed.append({"id": rule_id, "rev": next_revision})
+                    changed = True
+            if changed:
+                revision = next_revision
+            self.revision = revision
+            self._rules = rules
+            self._loaded = True
+            self._trim_tombstones()
+            needs_save = changed or data.get("version") != RULES_SCHEMA_VERSION
+        if needs_save:
+            self.save()
+        else:
+            CONFIG_CACHE.invalidate()
+        return changed
+
+    def _trim_tombstones(self):
+        overflow = len(self._removed) - self.TOMBSTONE_LIMIT
+        if overflow > 0:
+            self._floor = max(self._floor, max(item["rev"] for item in self._removed[:overflow]))
+            del self._removed[:overflow]
+
+    def save(self):
+        with self._lock:
+            data = _load_config()
+            if not isinstance(data, dict):
+                data = {}
+            data["version"] = RULES_SCHEMA_VERSION
+            data["revision"] = self.revision
+            data["compacted_revision"] = self._floor
+            data["rules"] = self._rules
+            data["removed"] = self._removed
+            try:
+                _write_json_atomic(self.path, data)
+            except Exception as exc:
+                print(f"Erro ao salvar config: {exc}")
+        CONFIG_CACHE.invalidate()
+
+    def save_setting(self, key, value):
+        """Grava uma chave de configuração fora das regras, preservando o resto."""
+        with self._lock:
+            data = _load_config()
+            if not isinstance(data, dict):
+                data = {}
+            data[key] = value
+            try:
+                _write_json_atomic(self.path, data)
+            except Exception as exc:
+                print(f"Erro ao salvar config: {exc}")
+
+    def rules(self):
+        with self._lock:
+            return [dict(rule) for rule in self._rules]
+
+    def get(self, rule_id):
+        with self._lock:
+            for rule in self._rules:
+                if rule["id"] == rule_id:
+                    return dict(rule)
+        return None
+
+    def add(self, rule):
+        with self._lock:
+            self.revision += 1
+            rule = dict(rule, id=uuid.uuid4().hex, rev=self.revision)
+            self._rules.append(rule)
+        self.save()
+        return dict(rule)
+
+    def update(self, rule_id, rule):
+        with self._lock:
+            for index, existing in enumerate(self._rules):
+                if existing["id"] == rule_id:
+                    self.revision += 1
+                    rule = dict(rule, id=rule_id, rev=self.revision)
+                    self._rules[index] = rule
+                    break
+            else:
+                return None
+        self.save()
+        return dict(rule)
+
+    def remove(self, rule_id):
+        with self._lock:
+            remaining = [rule for rule in self._rules if rule["id"] != rule_id]
+            if len(remaining) == len(self._rules):
+                return False
+            self.revision += 1
+            self._rules = remaining
+            self._removed.append({"id": rule_id, "rev": self.revision})
+            self._trim_tombstones()
+        self.save()
+        return True
+
+    def snapshot(self):
+        with self._lock:
+            return self.revision, [dict(rule) for rule in self._rules]
+
+    def changes_since(self, since):
+        """(revisão, alteradas, removidas) desde `since`, ou None se só um envio completo serve."""
+        with self._lock:
+            if since < self._floor or since > self.revision:
+                return None
+            changed = [dict(rule) for rule in self._rules if rule["rev"] > since]
+            removed = [item["id"] for item in self._removed if item["rev"] > since]
+            return self.revision, changed, removed
+
+    def export_json(self):
+        """Regras no formato v2 do config.json, para compatibilidade."""
+        with self._lock:
+            return {
+                "version": RULES_SCHEMA_VERSION,
+                "revision": self.revision,
+                "compacted_revision": self._floor,
+                "rules": [dict(rule) for rule in self._rules],
+                "removed": [dict(item) for item in self._removed],
+            }
+
+    def close(self):
+        pass
+
+
+class SqliteRuleStore(RuleStore):
+    """Mesma interface do RuleStore, mas cada regra é uma linha em SQLite (WAL).
+
+    Adicionar, editar ou remover custa uma escrita de linha numa transação,
+    em vez de regravar o config.json inteiro. Na primeira abertura as regras
+    do config.json (lista v1 ou {"version", "rules"} v2) são migradas e o
+    arquivo original fica em config.json.bak; export_json() gera de volta o
+    formato v2. A memória mantém só um espelho para leituras rápidas.
+    """
+
+    def __init__(self, path=RULES_DB_FILE, config_path=CONFIG_FILE):
+        super().__init__(config_path)
+        self.db_path = path
+        self._conn = None
+        self._index = {}
+
+    def _open(self):
+        if self._conn is not None:
+            return self._conn
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS rules (
+                id TEXT PRIMARY KEY,
+                position INTEGER NOT NULL,
+                rev INTEGER NOT NULL,
+                url_contains TEXT NOT NULL DEFAULT '',
+                condition TEXT NOT NULL DEFAULT '',
+                body TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS rules_url_contains ON rules (url_contains);
+            CREATE INDEX IF NOT EXISTS rules_condition ON rules (condition);
+            CREATE INDEX IF NOT EXISTS rules_rev ON rules (rev);
+            CREATE TABLE IF NOT EXISTS tombstones (id TEXT PRIMARY KEY, rev INTEGER NOT NULL);
+            CREATE INDEX IF NOT EXISTS tombstones_rev ON tombstones (rev);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+            """
+        )
+        self._conn = conn
+        return conn
+
+    def _meta(self, conn, key, default=0):
+        row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    @staticmethod
+    def _set_meta(conn, key, value):
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    @staticmethod
+    def _row(rule, position):
+        return (
+            rule["id"],
+            position,
+            rule["rev"],
+            str(rule.get("url_contains") or ""),
+            str(rule.get("condition") or rule.get("type") or ""),
+            json.dumps(rule, ensure_ascii=False, separators=(",", ":")),
+        )
+
+    def _upsert(self, conn, rule, position):
+        conn.execute(
+            "INSERT OR REPLACE INTO rules (id, position, rev, url_contains, condition, body) VALUES (?, ?, ?, ?, ?, ?)",
+            self._row(rule, position),
+        )
+
+    def _migrate(self, conn):
+        data, incoming = self._read_file()
+        if data is None:
+            raise RuntimeError(f"{self.path} ilegível; migração adiada")
+        revision = int(data.get("revision", 0) or 0) + 1
+        with conn:
+            for position, rule in enumerate(incoming):
+                rule = dict(rule)
+                rule["id"] = rule.get("id") or uuid.uuid4().hex
+                if not isinstance(rule.get("rev"), int) or rule["rev"] >= revision:
+                    rule["rev"] = revision
+                self._upsert(conn, rule, position)
+            for item in data.get("removed", []):
+                if isinstance(item, dict) and item.get("id"):
+                    conn.execute(
+                        "INSERT OR REPLACE INTO tombstones (id, rev) VALUES (?, ?)",
+                        (str(item["id"]), int(item.get("rev", 0) or 0)),
+                    )
+            self._set_meta(conn, "revision", revision)
+            self._set_meta(conn, "compacted_revision", int(data.get("compacted_revision", 0) or 0))
+            self._set_meta(conn, "migrated", 1)
+        if os.path.exists(self.path) and (incoming or "rules" in data):
+            try:
+                shutil.copyfile(self.path, f"{self.path}.bak")
+                for key in ("rules", "removed", "revision", "compacted_revision"):
+                    data.pop(key, None)
+                data["version"] = RULES_SCHEMA_VERSION
+                _write_json_atomic(self.path, data)
+            except Exception as exc:
+                print(f"⚠️ Falha ao retirar as regras migradas de {self.path}: {exc}")
+        print(f"🗄️ {len(incoming)} regras migradas de {self.path} para {self.db_path}.")
+
+    def load(self):
+        """Carrega o espelho em memória a partir do banco (migrando na primeira vez)."""
+        with self._lock:
+            if self._loaded:
+                return False
+            conn = self._open()
+            if not self._meta(conn, "migrated"):
+                try:
+                    self._migrate(conn)
+                except Exception as exc:
+                    print(f"❌ Falha ao migrar regras para SQLite: {exc}")
+                    return False
+            self.revision = self._meta(conn, "revision")
+            self._floor = self._meta(conn, "compacted_revision")
+            self._rules = [json.loads(body) for (body,) in conn.execute("SELECT body FROM rules ORDER BY position")]
+            self._index = {rule["id"]: position for position, rule in enumerate(self._rules)}
+            self._removed = [
+                {"id": rule_id, "rev": rev}
+                for rule_id, rev in conn.execute("SELECT id, rev FROM tombstones ORDER BY rev")
+            ]
+            self._loaded = True
+        CONFIG_CACHE.invalidate()
+        return True
+
+    def save(self):
+        CONFIG_CACHE.invalidate()
+
+    def get(self, rule_id):
+        with self._lock:
+            position = self._index.get(rule_id)
+            return dict(self._rules[position]) if position is not None else None
+
+    def add(self, rule):
+        with self._lock:
+            conn = self._open()
+            revision = self.revision + 1
+            rule = dict(rule, id=uuid.uuid4().hex, rev=revision)
+            position = conn.execute("SELECT COALESCE(MAX(position), -1) + 1 FROM rules").fetchone()[0]
+            with conn:
+                self._upsert(conn, rule, position)
+                self._set_meta(conn, "revision", revision)
+            self.revision = revision
+            self._index[rule["id"]] = len(self._rules)
+            self._rules.append(rule)
+        self.save()
+        return dict(rule)
+
+    def update(self, rule_id, rule):
+        with self._lock:
+            index = self._index.get(rule_id)
+            if index is None:
+                return None
+            conn = self._open()
+            revision = self.revision + 1
+            rule = dict(rule, id=rule_id, rev=revision)
+            with conn:
+                conn.execute(
+                    "UPDATE rules SET rev = ?, url_contains = ?, condition = ?, body = ? WHERE id = ?",
+                    self._row(rule, 0)[2:] + (rule_id,),
+                )
+                self._set_meta(conn, "revision", revision)
+            self.revision = revision
+            self._rules[index] = rule
+        self.save()
+        return dict(rule)
+
+    def remove(self, rule_id):
+        with self._lock:
+            index = self._index.get(rule_id)
+            if index is None:
+                return False
+            conn = self._open()
+            revision = self.revision + 1
+            with conn:
+                conn.execute("DELETE FROM rules WHERE id = ?", (rule_id,))
+                conn.execute("INSERT OR REPLACE INTO tombstones (id, rev) VALUES (?, ?)", (rule_id, revision))
+                self._set_meta(conn, "revision", revision)
+                self.revision = revision
+                self._removed.append({"id": rule_id, "rev": revision})
+                self._trim_tombstones()
+                conn.execute("DELETE FROM tombstones WHERE rev <= ?", (self._floor,))
+                self._set_meta(conn, "compacted_revision", self._floor)
+            del self._rules[index]
+            self._index = {rule["id"]: position for position, rule in enumerate(self._rules)}
+        self.save()
+        return True
+
+    def changes_since(self, since):
+        with self._lock:
+            if since < self._floor or since > self.revision:
+                return None
+            conn = self._open()
+            changed = [
+                json.loads(body)
+                for (body,) in conn.execute("SELECT body FROM rules WHERE rev > ? ORDER BY position", (since,))
+            ]
+            removed = [rule_id for (rule_id,) in conn.execute("SELECT id FROM tombstones WHERE rev > ? ORDER BY rev", (since,))]
+            return self.revision, changed, removed
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+RULE_STORE_BACKEND = str(_config.get("rule_store") or "sqlite").lower()
+RULE_STORE = SqliteRuleStore() if RULE_STORE_BACKEND == "sqlite" else RuleStore()
+
+
+# --- Cache do /config ---
+class ConfigSnapshot:
+    __slots__ = ("body", "etag", "revision")
+
+    def __init__(self, body, revision):
+        self.body = body
+        self.etag = hashlib.sha1(body).hexdigest()[:20]
+        self.revision = revision
+
+
+class ConfigCache:
+    """Guarda o /config já serializado; só relê os arquivos após invalidate().
+
+    `revision` cresce a cada conteúdo novo e acorda quem espera em
+    wait_for_change() (o stream SSE).
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._snapshot = None
+        self._generation = 0
+        self._last_etag = None
+        self._revision = 0
+
+    @property
+    def generation(self):
+        return self._generation
+
+    def invalidate(self):
+        with self._cond:
+            self._snapshot = None
+            self._generation += 1
+            self._cond.notify_all()
+
+    def wait_for_change(self, generation, timeout):
+        with self._cond:
+            self._cond.wait_for(lambda: self._generation != generation, timeout)
+            return self._generation
+
+    def get(self):
+        snapshot = self._snapshot
+        if snapshot is not None:
+            return snapshot
+        with self._cond:
+            if self._snapshot is None:
+                body = self._build()
+                snapshot = ConfigSnapshot(body, self._revision)
+                if snapshot.etag != self._last_etag:
+                    self._revision += 1
+                    snapshot.revision = self._revision
+                    self._last_etag = snapshot.etag
+                self._snapshot = snapshot
+            return self._snapshot
+
+    def _build(self):
+        revision, rules = RULE_STORE.snapshot()
+        payload = {
+            'version': RULES_SCHEMA_VERSION,
+            'revision': revision,
+            'rules': rules,
+            'ignored_apps': sorted(IGNORED_APPS),
+            'pending_rule': read_pending_rule(),
+        }
+        return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+CONFIG_CACHE = ConfigCache()
+
+
+# --- Índice de regras por URL ---
+class AhoCorasick:
+    """Automato de Aho-Corasick: acha todos os padrões num texto em O(len(texto) + ocorrências)."""
+
+    def __init__(self, patterns):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [set()]
+        for pattern in patterns:
+            node = 0
+            for char in pattern:
+                nxt = self._goto[node].get(char)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][char] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(set())
+                node = nxt
+            self._out[node].add(pattern)
+        pending = deque(self._goto[0].values())
+        while pending:
+            node = pending.popleft()
+            for char, nxt in self._goto[node].items():
+                pending.append(nxt)
+                fallback = self._fail[node]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[nxt] = self._goto[fallback].get(char, 0)
+                self._out[nxt] |= self._out[self._fail[nxt]]
+
+    def search(self, text):
+        found = set()
+        node = 0
+        goto, fail, out = self._goto, self._fail, self._out
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if out[node]:
+                found |= out[node]
+        return found
+
+
+class RuleUrlIndex:
+    """Seleciona as regras cujo url_contains aparece numa URL, sem varrer todas.
+
+    Valores com cara de host (só letras, dígitos, ponto e hífen) não podem
+    atravessar os limites do host na URL, então o que casa dentro do host é
+    resolvido uma vez por host e guardado num LRU; o resto da URL passa por
+    um automato com os demais padrões. O índice é refeito quando a revisão
+    das regras muda.
+    """
+
+    HOST_PATTERN = re.compile(r"[A-Za-z0-9.-]+")
+    MAX_HOSTS = 512
+
+    def __init__(self, store):
+        self.store = store
+        self._lock = threading.Lock()
+        self._revision = None
+        self._rules = []
+        self._always = []
+        self._by_pattern = {}
+        self._host_automaton = AhoCorasick(())
+        self._url_automaton = AhoCorasick(())
+        self._hosts = OrderedDict()
+        self._stats = {"lookups": 0, "host_hits": 0, "rebuilds": 0}
+
+    def _ensure(self):
+        revision = self.store.revision
+        if revision == self._revision:
+            return
+        _, rules = self.store.snapshot()
+        by_pattern, always, host_patterns, url_patterns = {}, [], set(), set()
+        for position, rule in enumerate(rules):
+            pattern = rule.get("url_contains") or ""
+            if not pattern:
+                always.append(position)
+                continue
+            by_pattern.setdefault(pattern, []).append(position)
+            (host_patterns if self.HOST_PATTERN.fullmatch(pattern) else url_patterns).add(pattern)
+        self._rules = rules
+        self._always = always
+        self._by_pattern = by_pattern
+        self._host_automaton = AhoCorasick(host_patterns)
+        self._url_automaton = AhoCorasick(url_patterns)
+        self._hosts.clear()
+        self._revision = revision
+        self._stats["rebuilds"] += 1
+
+    @staticmethod
+    def _host_span(url):
+        """Posição (início, fim) do host na própria URL, ou (-1, -1).
+
+        Procurar o hostname na URL erra com userinfo ("https://ab@a/") ou
+        hosts curtos ("http://t/x"), e o hostname do urlparse vem em
+        minúsculas; por isso o host é recortado do netloc: depois do último
+        "@" e antes da porta.
+        """
+        netloc = urlparse(url).netloc
+        if not netloc:
+            return -1, -1
+        position = url.find("//" + netloc)
+        if position < 0:
+            return -1, -1
+        start = position + 2 + netloc.rfind("@") + 1
+        host = netloc[netloc.rfind("@") + 1:]
+        if host.startswith("["):
+            host = host[:host.find("]") + 1] if "]" in host else host
+        else:
+            host = host.partition(":")[0]
+        return start, start + len(host)
+
+    def match(self, url):
+        """(revisão, regras aplicáveis a `url`) na ordem do config."""
+        with self._lock:
+            self._ensure()
+            self._stats["lookups"] += 1
+            start, end = self._host_span(url)
+            if start < 0:
+                host, rest = "", url
+            else:
+                # O separador impede ocorrências que atravessem o host removido.
+                host, rest = url[start:end], url[:start] + "\0" + url[end:]
+            host_found = self._hosts.get(host)
+            if host_found is None:
+                host_found = self._host_automaton.search(host) if host else set()
+                self._hosts[host] = host_found
+                if len(self._hosts) > self.MAX_HOSTS:
+                    self._hosts.popitem(last=False)
+            else:
+                self._hosts.move_to_end(host)
+                self._stats["host_hits"] += 1
+            found = host_found | self._host_automaton.search(rest) | self._url_automaton.search(url)
+            positions = set(self._always)
+            for pattern in found:
+                positions.update(self._by_pattern[pattern])
+            return self._revision, [dict(self._rules[position]) for position in sorted(positions)]
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["cached_hosts"] = len(self._hosts)
+        return stats
+
+
+RULE_URL_INDEX = RuleUrlIndex(RULE_STORE)
+
+
+# Valores de trace_* do config.json já aplicados; ajustes feitos via POST /trace
+# só são sobrescritos quando o arquivo muda essas chaves.
+_applied_trace_config = (_config.get("trace_enabled"), _config.get("trace_sample_rate"))
+
+
+def apply_config_file():
+    """Reaplica as chaves de config.json que podem mudar sem reiniciar."""
+    global _applied_trace_config
+    config = _load_config()
+    if not isinstance(config, dict):
+        config = {}
+    RULE_STORE.load()
+    RATE_LIMITER.configure(config.get("rate_limits"))
+    trace_config = (config.get("trace_enabled"), config.get("trace_sample_rate"))
+    if trace_config != _applied_trace_config:
+        _applied_trace_config = trace_config
+        try:
+            TRACER.configure(enabled=trace_config[0], sample_rate=trace_config[1])
+        except (TypeError, ValueError):
+            print(f"⚠️ Valor inválido para 'trace_sample_rate' em {CONFIG_FILE}.")
+
+
+def reload_config():
+    """Relê config.json e ignore.json (SIGHUP).
+
+    Regras, ignorados, limites de envio e trace são reaplicados; porta,
+    workers, timeouts e demais chaves só valem após reiniciar.
+    """
+    print("🔄 Recarregando configuração...")
+    apply_config_file()
+    load_ignored_apps_from_disk()
+
+
+class ConfigFileWatcher(threading.Thread):
+    """Recarrega config.json e ignore.json quando são editados fora do app.
+
+    Usa inotify (pacote inotify_simple) quando disponível; senão compara mtime/tamanho.
+    """
+
+    def __init__(self, paths=(CONFIG_FILE, IGNORE_CONFIG_FILE)):
+        super().__init__(name="config-watcher", daemon=True)
+        self.paths = [os.path.abspath(path) for path in paths]
+        self._stopping = threading.Event()
+
+    def _handle_change(self, path):
+        if path == os.path.abspath(IGNORE_CONFIG_FILE):
+            load_ignored_apps_from_disk()
+        else:
+            apply_config_file()
+
+    def run(self):
+        try:
+            from inotify_simple import INotify, flags
+        except Exception:
+            self._poll()
+            return
+        inotify = INotify()
+        watch_flags = flags.CLOSE_WRITE | flags.MOVED_TO | flags.CREATE | flags.DELETE
+        watches = {}
+        for directory in {os.path.dirname(path) for path in self.paths}:
+            try:
+                watches[inotify.add_watch(directory, watch_flags)] = directory
+            except OSError as exc:
+                print(f"⚠️ inotify indisponível para {directory}: {exc}")
+                self._poll()
+                return
+        while not self._stopping.is_set():
+            for event in inotify.read(timeout=int(CONFIG_WATCH_INTERVAL * 1000)):
+                path = os.path.join(watches.get(event.wd, ""), event.name)
+                if path in self.paths:
+                    self._handle_change(path)
+
+    def _signature(self, path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _poll(self):
+        signatures = {path: self._signature(path) for path in self.paths}
+        while not self._stopping.wait(CONFIG_WATCH_INTERVAL):
+            for path in self.paths:
+                signature = self._signature(path)
+                if signature != signatures[path]:
+                    signatures[path] = signature
+                    self._handle_change(path)
+
+    def stop(self):
+        self._stopping.set()
+
+
+IGNORE_FIELDS = ("app", "title", "body")
+IGNORE_MATCH_TYPES = ("exact", "prefix", "glob", "contains", "regex")
+
+
+class IgnoreFilter:
+    """Padrões de ignore compilados numa regex combinada (e um set exato) por campo.
+
+    Cada padrão vira um grupo de captura da alternância do seu campo, então
+    uma mensagem é testada com uma busca por campo, qualquer que seja o
+    número de padrões; o número do grupo que casou identifica o padrão para
+    o contador. Regex com referência numérica (\\1) não sobrevive à
+    renumeração e é testada sozinha, assim como o campo inteiro se a
+    combinação não compilar (nomes de grupo repetidos, por exemplo).
+    """
+
+    _GLOBAL_FLAGS = re.compile(r"\(\?([aiLmsux]+)\)")
+
+    def __init__(self, patterns=()):
+        self.patterns = []
+        self._exact = {}
+        self._combined = {}
+        self._hits = {}
+        self._lock = threading.Lock()
+        self.rebuild(patterns)
+
+    @staticmethod
+    def _normalize(raw):
+        if isinstance(raw, str):
+            raw = {"field": "app", "match": "glob", "pattern": raw}
+        if not isinstance(raw, dict):
+            return None
+        pattern = raw.get("pattern")
+        field = str(raw.get("field") or "app").lower()
+        match = str(raw.get("match") or "exact").lower()
+        if not isinstance(pattern, str) or not pattern or field not in IGNORE_FIELDS or match not in IGNORE_MATCH_TYPES:
+            return None
+        return {"field": field, "match": match, "pattern": pattern, "ignore_case": bool(raw.get("ignore_case", False))}
+
+    @classmethod
+    def _isolate(cls, pattern):
+        """Troca flags globais inline por um grupo com escopo; devolve (expressão, tem_backref_numérico)."""
+        flags, parts, backref = "", [], False
+        i, in_class = 0, False
+        while i < len(pattern):
+            ch = pattern[i]
+            if ch == "\\":
+                if not in_class and i + 1 < len(pattern) and pattern[i + 1] in "123456789":
+                    backref = True
+                parts.append(pattern[i:i + 2])
+                i += 2
+                continue
+            if in_class:
+                in_class = ch != "]"
+            elif ch == "[":
+                # "]" logo após "[" ou "[^" é literal.
+                end = i + 1 + (pattern[i + 1:i + 2] == "^")
+                end += pattern[end:end + 1] == "]"
+                parts.append(pattern[i:end])
+                in_class, i = True, end
+                continue
+            elif ch == "(":
+                found = cls._GLOBAL_FLAGS.match(pattern, i)
+                if found is not None:
+                    flags += found.group(1)
+                    i = found.end()
+                    continue
+                if pattern.startswith("(?(", i) and pattern[i + 3:i + 4].isdigit():
+                    backref = True
+            parts.append(ch)
+            i += 1
+        expression = "".join(parts)
+        if flags:
+            flags = "".join(dict.fromkeys(flags))
+            # Em modo verbose um "#" comentaria o fecho do grupo; a quebra de linha o protege.
+            expression = f"(?{flags}:{expression}\n)" if "x" in flags else f"(?{flags}:{expression})"
+        return expression, backref
+
+    @classmethod
+    def _expression(cls, entry):
+        """Devolve (expressão, sozinha); ``sozinha`` indica que não entra na regex combinada."""
+        pattern, match = entry["pattern"], entry["match"]
+        standalone = False
+        if match == "prefix":
+            expression = "\\A" + re.escape(pattern)
+        elif match == "glob":
+            expression = "\\A" + fnmatch.translate(pattern)
+        elif match == "contains":
+            expression = re.escape(pattern)
+        elif match == "exact":
+            expression = "\\A" + re.escape(pattern) + "\\Z"
+        else:
+            expression, standalone = cls._isolate(pattern)
+        expression = f"(?i:{expression})" if entry["ignore_case"] else f"(?:{expression})"
+        # Valida já dentro do invólucro usado na combinação.
+        re.compile(expression if standalone else f"({expression})", re.DOTALL)
+        return expression, standalone
+
+    @staticmethod
+    def _compile(field, parts):
+        """Devolve (regex combinada, grupo -> índice do padrão, [(índice, regex avulsa)])."""
+        groups, alternatives, single = {}, [], []
+        group = 1
+        for index, expression, standalone in parts:
+            compiled = re.compile(expression, re.DOTALL)
+            if standalone:
+                single.append((index, compiled))
+                continue
+            groups[group] = index
+            group += 1 + compiled.groups
+            alternatives.append(f"({expression})")
+        if not alternatives:
+            return None, {}, single
+        try:
+            return re.compile("|".join(alternatives), re.DOTALL), groups, single
+        except re.error as exc:
+            print(f"⚠️ Padrões de ignore do campo {field} não combinam numa regex ({exc}); testando um a um.")
+            fallback = [(index, re.compile(expression, re.DOTALL)) for index, expression, standalone in parts if not standalone]
+            return None, {}, sorted(fallback + single)
+
+    def rebuild(self, patterns):
+        entries, exact, alternatives = [], {}, {}
+        for raw in patterns or ():
+            entry = self._normalize(raw)
+            if entry is None:
+                print(f"⚠️ Padrão de ignore inválido em {IGNORE_CONFIG_FILE}: {raw!r}")
+                continue
+            index = len(entries)
+            if entry["match"] == "exact" and not entry["ignore_case"]:
+                exact.setdefault(entry["field"], {}).setdefault(entry["pattern"], index)
+            else:
+                try:
+                    expression, standalone = self._expression(entry)
+                except re.error as exc:
+                    print(f"⚠️ Regex de ignore inválida {entry['pattern']!r}: {exc}")
+                    continue
+                alternatives.setdefault(entry["field"], []).append((index, expression, standalone))
+            entries.append(entry)
+        combined = {field: self._compile(field, parts) for field, parts in alternatives.items()}
+        with self._lock:
+            self.patterns = entries
+            self._exact = exact
+            self._combined = combined
+            self._hits = {}
+
+    def match(self, field, value):
+        """Devolve o índice do padrão que casa com ``value`` no campo, ou None."""
+        if not value:
+            return None
+        exact, combined = self._exact.get(field), self._combined.get(field)
+        index = exact.get(value) if exact else None
+        if index is None and combined is not None:
+            regex, groups, single = combined
+            found = regex.search(value) if regex is not None else None
+            if found is not None:
+                index = groups[found.lastindex]
+            else:
+                index = next((candidate for candidate, pattern in single if pattern.search(value)), None)
+        if index is not None:
+            with self._lock:
+                self._hits[index] = self._hits.get(index, 0) + 1
+        return index
+
+    def snapshot(self):
+        with self._lock:
+            return [dict(entry, hits=self._hits.get(index, 0)) for index, entry in enumerate(self.patterns)]
+
+
+IGNORE_FILTER = IgnoreFilter()
+
+
 def load_ignored_apps_from_disk():
     global IGNORED_APPS
     try:
         with open(IGNORE_CONFIG_FILE, 'r') as f:
             data = json.load(f)
     except FileNotFoundError:
-        IGNORED_APPS = set()
-        return
+        data = []
     except json.JSONDecodeError as exc:
         print(f"⚠️ Falha ao ler {IGNORE_CONFIG_FILE}: {exc}")
-        IGNORED_APPS = set()
-        return
+        data = []
 
     if isinstance(data, dict):
         apps = data.get("apps", [])
+        patterns = data.get("patterns", [])
     else:
         apps = data
+        patterns = []
     IGNORED_APPS = {str(app) for app in apps}
+    IGNORE_FILTER.rebuild(patterns if isinstance(patterns, list) else [])
+    CONFIG_CACHE.invalidate()
+    # reloaded: a lista veio do disco (SIGHUP, recarga do arquivo) e pode ter mudado por inteiro.
+    EVENT_BUS.emit(EVENT_IGNORE_LIST_CHANGED, {"reloaded": True})
 
 
 def save_ignored_apps_to_disk():
+    data = {"apps": sorted(IGNORED_APPS), "patterns": IGNORE_FILTER.patterns}
     try:
         with open(IGNORE_CONFIG_FILE, 'w') as f:
-            json.dump({"apps": sorted(IGNORED_APPS)}, f, indent=2)
+            json.dump(data, f, indent=2)
     except Exception as exc:
         print(f"⚠️ Falha ao salvar {IGNORE_CONFIG_FILE}: {exc}")
+    CONFIG_CACHE.invalidate()
+    EVENT_BUS.emit(EVENT_IGNORE_LIST_CHANGED, {"reloaded": False})
 
 
-def should_ignore(app_name):
-    if not app_name:
-        return False
-    return str(app_name) in IGNORED_APPS
+def should_ignore(app_name, title=None, body=None):
+    if app_name and (str(app_name) in IGNORED_APPS or IGNORE_FILTER.match("app", str(app_name)) is not None):
+        return True
+    if title and IGNORE_FILTER.match("title", str(title)) is not None:
+        return True
+    return bool(body) and IGNORE_FILTER.match("body", str(body)) is not None
 
 
 def clean_string(value):
@@ -98,26 +1414,44 @@ def clean_string(value):
     return str(value).strip()
 
 
-def read_pending_rule():
+_pending_rule = None
+_pending_rule_lock = threading.Lock()
+
+
+def load_pending_rule_from_disk():
+    global _pending_rule
     try:
         with open(PENDING_RULE_FILE, 'r') as f:
             data = json.load(f)
     except FileNotFoundError:
-        return None
+        data = None
     except json.JSONDecodeError as exc:
         print(f"⚠️ Falha ao ler {PENDING_RULE_FILE}: {exc}")
-        return None
-    if not isinstance(data, dict) or not data:
-        return None
-    return data
+        data = None
+    with _pending_rule_lock:
+        _pending_rule = data if isinstance(data, dict) and data else None
+
+
+def read_pending_rule():
+    with _pending_rule_lock:
+        return dict(_pending_rule) if _pending_rule else None
 
 
 def write_pending_rule(rule_data):
-    try:
-        with open(PENDING_RULE_FILE, 'w') as f:
-            json.dump(rule_data or {}, f, indent=2)
-    except Exception as exc:
-        print(f"⚠️ Falha ao salvar {PENDING_RULE_FILE}: {exc}")
+    global _pending_rule
+    with _pending_rule_lock:
+        _pending_rule = dict(rule_data) if rule_data else None
+        snapshot = dict(_pending_rule) if _pending_rule else {}
+    if PERSIST_PENDING_RULE:
+        try:
+            _write_json_atomic(PENDING_RULE_FILE, snapshot)
+        except Exception as exc:
+            print(f"⚠️ Falha ao salvar {PENDING_RULE_FILE}: {exc}")
+    CONFIG_CACHE.invalidate()
+    if snapshot:
+        EVENT_BUS.emit(EVENT_PENDING_RULE_SET, {"rule": snapshot})
+    else:
+        EVENT_BUS.emit(EVENT_PENDING_RULE_CLEARED)
 
 
 def clear_pending_rule():
@@ -204,108 +1538,1937 @@ def sanitize_rule_payload(payload, *, default_source="extension"):
     if isinstance(metadata, dict):
         sanitized["metadata"] = metadata
 
+    tags = normalize_ntfy_tags(payload.get("tags"))
+    if tags:
+        sanitized["tags"] = tags
+    priority = normalize_ntfy_priority(payload.get("priority"))
+    if priority is not None:
+        sanitized["priority"] = priority
+
     return sanitized
 
 
 load_ignored_apps_from_disk()
+load_pending_rule_from_disk()
+RULE_STORE.load()
+
+# --- Transporte ntfy ---
+class NtfyError(Exception):
+    pass
+
+
+class CircuitOpenError(NtfyError):
+    pass
+
+
+class NtfyRejectedError(NtfyError):
+    """Publicação recusada de vez (4xx não retentável, cabeçalho ou URL inválidos)."""
+
+
+class CircuitBreaker:
+    """Abre após falhas consecutivas e libera uma única tentativa depois do cooldown."""
+
+    def __init__(self, threshold=NTFY_BREAKER_THRESHOLD, cooldown=NTFY_BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if self._probing or time.monotonic() - self._opened_at >= self.cooldown:
+                return "half_open"
+            return "open"
+
+    def retry_in(self):
+        """Segundos até o circuito aceitar uma sondagem (0 se já aceita)."""
+        with self._lock:
+            if self._opened_at is None or self._probing:
+                return 0.0
+            return max(0.0, self.cooldown - (time.monotonic() - self._opened_at))
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._probing or time.monotonic() - self._opened_at < self.cooldown:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            was_open = self._opened_at is not None
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+        if was_open:
+            print("✅ ntfy respondeu novamente; circuito fechado.")
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self._failures < self.threshold:
+                return
+            newly_opened = self._opened_at is None
+            self._opened_at = time.monotonic()
+        if newly_opened:
+            print(f"⚠️ ntfy indisponível; circuito aberto por {self.cooldown:.0f}s.")
+
+
+class NtfyTransport:
+    """Sessão HTTP compartilhada (keep-alive) com timeouts, retentativas e circuit breaker."""
+
+    RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+
+    def __init__(self, base_url=NTFY_BASE_URL, pool_size=DELIVERY_WORKERS, breaker=None):
+        self.base_url = base_url
+        self.pool_size = pool_size
+        self.timeout = (NTFY_CONNECT_TIMEOUT, NTFY_READ_TIMEOUT)
+        self.max_retries = NTFY_MAX_RETRIES
+        self.breaker = breaker or CircuitBreaker()
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    def _get_session(self):
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=0)
+                    session.mount("http://", adapter)
+                    session.mount("https://", adapter)
+                    self._session = session
+        return self._session
+
+    def _backoff(self, attempt):
+        return random.uniform(0, min(NTFY_RETRY_MAX_DELAY, 0.5 * (2 ** attempt)))
+
+    def _retry_after(self, response):
+        value = response.headers.get("Retry-After")
+        if not value:
+            return None
+        try:
+            delay = float(value)
+        except ValueError:
+            from email.utils import parsedate_to_datetime
+
+            try:
+                delay = parsedate_to_datetime(value).timestamp() - time.time()
+            except (TypeError, ValueError):
+                return None
+        return min(NTFY_RETRY_MAX_DELAY, max(0.0, delay))
+
+    def publish(self, topic, data=None, headers=None, files=None, method="POST"):
+        if not self.breaker.allow():
+            raise CircuitOpenError("circuito aberto para o ntfy")
+        import requests
+
+        # Toda saída registra sucesso ou falha: se uma sondagem do half-open
+        # escapasse sem registro, o circuito ficaria preso recusando tudo.
+        healthy = False
+        try:
+            url = f"{self.base_url}/{topic}"
+            session = self._get_session()
+            error = None
+            for attempt in range(self.max_retries + 1):
+                started = time.perf_counter()
+                try:
+                    with TRACER.span("ntfy.request", method=method, attempt=attempt):
+                        response = session.request(
+                            method, url, data=data, headers=headers, files=files, timeout=self.timeout
+                        )
+                except (requests.exceptions.InvalidHeader, requests.exceptions.InvalidURL) as exc:
+                    # Nada foi enviado; repetir a mesma requisição falharia igual.
+                    METRIC_NTFY_RESPONSES.inc("invalid")
+                    raise NtfyRejectedError(f"requisição inválida: {exc}") from exc
+                except requests.RequestException as exc:
+                    METRIC_NTFY_SECONDS.observe(time.perf_counter() - started)
+                    METRIC_NTFY_RESPONSES.inc("error")
+                    error = exc
+                    delay = self._backoff(attempt)
+                else:
+                    METRIC_NTFY_SECONDS.observe(time.perf_counter() - started)
+                    METRIC_NTFY_RESPONSES.inc(str(response.status_code))
+                    if response.status_code < 400:
+                        healthy = True
+                        return response
+                    if response.status_code not in self.RETRY_STATUSES:
+                        # O servidor está de pé; o problema é a requisição em si.
+                        healthy = True
+                        raise NtfyRejectedError(f"HTTP {response.status_code}: {response.text[:200]}")
+                    error = NtfyError(f"HTTP {response.status_code}: {response.text[:200]}")
+                    delay = self._retry_after(response)
+                    if delay is None:
+                        delay = self._backoff(attempt)
+                if attempt < self.max_retries:
+                    time.sleep(delay)
+            raise error
+        finally:
+            if healthy:
+                self.breaker.record_success()
+            else:
+                self.breaker.record_failure()
+
+    def close(self):
+        with self._session_lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+
+NTFY_TRANSPORT = NtfyTransport()
 
 # --- Lógica de Envio ---
-def send_notification(message, screenshot=None, screenshot_title=None, screenshot_mime='image/png'):
+NTFY_MESSAGE_LIMIT = 4000
+NTFY_PRIORITY_NAMES = {"min": 1, "low": 2, "default": 3, "high": 4, "max": 5, "urgent": 5}
+
+
+def _ntfy_header_value(value, limit=None):
+    """Prepara um valor de cabeçalho; texto não-ASCII vai codificado em RFC 2047."""
+    text = str(value).replace("\r", "").replace("\n", "\\n")
+    if limit:
+        text = text[:limit]
+    try:
+        text.encode("ascii")
+        return text
+    except UnicodeEncodeError:
+        encoded = base64.b64encode(text.encode("utf-8")).decode("ascii")
+        return f"=?UTF-8?B?{encoded}?="
+
+
+def normalize_ntfy_priority(value):
+    if value is None or value == "":
+        return None
+    if isinstance(value, str) and value.strip().lower() in NTFY_PRIORITY_NAMES:
+        return NTFY_PRIORITY_NAMES[value.strip().lower()]
+    try:
+        return min(5, max(1, int(value)))
+    except (TypeError, ValueError):
+        return None
+
+
+def normalize_ntfy_tags(value):
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split(",")
+    if not isinstance(value, (list, tuple, set)):
+        return []
+    return [tag for tag in (clean_string(item) for item in value) if tag]
+
+
+def build_ntfy_headers(title=None, tags=None, priority=None):
+    headers = {}
+    if title:
+        headers["Title"] = _ntfy_header_value(title, 120)
+    tags = normalize_ntfy_tags(tags)
+    if tags:
+        headers["Tags"] = _ntfy_header_value(",".join(tags))
+    priority = normalize_ntfy_priority(priority)
+    if priority is not None:
+        headers["Priority"] = str(priority)
+    return headers
+
+
+# Tipos aceitos como Content-Type da captura; o mime vem de data URLs do
+# usuário, então qualquer outro valor vira application/octet-stream.
+SCREENSHOT_MIME_EXTENSIONS = {
+    'image/png': 'png',
+    'image/jpeg': 'jpg',
+    'image/webp': 'webp',
+    'image/gif': 'gif',
+}
+
+
+def screenshot_content_type(screenshot_mime):
+    mime = str(screenshot_mime or '').strip().lower()
+    if mime == 'image/jpg':
+        mime = 'image/jpeg'
+    return mime if mime in SCREENSHOT_MIME_EXTENSIONS else 'application/octet-stream'
+
+
+def screenshot_filename(screenshot_mime, screenshot):
+    extension = SCREENSHOT_MIME_EXTENSIONS.get(screenshot_content_type(screenshot_mime), 'bin')
+    return f"screenshot-{hashlib.sha256(screenshot).hexdigest()[:16]}.{extension}"
+
+
+def send_notification(message, screenshot=None, screenshot_mime='image/png', title=None, tags=None, priority=None):
     if NOTIFICATION_METHOD == "ntfy":
-        send_to_ntfy(message, screenshot=screenshot, screenshot_title=screenshot_title, screenshot_mime=screenshot_mime)
-    else:
-        print(f"❗️ Método de notificação desconhecido: {NOTIFICATION_METHOD}")
+        with TRACER.span("send_notification", method=NOTIFICATION_METHOD):
+            return send_to_ntfy(
+                message,
+                screenshot=screenshot,
+                screenshot_mime=screenshot_mime,
+                title=title,
+                tags=tags,
+                priority=priority,
+            )
+    print(f"❗️ Método de notificação desconhecido: {NOTIFICATION_METHOD}")
+    return False
 
-def send_to_ntfy(message, screenshot=None, screenshot_title=None, screenshot_mime='image/png'):
+def send_to_ntfy(message, screenshot=None, screenshot_mime='image/png', title=None, tags=None, priority=None):
     if not NTFY_TOPIC:
         print("⚠️ NTFY_TOPIC não configurado")
-        return
+        return False
+    headers = build_ntfy_headers(title=title, tags=tags, priority=priority)
     try:
-        requests.post(
-            f"https://ntfy.sh/{NTFY_TOPIC}",
-            data=message.encode('utf-8')
+        with TRACER.span("send_to_ntfy", screenshot=bool(screenshot), mode=NTFY_PUBLISH_MODE):
+            return _publish_to_ntfy(message, screenshot, screenshot_mime, title, headers)
+    except CircuitOpenError:
+        print(f"⏸️ ntfy indisponível (circuito aberto); envio adiado: {message[:30]}...")
+        return False
+    except NtfyRejectedError as e:
+        print(f"🚫 ntfy recusou a notificação; não será reenviada: {e}")
+        raise
+    except Exception as e:
+        print(f"❌ Erro ao enviar para ntfy: {e}")
+        return False
+
+
+def _publish_to_ntfy(message, screenshot, screenshot_mime, title, headers):
+    screenshot_mime = screenshot_content_type(screenshot_mime)
+    if screenshot and NTFY_PUBLISH_MODE != "split":
+        # Um único PUT: a captura vai no corpo e o texto no cabeçalho Message.
+        headers["Filename"] = screenshot_filename(screenshot_mime, screenshot)
+        headers["Message"] = _ntfy_header_value(message, NTFY_MESSAGE_LIMIT)
+        headers["Content-Type"] = screenshot_mime
+        NTFY_TRANSPORT.publish(NTFY_TOPIC, data=screenshot, headers=headers, method="PUT")
+        print(f"✅ Notificação com screenshot enviada via ntfy: {message[:30]}...")
+        return True
+    NTFY_TRANSPORT.publish(NTFY_TOPIC, data=message.encode('utf-8'), headers=headers)
+    print(f"✅ Notificação enviada via ntfy: {message[:30]}...")
+    if screenshot:
+        screenshot_headers = {}
+        if title:
+            screenshot_headers['Title'] = _ntfy_header_value(f"{title} – captura", 120)
+        NTFY_TRANSPORT.publish(
+            NTFY_TOPIC,
+            files={'file': (screenshot_filename(screenshot_mime, screenshot), screenshot, screenshot_mime)},
+            headers=screenshot_headers
         )
-        print(f"✅ Notificação enviada via ntfy.sh: {message[:30]}...")
-        if screenshot:
-            extension = 'png'
-            if screenshot_mime.endswith('/jpeg') or screenshot_mime.endswith('/jpg'):
-                extension = 'jpg'
-            filename = f"screenshot-{int(time.time() * 1000)}.{extension}"
-            headers = {}
-            if screenshot_title:
-                headers['Title'] = screenshot_title[:120]
-            requests.post(
-                f"https://ntfy.sh/{NTFY_TOPIC}",
-                files={'file': (filename, screenshot, screenshot_mime)},
-                headers=headers
+        print("✅ Screenshot enviada via ntfy")
+    return True
+
+
+# --- Pipeline de Capturas ---
+class ScreenshotProcessor:
+    """Executa screenshots.process_screenshot num pool de processos, fora dos threads de ingestão e entrega."""
+
+    def __init__(self, workers=SCREENSHOT_WORKERS):
+        self.workers = workers
+        # Os limites vão explícitos: o worker não lê o config.json.
+        self.limits = (SCREENSHOT_MAX_DIMENSION, SCREENSHOT_MAX_BYTES, SCREENSHOT_QUALITY)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        if self.workers <= 0:
+            return None
+        with self._lock:
+            if self._executor is None:
+                import multiprocessing
+                from concurrent.futures import ProcessPoolExecutor
+
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    def process(self, raw):
+        if not raw:
+            return None, 'image/png', None
+        started = time.perf_counter()
+        try:
+            return self._process(raw)
+        finally:
+            METRIC_SCREENSHOT_SECONDS.observe(time.perf_counter() - started)
+
+    def _process(self, raw):
+        executor = self._get_executor()
+        if executor is None:
+            return process_screenshot(raw, *self.limits)
+        from concurrent.futures.process import BrokenProcessPool
+
+        try:
+            return self._submit(executor, raw).result(timeout=SCREENSHOT_TIMEOUT)
+        except BrokenProcessPool as exc:
+            print(f"⚠️ Pool de capturas quebrou; recriando: {exc}")
+            with self._lock:
+                self._executor = None
+            return process_screenshot(raw, *self.limits)
+        except Exception as exc:
+            print(f"⚠️ Falha ao processar screenshot no pool: {exc}")
+            return None, 'image/png', None
+
+    def _submit(self, executor, raw):
+        # Com spawn, cada worker novo reexecuta o script principal (app.py ou
+        # gui.py) como __mp_main__ antes de importar screenshots.py. Os workers
+        # nascem dentro de submit(), então basta o __main__ não apontar para
+        # arquivo nenhum durante a chamada.
+        main = sys.modules["__main__"]
+        with self._lock:
+            saved = {name: main.__dict__[name] for name in ("__file__", "__spec__") if name in main.__dict__}
+            main.__file__ = main.__spec__ = None
+            try:
+                return executor.submit(process_screenshot, raw, *self.limits)
+            finally:
+                for name in ("__file__", "__spec__"):
+                    if name in saved:
+                        setattr(main, name, saved[name])
+                    else:
+                        delattr(main, name)
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+SCREENSHOT_PROCESSOR = ScreenshotProcessor()
+
+class ScreenshotCache:
+    """Cache endereçado por conteúdo na frente do upload de capturas.
+
+    A chave é o SHA-256 da captura recebida, e o valor é o resultado já
+    processado, com LRU limitado pelo total de bytes. Por regra, guarda a
+    última captura enviada: se a próxima for idêntica ou tiver phash a até
+    SCREENSHOT_PHASH_DISTANCE bits dentro da janela, o anexo é omitido.
+    """
+
+    def __init__(self, processor, max_bytes=SCREENSHOT_CACHE_BYTES, window=SCREENSHOT_DEDUPE_WINDOW,
+                 distance=SCREENSHOT_PHASH_DISTANCE):
+        self.processor = processor
+        self.max_bytes = max_bytes
+        self.window = window
+        self.distance = distance
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._recent = {}
+        self._stats = {"hits": 0, "misses": 0, "skipped": 0, "evicted": 0}
+
+    @staticmethod
+    def _raw_key(raw):
+        if isinstance(raw, str):
+            raw = raw.encode("ascii", "ignore")
+        return hashlib.sha256(raw).hexdigest()
+
+    def _lookup(self, raw):
+        key = self._raw_key(raw)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return entry
+            self._stats["misses"] += 1
+        data, mime, phash = self.processor.process(raw)
+        entry = (data, mime, phash, hashlib.sha256(data).hexdigest() if data else None)
+        if data and len(data) <= self.max_bytes:
+            with self._lock:
+                if key not in self._entries:
+                    self._entries[key] = entry
+                    self._bytes += len(data)
+                while self._bytes > self.max_bytes and self._entries:
+                    _, (evicted, _, _, _) = self._entries.popitem(last=False)
+                    self._bytes -= len(evicted)
+                    self._stats["evicted"] += 1
+        return entry
+
+    def _is_repeat(self, rule_key, digest, phash, now):
+        previous = self._recent.get(rule_key)
+        if previous is None or now - previous[2] > self.window:
+            return False
+        if previous[0] == digest:
+            return True
+        return phash is not None and previous[1] is not None and bin(phash ^ previous[1]).count("1") <= self.distance
+
+    def prepare(self, raw, rule_key=None):
+        """Devolve (bytes, mime, recibo); bytes é None se não houver anexo a enviar.
+
+        O recibo vai para commit() só depois que o ntfy aceitar a publicação:
+        uma captura cujo envio falhou não pode fazer o reenvio omitir o anexo.
+        """
+        if not raw:
+            return None, 'image/png', None
+        data, mime, phash, digest = self._lookup(raw)
+        if not data or not rule_key or self.window <= 0:
+            return data, mime, None
+        with self._lock:
+            if self._is_repeat(rule_key, digest, phash, time.monotonic()):
+                self._stats["skipped"] += 1
+                print(f"♻️ Captura inalterada para '{rule_key}'; anexo omitido.")
+                return None, mime, None
+        return data, mime, (rule_key, digest, phash)
+
+    def commit(self, receipt):
+        """Registra a captura de um envio confirmado como a última da regra."""
+        if receipt is None:
+            return
+        rule_key, digest, phash = receipt
+        now = time.monotonic()
+        with self._lock:
+            self._recent[rule_key] = (digest, phash, now)
+            if len(self._recent) > 4096:
+                cutoff = now - self.window
+                self._recent = {key: value for key, value in self._recent.items() if value[2] >= cutoff}
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["bytes"] = self._bytes
+        return stats
+
+
+SCREENSHOT_CACHE = ScreenshotCache(SCREENSHOT_PROCESSOR)
+
+
+# --- Histórico de Notificações ---
+class HistoryRecord:
+    __slots__ = ("seq", "timestamp", "source", "app", "rule", "status", "latency", "event_id", "summary")
+
+    def __init__(self, seq, source, app, rule, status, event_id, summary):
+        self.seq = seq
+        self.timestamp = time.time()
+        self.source = source
+        self.app = app
+        self.rule = rule
+        self.status = status
+        self.latency = None
+        self.event_id = event_id
+        self.summary = summary
+
+    def to_dict(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+
+class NotificationHistory:
+    """Anel de capacidade fixa com os eventos recentes (recebidos, ignorados, entregues...).
+
+    Registros usam __slots__ e strings internadas, então a memória fica
+    estável na capacidade configurada; o mais antigo é sobrescrito.
+    """
+
+    SUMMARY_LIMIT = 120
+
+    def __init__(self, capacity=HISTORY_CAPACITY):
+        self.capacity = capacity
+        self._ring = [None] * capacity
+        self._seq = 0
+        self._by_event = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _intern(value):
+        return sys.intern(str(value)) if value else None
+
+    def record(self, source, app, status, rule=None, event_id=None, summary=None):
+        if summary and len(summary) > self.SUMMARY_LIMIT:
+            summary = summary[: self.SUMMARY_LIMIT - 1] + "…"
+        with self._lock:
+            self._seq += 1
+            slot = self._seq % self.capacity
+            old = self._ring[slot]
+            if old is not None and old.event_id is not None:
+                self._by_event.pop(old.event_id, None)
+            entry = HistoryRecord(
+                self._seq,
+                self._intern(source),
+                self._intern(app),
+                self._intern(rule),
+                sys.intern(status),
+                event_id,
+                summary,
             )
-            print("✅ Screenshot enviada via ntfy.sh")
-    except Exception as e:
-        print(f"❌ Erro ao enviar para ntfy.sh: {e}")
+            self._ring[slot] = entry
+            if event_id is not None:
+                self._by_event[event_id] = entry
+        return entry
+
+    def set_status(self, event_id, status):
+        with self._lock:
+            entry = self._by_event.get(event_id)
+            if entry is not None and entry.status not in ("delivered", "failed", "rejected", "dead"):
+                entry.status = sys.intern(status)
+
+    def complete(self, event_id, status, created_at=None):
+        """Atualiza o status final (entregue/falhou) e a latência desde a ingestão."""
+        with self._lock:
+            entry = self._by_event.get(event_id)
+            if entry is None:
+                return
+            entry.status = sys.intern(status)
+            entry.latency = round(time.time() - (created_at or entry.timestamp), 3)
+
+    def query(self, limit=50, before=None, **filters):
+        """Eventos do mais novo para o mais antigo; `before` é o cursor (seq) da página anterior."""
+        filters = {key: value for key, value in filters.items() if value}
+        results = []
+        with self._lock:
+            newest = self._seq if before is None else min(before - 1, self._seq)
+            oldest = max(1, self._seq - self.capacity + 1)
+            seq = newest
+            while seq >= oldest and len(results) < limit:
+                entry = self._ring[seq % self.capacity]
+                seq -= 1
+                if entry is None or any(getattr(entry, key) != value for key, value in filters.items()):
+                    continue
+                results.append(entry.to_dict())
+            has_more = seq >= oldest
+        return results, (results[-1]["seq"] if results and has_more else None)
+
+    def since(self, seq):
+        """Registros com seq > `seq` (no máximo a capacidade), em ordem crescente."""
+        with self._lock:
+            start = max(seq + 1, self._seq - self.capacity + 1, 1)
+            return [self._ring[index % self.capacity] for index in range(start, self._seq + 1)]
+
+    @property
+    def last_seq(self):
+        return self._seq
+
+
+HISTORY = NotificationHistory()
+
+
+# --- Fila de Entrega ---
+class DeliveryJob:
+    __slots__ = ("event_id", "message", "screenshot", "title", "tags", "priority", "source", "created_at")
+
+    def __init__(self, message, screenshot=None, title=None, tags=None, priority=None, source="http", event_id=None):
+        self.event_id = event_id or uuid.uuid4().hex
+        self.message = message
+        self.screenshot = screenshot
+        self.title = title
+        self.tags = tags
+        self.priority = priority
+        self.source = source
+        self.created_at = time.time()
+
+
+class DeliverySpool:
+    """Outbox durável em SQLite (WAL); capturas ficam em arquivos à parte.
+
+    Cada job é gravado antes do ack da ingestão e apagado quando o ntfy
+    confirma. O que falhou (ou sobrou de uma execução anterior) é reenviado
+    em ordem pelo replayer. Eventos retidos no coalescer ou adiados pelo
+    limite de taxa ficam como 'held' até saírem (ou virarem parte de um
+    resumo); se o processo cair antes disso, voltam como entregas avulsas.
+    Recusas definitivas do ntfy e jobs que seguem falhando depois de max_age
+    segundos vão para o estado 'dead' e deixam de bloquear a fila; falhas
+    transitórias (circuito aberto, conexão) não contam tentativas para isso.
+    """
+
+    def __init__(self, path=SPOOL_DB_FILE, blob_dir=SPOOL_BLOB_DIR, max_bytes=SPOOL_MAX_BYTES, max_age=SPOOL_MAX_AGE):
+        self.path = path
+        self.blob_dir = blob_dir
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._conn = None
+        self._bytes = 0
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._stats = {"spooled": 0, "held": 0, "acked": 0, "replayed": 0, "evicted": 0, "dead_lettered": 0}
+
+    def open(self):
+        if self._conn is not None:
+            return
+        os.makedirs(self.blob_dir, exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS outbox (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                event_id TEXT NOT NULL UNIQUE,
+                created_at REAL NOT NULL,
+                source TEXT,
+                message TEXT NOT NULL,
+                title TEXT,
+                tags TEXT,
+                priority INTEGER,
+                blob TEXT,
+                size INTEGER NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                state TEXT NOT NULL DEFAULT 'queued'
+            )"""
+        )
+        # O que estava na fila (ou retido) em memória quando o processo caiu volta para o replay.
+        conn.execute("UPDATE outbox SET state = 'failed' WHERE state IN ('queued', 'held')")
+        self._bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM outbox").fetchone()[0]
+        pending = conn.execute("SELECT COUNT(*) FROM outbox WHERE state != 'dead'").fetchone()[0]
+        self._conn = conn
+        if pending:
+            print(f"📼 {pending} notificações pendentes no spool serão reenviadas.")
+            self._wake.set()
+
+    def _blob_path(self, name):
+        return os.path.join(self.blob_dir, name)
+
+    def append(self, job, state="queued"):
+        """Grava o job; uma entrada retida com o mesmo event_id é substituída."""
+        with self._lock:
+            self._remove(job.event_id)
+        blob_name = None
+        size = len(job.message.encode("utf-8"))
+        if job.screenshot:
+            if isinstance(job.screenshot, str):
+                blob_name, payload = f"{job.event_id}.txt", job.screenshot.encode("ascii", "ignore")
+            else:
+                blob_name, payload = f"{job.event_id}.bin", job.screenshot
+            size += len(payload)
+            try:
+                with open(self._blob_path(blob_name), "wb") as f:
+                    f.write(payload)
+            except OSError as exc:
+                print(f"⚠️ Falha ao gravar captura no spool: {exc}")
+                blob_name = None
+        with self._lock:
+            self._make_room(size)
+            self._conn.execute(
+                "INSERT INTO outbox (event_id, created_at, source, message, title, tags, priority, blob, size, state)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    job.event_id,
+                    job.created_at,
+                    job.source,
+                    job.message,
+                    job.title,
+                    json.dumps(normalize_ntfy_tags(job.tags)),
+                    normalize_ntfy_priority(job.priority),
+                    blob_name,
+                    size,
+                    state,
+                ),
+            )
+            self._bytes += size
+            self._stats["held" if state == "held" else "spooled"] += 1
+
+    def _make_room(self, incoming):
+        while self._bytes + incoming > self.max_bytes:
+            row = self._conn.execute("SELECT event_id, blob, size FROM outbox ORDER BY seq LIMIT 1").fetchone()
+            if row is None:
+                return
+            self._delete(*row)
+            self._stats["evicted"] += 1
+            print(f"⚠️ Spool acima de {self.max_bytes} bytes; descartando a entrada mais antiga.")
+
+    def _delete(self, event_id, blob_name, size):
+        self._conn.execute("DELETE FROM outbox WHERE event_id = ?", (event_id,))
+        self._bytes = max(0, self._bytes - size)
+        if blob_name:
+            try:
+                os.remove(self._blob_path(blob_name))
+            except FileNotFoundError:
+                pass
+
+    def _remove(self, event_id):
+        row = self._conn.execute("SELECT blob, size FROM outbox WHERE event_id = ?", (event_id,)).fetchone()
+        if row is not None:
+            self._delete(event_id, *row)
+        return row is not None
+
+    def discard(self, *event_ids):
+        with self._lock:
+            for event_id in event_ids:
+                self._remove(event_id)
+
+    def ack(self, event_id):
+        with self._lock:
+            if self._remove(event_id):
+                self._stats["acked"] += 1
+
+    def mark_failed(self, event_id):
+        """Registra uma falha transitória; devolve True se o job passou de max_age e virou 'dead'.
+
+        Não acorda o replayer: quem decide quando tentar de novo é o backoff do _replay_loop.
+        """
+        with self._lock:
+            self._conn.execute(
+                "UPDATE outbox SET attempts = attempts + 1,"
+                " state = CASE WHEN created_at < ? THEN 'dead' ELSE 'failed' END WHERE event_id = ?",
+                (time.time() - self.max_age, event_id),
+            )
+            row = self._conn.execute("SELECT state FROM outbox WHERE event_id = ?", (event_id,)).fetchone()
+            dead = row is not None and row[0] == "dead"
+            if dead:
+                self._stats["dead_lettered"] += 1
+        if dead:
+            print(f"🪦 Entrega {event_id} falhando há mais de {self.max_age:.0f}s; movida para o dead-letter do spool.")
+        return dead
+
+    def mark_dead(self, event_id):
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE outbox SET state = 'dead', attempts = attempts + 1 WHERE event_id = ? AND state != 'dead'",
+                (event_id,),
+            )
+            if cursor.rowcount:
+                self._stats["dead_lettered"] += 1
+
+    def _next_failed(self, after_seq):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT seq, event_id, created_at, source, message, title, tags, priority, blob"
+                " FROM outbox WHERE state = 'failed' AND seq > ? ORDER BY seq LIMIT 1",
+                (after_seq,),
+            ).fetchone()
+        if row is None:
+            return None, None
+        seq, event_id, created_at, source, message, title, tags, priority, blob_name = row
+        screenshot = None
+        if blob_name:
+            try:
+                with open(self._blob_path(blob_name), "rb") as f:
+                    screenshot = f.read()
+                if blob_name.endswith(".txt"):
+                    screenshot = screenshot.decode("ascii")
+            except OSError:
+                screenshot = None
+        job = DeliveryJob(
+            message,
+            screenshot=screenshot,
+            title=title,
+            tags=json.loads(tags or "[]"),
+            priority=priority,
+            source=source,
+            event_id=event_id,
+        )
+        job.created_at = created_at
+        return seq, job
+
+    def start_replayer(self, deliver):
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._replay_loop, args=(deliver,), name="spool-replayer", daemon=True)
+        self._thread.start()
+
+    def _has_failed(self):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM outbox WHERE state = 'failed' LIMIT 1").fetchone() is not None
+
+    def _replay_loop(self, deliver):
+        delay = SPOOL_REPLAY_INTERVAL
+        while not self._stopping.is_set():
+            self._wake.wait(delay)
+            self._wake.clear()
+            if self._stopping.is_set():
+                return
+            cooldown = NTFY_TRANSPORT.breaker.retry_in()
+            if cooldown > 0:
+                # Circuito aberto: esperar o cooldown em vez de gastar a cabeça da fila.
+                delay = max(SPOOL_REPLAY_INTERVAL, cooldown)
+                continue
+            replayed = self._replay_once(deliver)
+            if replayed:
+                self.compact()
+            if replayed == 0 and self._has_failed():
+                delay = min(delay * 2, SPOOL_REPLAY_MAX_DELAY)
+            else:
+                delay = SPOOL_REPLAY_INTERVAL
+
+    def _replay_once(self, deliver):
+        replayed = 0
+        seq = 0
+        while not self._stopping.is_set():
+            seq, job = self._next_failed(seq)
+            if job is None:
+                break
+            outcome = deliver(job)
+            if outcome == DELIVERY_REJECTED:
+                self.mark_dead(job.event_id)
+                HISTORY.complete(job.event_id, DELIVERY_REJECTED, job.created_at)
+                continue
+            if outcome != DELIVERY_DELIVERED:
+                if self.mark_failed(job.event_id):
+                    HISTORY.complete(job.event_id, DELIVERY_DEAD, job.created_at)
+                    continue
+                # Mantém a ordem: o restante espera a próxima rodada.
+                break
+            self.ack(job.event_id)
+            HISTORY.complete(job.event_id, DELIVERY_DELIVERED, job.created_at)
+            replayed += 1
+        if replayed:
+            with self._lock:
+                self._stats["replayed"] += replayed
+            print(f"📼 {replayed} notificações reenviadas a partir do spool.")
+        return replayed
+
+    def compact(self):
+        with self._lock:
+            try:
+                self._conn.execute("PRAGMA incremental_vacuum")
+                self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            except sqlite3.Error as exc:
+                print(f"⚠️ Falha ao compactar o spool: {exc}")
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self._stats)
+            if self._conn is not None:
+                counts = dict(self._conn.execute("SELECT state, COUNT(*) FROM outbox GROUP BY state").fetchall())
+                stats["pending"] = counts.get("queued", 0) + counts.get("failed", 0)
+                stats["retained"] = counts.get("held", 0)
+                stats["dead"] = counts.get("dead", 0)
+            stats["bytes"] = self._bytes
+        stats["max_bytes"] = self.max_bytes
+        return stats
+
+    def close(self):
+        self._stopping.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+DELIVERY_DELIVERED = "delivered"
+DELIVERY_FAILED = "failed"
+DELIVERY_REJECTED = "rejected"
+DELIVERY_DEAD = "dead"
+
+
+class DeliveryQueue:
+    """Fila limitada entre a ingestão e o ntfy, drenada por um pool de workers."""
+
+    def __init__(self, workers=DELIVERY_WORKERS, maxsize=DELIVERY_QUEUE_SIZE, spool=None):
+        self.workers = workers
+        self.maxsize = maxsize
+        self.spool = spool
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._threads = []
+        self._stats_lock = threading.Lock()
+        self._stats = {"enqueued": 0, "delivered": 0, "failed": 0, "rejected": 0, "dropped": 0}
+
+    def start(self):
+        if self._threads:
+            return
+        if self.spool is not None:
+            try:
+                self.spool.open()
+                self.spool.start_replayer(self._send)
+            except (OSError, sqlite3.Error) as exc:
+                print(f"❌ Spool indisponível; seguindo só em memória: {exc}")
+                self.spool = None
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"delivery-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        print(f"✅ Fila de entrega iniciada ({self.workers} workers, capacidade {self.maxsize}).")
+
+    def submit(self, message, screenshot=None, title=None, tags=None, priority=None, source="http", event_id=None):
+        job = DeliveryJob(
+            message,
+            screenshot=screenshot,
+            title=title,
+            tags=tags,
+            priority=priority,
+            source=source,
+            event_id=event_id,
+        )
+        if self._queue.full():
+            return self._drop(job)
+        if self.spool is not None:
+            try:
+                self.spool.append(job)
+            except (OSError, sqlite3.Error) as exc:
+                print(f"⚠️ Falha ao gravar no spool: {exc}")
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            if self.spool is not None:
+                self.spool.discard(job.event_id)
+            return self._drop(job)
+        self._count("enqueued")
+        RATE_LIMITER.charge_topic()
+        return job.event_id
+
+    def hold(self, message, screenshot=None, title=None, tags=None, priority=None, source="http", event_id=None):
+        """Grava no spool um evento que ainda vai esperar em memória (coalescer ou adiamento)."""
+        if self.spool is None or event_id is None:
+            return
+        job = DeliveryJob(
+            message,
+            screenshot=screenshot,
+            title=title,
+            tags=tags,
+            priority=priority,
+            source=source,
+            event_id=event_id,
+        )
+        try:
+            self.spool.append(job, state="held")
+        except (OSError, sqlite3.Error) as exc:
+            print(f"⚠️ Falha ao gravar no spool: {exc}")
+
+    def release(self, *event_ids):
+        """Apaga do spool eventos retidos que foram absorvidos num resumo ou descartados."""
+        if self.spool is None or not event_ids:
+            return
+        try:
+            self.spool.discard(*event_ids)
+        except sqlite3.Error as exc:
+            print(f"⚠️ Falha ao atualizar o spool: {exc}")
+
+    def _drop(self, job):
+        self._count("dropped")
+        print(f"⚠️ Fila de entrega cheia; notificação descartada: {job.message[:30]}...")
+        return None
+
+    def is_full(self):
+        return self._queue.full()
+
+    def record_drop(self):
+        self._count("dropped")
+
+    def _count(self, key):
+        with self._stats_lock:
+            self._stats[key] += 1
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                self._deliver(job)
+            finally:
+                self._queue.task_done()
+
+    def _send(self, job):
+        """Entrega um job; devolve DELIVERY_DELIVERED, DELIVERY_FAILED ou DELIVERY_REJECTED."""
+        try:
+            with TRACER.span("screenshot.prepare"):
+                screenshot_bytes, screenshot_mime, receipt = SCREENSHOT_CACHE.prepare(job.screenshot, rule_key=job.title)
+            delivered = send_notification(
+                job.message,
+                screenshot=screenshot_bytes,
+                screenshot_mime=screenshot_mime,
+                title=job.title,
+                tags=job.tags,
+                priority=job.priority,
+            )
+        except NtfyRejectedError:
+            return DELIVERY_REJECTED
+        except Exception as exc:
+            print(f"❌ Erro inesperado na entrega {job.event_id}: {exc}")
+            return DELIVERY_FAILED
+        if not delivered:
+            return DELIVERY_FAILED
+        SCREENSHOT_CACHE.commit(receipt)
+        return DELIVERY_DELIVERED
+
+    def _deliver(self, job):
+        with TRACER.resume("delivery", job.event_id, queued_at=job.created_at, source=job.source):
+            outcome = self._send(job)
+        self._count(outcome)
+        HISTORY.complete(job.event_id, outcome, job.created_at)
+        METRIC_DELIVERY_SECONDS.observe(time.time() - job.created_at, outcome)
+        if outcome != DELIVERY_DELIVERED:
+            EVENT_BUS.emit(EVENT_DELIVERY_FAILED, {
+                "event_id": job.event_id,
+                "source": job.source,
+                "message": job.message,
+                "spooled": self.spool is not None and outcome == DELIVERY_FAILED,
+            })
+        if self.spool is not None:
+            try:
+                if outcome == DELIVERY_DELIVERED:
+                    self.spool.ack(job.event_id)
+                elif outcome == DELIVERY_REJECTED:
+                    self.spool.mark_dead(job.event_id)
+                elif self.spool.mark_failed(job.event_id):
+                    HISTORY.complete(job.event_id, DELIVERY_DEAD, job.created_at)
+            except sqlite3.Error as exc:
+                print(f"⚠️ Falha ao atualizar o spool: {exc}")
+
+    def snapshot(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats.update({
+            "depth": self._queue.qsize(),
+            "capacity": self.maxsize,
+            "workers": self.workers,
+            "circuit": NTFY_TRANSPORT.breaker.state,
+        })
+        if self.spool is not None:
+            stats["spool"] = self.spool.snapshot()
+        return stats
+
+    def stop(self, timeout=2.0):
+        threads, self._threads = self._threads, []
+        for _ in threads:
+            try:
+                self._queue.put(None, timeout=timeout)
+            except queue.Full:
+                break
+        for thread in threads:
+            thread.join(timeout=timeout)
+        if self.spool is not None:
+            self.spool.close()
+
+
+DELIVERY_QUEUE = DeliveryQueue(spool=DeliverySpool() if SPOOL_ENABLED else None)
+METRICS.gauge("notify_delivery_queue_depth", "Jobs aguardando na fila de entrega.", lambda: DELIVERY_QUEUE._queue.qsize())
+METRICS.gauge("notify_ntfy_circuit_open", "1 quando o circuito do ntfy está aberto.", lambda: NTFY_TRANSPORT.breaker.state == "open")
+
+# --- Agrupamento de Rajadas ---
+class BurstCoalescer:
+    """Agrupa eventos da mesma origem (app ou regra) numa janela e entrega um resumo.
+
+    O primeiro evento de uma chave ociosa sai na hora; os seguintes dentro da
+    janela viram uma única mensagem quando ela fecha ou quando o limite enche.
+    """
+
+    DIGEST_LINES = 5
+
+    def __init__(self, queue_, window=COALESCE_WINDOW, max_events=COALESCE_MAX_EVENTS):
+        self.queue = queue_
+        self.window = window
+        self.max_events = max_events
+        self._buckets = {}
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+        self._stats = {"events": 0, "passed": 0, "coalesced": 0, "digests": 0}
+
+    @property
+    def enabled(self):
+        return self.window > 0
+
+    def start(self):
+        if not self.enabled or self._thread is not None:
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="coalescer", daemon=True)
+        self._thread.start()
+
+    def add(self, key, label, message, summary=None, event_id=None, hold=None, **fields):
+        """Entrega ou agrupa um evento; ``hold`` (segundos) força o agrupamento."""
+        event_id = event_id or uuid.uuid4().hex
+        now = time.monotonic()
+        with self._cond:
+            self._stats["events"] += 1
+            bucket = self._buckets.get(key) if self.enabled else None
+            if bucket is None and hold and self.enabled:
+                bucket = {"label": label, "deadline": now + max(hold, self.window), "events": []}
+                self._buckets[key] = bucket
+                self._cond.notify()
+            if bucket is None:
+                if self.enabled:
+                    self._buckets[key] = {"label": label, "deadline": now + self.window, "events": []}
+                    self._cond.notify()
+                self._stats["passed"] += 1
+                digest = None
+            else:
+                bucket["events"].append((event_id, message, summary or message, fields))
+                self._stats["coalesced"] += 1
+                digest = None
+                if len(bucket["events"]) >= self.max_events:
+                    digest = (bucket["label"], bucket["events"])
+                    bucket["events"] = []
+                else:
+                    # Ainda sob o lock, para o _flush não passar na frente da gravação.
+                    self.queue.hold(message, event_id=event_id, **fields)
+                    return event_id
+        if digest is not None:
+            self._flush(*digest)
+            return event_id
+        if self.queue.submit(message, event_id=event_id, **fields) is None:
+            return None
+        return event_id
+
+    def _run(self):
+        while True:
+            due = []
+            with self._cond:
+                while not self._stopping:
+                    now = time.monotonic()
+                    expired = [key for key, bucket in self._buckets.items() if bucket["deadline"] <= now]
+                    if expired:
+                        break
+                    timeout = None
+                    if self._buckets:
+                        timeout = min(bucket["deadline"] for bucket in self._buckets.values()) - now
+                    self._cond.wait(timeout)
+                else:
+                    expired = list(self._buckets)
+                for key in expired:
+                    bucket = self._buckets.pop(key)
+                    if bucket["events"]:
+                        due.append((bucket["label"], bucket["events"]))
+                stopping = self._stopping
+            for label, events in due:
+                self._flush(label, events)
+            if stopping:
+                return
+
+    def _flush(self, label, events):
+        if len(events) == 1:
+            event_id, message, _, fields = events[0]
+            if self.queue.submit(message, event_id=event_id, **fields) is None:
+                self.queue.release(event_id)
+            return
+        with self._cond:
+            self._stats["digests"] += 1
+        lines = [f"• {summary}" for _, _, summary, _ in events[: self.DIGEST_LINES]]
+        if len(events) > self.DIGEST_LINES:
+            lines.append(f"… e mais {len(events) - self.DIGEST_LINES}")
+        message = f"{len(events)} novas mensagens de {label}:\n" + "\n".join(lines)
+        tags = []
+        priority = None
+        screenshot = None
+        for _, _, _, fields in events:
+            for tag in normalize_ntfy_tags(fields.get("tags")):
+                if tag not in tags:
+                    tags.append(tag)
+            event_priority = normalize_ntfy_priority(fields.get("priority"))
+            if event_priority is not None and (priority is None or event_priority > priority):
+                priority = event_priority
+            screenshot = fields.get("screenshot") or screenshot
+        first_fields = events[0][3]
+        for event_id, _, _, _ in events[1:]:
+            HISTORY.set_status(event_id, "coalesced")
+        print(f"📦 Resumo de {len(events)} eventos de {label}.")
+        # O resumo herda o event_id do primeiro evento e substitui a entrada dele no spool.
+        submitted = self.queue.submit(
+            message,
+            screenshot=screenshot,
+            title=first_fields.get("title") or label,
+            tags=tags,
+            priority=priority,
+            source=first_fields.get("source", "http"),
+            event_id=events[0][0],
+        )
+        superseded = [event_id for event_id, _, _, _ in events[1:]]
+        if submitted is None:
+            superseded.append(events[0][0])
+        self.queue.release(*superseded)
+
+    def snapshot(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats["open_windows"] = len(self._buckets)
+        stats["window"] = self.window
+        return stats
+
+    def stop(self):
+        if self._thread is None:
+            return
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        self._thread.join(timeout=2.0)
+        self._thread = None
+
+
+COALESCER = BurstCoalescer(DELIVERY_QUEUE)
+
+
+# --- Deduplicação ---
+class DedupeEngine:
+    """LRU limitado de hashes de conteúdo normalizado, com TTL por origem.
+
+    Compartilhado por DBus e HTTP, descarta reenvios (de várias abas ou do
+    mesmo cliente DBus) antes de qualquer I/O de rede.
+    """
+
+    def __init__(self, ttls=None, max_entries=DEDUPE_MAX_ENTRIES):
+        self.ttls = ttls or {"dbus": DEDUPE_DBUS_TTL, "http": DEDUPE_HTTP_TTL}
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"checked": 0, "duplicates": 0, "evicted": 0}
+
+    @staticmethod
+    def fingerprint(app_name, title="", body="", rule_id=""):
+        parts = (" ".join(str(part or "").split()).casefold() for part in (app_name, title, body, rule_id))
+        return hashlib.blake2b("\x1f".join(parts).encode("utf-8"), digest_size=16).digest()
+
+    def is_duplicate(self, source, app_name, title="", body="", rule_id=""):
+        """Registra o evento e diz se um igual já passou dentro do TTL da origem."""
+        ttl = self.ttls.get(source, DEDUPE_HTTP_TTL)
+        if ttl <= 0:
+            return False
+        key = self.fingerprint(app_name, title, body, rule_id)
+        now = time.monotonic()
+        with self._lock:
+            self._stats["checked"] += 1
+            expires = self._entries.get(key)
+            if expires is not None and expires > now:
+                self._entries.move_to_end(key)
+                self._stats["duplicates"] += 1
+                return True
+            self._entries[key] = now + ttl
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evicted"] += 1
+        return False
+
+    def forget(self, app_name, title="", body="", rule_id=""):
+        """Desfaz o registro de um evento que não chegou a ser aceito (429), para o reenvio passar."""
+        key = self.fingerprint(app_name, title, body, rule_id)
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        stats["ttls"] = dict(self.ttls)
+        return stats
+
+
+DEDUPE = DedupeEngine()
+
+
+# --- Limite de taxa (token bucket) ---
+RATE_LIMIT_SCOPES = ("app", "rule", "topic")
+RATE_LIMIT_ACTIONS = ("drop", "defer", "fold")
+RATE_LIMIT_DEFAULTS = {
+    "action": "fold",
+    "app": {"per_minute": 30, "burst": 10},
+    "rule": {"per_minute": 30, "burst": 10},
+    # O ntfy.sh libera rajadas de 60 e repõe 1 requisição a cada 5 s.
+    "topic": {"per_minute": 12, "burst": 60},
+    "max_deferred": 500,
+}
+
+
+def normalize_rate_limits(raw):
+    limits = {"action": RATE_LIMIT_DEFAULTS["action"], "max_deferred": RATE_LIMIT_DEFAULTS["max_deferred"]}
+    raw = raw if isinstance(raw, dict) else {}
+    action = str(raw.get("action") or limits["action"]).lower()
+    limits["action"] = action if action in RATE_LIMIT_ACTIONS else RATE_LIMIT_DEFAULTS["action"]
+    try:
+        limits["max_deferred"] = max(0, int(raw.get("max_deferred", limits["max_deferred"])))
+    except (TypeError, ValueError):
+        pass
+    for scope in RATE_LIMIT_SCOPES:
+        level = dict(RATE_LIMIT_DEFAULTS[scope])
+        if isinstance(raw.get(scope), dict):
+            for field in ("per_minute", "burst"):
+                try:
+                    level[field] = max(0, int(raw[scope].get(field, level[field])))
+                except (TypeError, ValueError):
+                    print(f"⚠️ Valor inválido para 'rate_limits.{scope}.{field}' em {CONFIG_FILE}.")
+        level["burst"] = max(1, level["burst"])
+        limits[scope] = level
+    return limits
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, per_minute, burst, now):
+        self.rate = per_minute / 60.0
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.updated = now
+
+    def refill(self, now):
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def wait_time(self):
+        if self.tokens >= 1.0:
+            return 0.0
+        if self.rate <= 0:
+            return float("inf")
+        return (1.0 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """Token buckets por app, por regra e global por tópico, avaliados em O(1).
+
+    Um evento só passa se houver ficha em todos os níveis ativos; caso
+    contrário é descartado, adiado até a reposição ou dobrado num resumo.
+    Os buckets formam um LRU limitado a MAX_BUCKETS.
+    """
+
+    MAX_BUCKETS = 4096
+
+    def __init__(self, limits=None, topic=NTFY_TOPIC):
+        self.topic = topic
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+        self._deferred = []
+        self._wake = threading.Condition(self._lock)
+        self._thread = None
+        self._stopping = False
+        self._seq = 0
+        self._stats = {"allowed": 0, "dropped": 0, "deferred": 0, "folded": 0, "released": 0}
+        self._limited_by = dict.fromkeys(RATE_LIMIT_SCOPES, 0)
+        self.configure(limits)
+
+    def configure(self, limits):
+        limits = normalize_rate_limits(limits)
+        with self._lock:
+            if limits == getattr(self, "limits", None):
+                return
+            self.limits = limits
+            self._buckets.clear()
+
+    @property
+    def action(self):
+        return self.limits["action"]
+
+    def _bucket(self, scope, key, now):
+        level = self.limits[scope]
+        if level["per_minute"] <= 0:
+            return None
+        bucket = self._buckets.get((scope, key))
+        if bucket is None:
+            while len(self._buckets) >= self.MAX_BUCKETS:
+                self._buckets.popitem(last=False)
+            bucket = TokenBucket(level["per_minute"], level["burst"], now)
+            self._buckets[(scope, key)] = bucket
+        else:
+            self._buckets.move_to_end((scope, key))
+        bucket.refill(now)
+        return bucket
+
+    def check(self, app_name=None, rule_name=None):
+        """Consome uma ficha de app e de regra; devolve (espera, nível) se faltar alguma.
+
+        O tópico só é consultado aqui: a ficha dele é cobrada uma vez por
+        publicação, em charge_topic(), para eventos dobrados num resumo não
+        pagarem cada um a sua.
+        """
+        now = time.monotonic()
+        with self._lock:
+            buckets = []
+            for scope, key in (("app", app_name), ("rule", rule_name), ("topic", self.topic)):
+                if not key:
+                    continue
+                bucket = self._bucket(scope, key, now)
+                if bucket is not None:
+                    buckets.append((scope, bucket))
+            wait, limited = 0.0, None
+            for scope, bucket in buckets:
+                needed = bucket.wait_time()
+                if needed > wait:
+                    wait, limited = needed, scope
+            if limited is not None:
+                self._limited_by[limited] += 1
+                return wait, limited
+            for scope, bucket in buckets:
+                if scope != "topic":
+                    bucket.tokens -= 1.0
+            self._stats["allowed"] += 1
+        return 0.0, None
+
+    def charge_topic(self):
+        """Cobra a ficha do tópico por uma publicação enfileirada (evento avulso ou resumo)."""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._bucket("topic", self.topic, now)
+            if bucket is not None:
+                # Pode ficar negativo: admissões concorrentes viram dívida paga pela reposição.
+                bucket.tokens -= 1.0
+
+    def record(self, outcome):
+        with self._lock:
+            self._stats[outcome] += 1
+
+    def defer(self, delay, callback):
+        with self._lock:
+            if len(self._deferred) >= self.limits["max_deferred"]:
+                self._stats["dropped"] += 1
+                return False
+            self._seq += 1
+            heapq.heappush(self._deferred, (time.monotonic() + delay, self._seq, callback))
+            self._stats["deferred"] += 1
+            if self._thread is None:
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, name="rate-limiter", daemon=True)
+                self._thread.start()
+            self._wake.notify()
+        return True
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._stopping:
+                    now = time.monotonic()
+                    if self._deferred and self._deferred[0][0] <= now:
+                        break
+                    self._wake.wait(self._deferred[0][0] - now if self._deferred else None)
+                if self._stopping:
+                    return
+                _, _, callback = heapq.heappop(self._deferred)
+                self._stats["released"] += 1
+            try:
+                callback()
+            except Exception as exc:
+                print(f"⚠️ Erro ao liberar notificação adiada: {exc}")
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["limited_by"] = dict(self._limited_by)
+            stats["pending_deferred"] = len(self._deferred)
+            stats["buckets"] = len(self._buckets)
+            stats["limits"] = json.loads(json.dumps(self.limits))
+        return stats
+
+    def stop(self):
+        with self._lock:
+            self._stopping = True
+            self._wake.notify()
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout=2.0)
+
+
+RATE_LIMITER = RateLimiter(_config.get("rate_limits"))
+
+
+def ingest_event(key, label, message, app_name=None, rule_name=None, summary=None, event_id=None, **fields):
+    """Passa um evento pelo limite de taxa e pelo coalescer, registrando-o no histórico.
+
+    Devolve (resultado, event_id, espera): resultado é "queued", "folded",
+    "deferred", "rate_limited" ou "queue_full".
+    """
+    event_id = event_id or uuid.uuid4().hex
+    HISTORY.record(fields.get("source", "http"), app_name or label, "received", rule=rule_name, event_id=event_id, summary=summary or message)
+    TRACER.link(event_id)
+    with TRACER.span("ingest.admit"):
+        outcome, wait = _admit_event(key, label, message, app_name, rule_name, summary, event_id, fields)
+    HISTORY.set_status(event_id, outcome)
+    METRIC_OUTCOMES.inc(outcome)
+    return outcome, event_id, wait
+
+
+def _admit_event(key, label, message, app_name, rule_name, summary, event_id, fields):
+    wait, scope = RATE_LIMITER.check(app_name, rule_name)
+    if scope is None:
+        if COALESCER.add(key, label, message, summary=summary, event_id=event_id, **fields) is None:
+            return "queue_full", 0.0
+        return "queued", 0.0
+    action = RATE_LIMITER.action
+    if action == "fold" and COALESCER.enabled and wait != float("inf"):
+        COALESCER.add(key, label, message, summary=summary, event_id=event_id, hold=wait, **fields)
+        RATE_LIMITER.record("folded")
+        return "folded", wait
+    if action in ("fold", "defer") and wait != float("inf"):
+        def release():
+            outcome, _ = _admit_event(key, label, message, app_name, rule_name, summary, event_id, fields)
+            if outcome in ("rate_limited", "queue_full"):
+                DELIVERY_QUEUE.release(event_id)
+            HISTORY.set_status(event_id, outcome)
+
+        DELIVERY_QUEUE.hold(message, event_id=event_id, **fields)
+        if RATE_LIMITER.defer(wait, release):
+            return "deferred", wait
+        DELIVERY_QUEUE.release(event_id)
+        print(f"⏳ Limite de taxa ({scope}) excedido e fila de adiados cheia; descartando {label}.")
+        return "rate_limited", wait
+    RATE_LIMITER.record("dropped")
+    print(f"⏳ Limite de taxa ({scope}) excedido; descartando {label}.")
+    return "rate_limited", wait
+
 
 # --- Lógica do Servidor Web (Thread) ---
 app_flask = Flask(__name__)
-CORS(app_flask)
+app_flask.config['MAX_CONTENT_LENGTH'] = MAX_REQUEST_BYTES
+CORS(app_flask, expose_headers=['ETag', 'X-Config-Etag'])
 
-@app_flask.route('/notify', methods=['POST'])
-def notify():
-    data = request.json
+@app_flask.before_request
+def _start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app_flask.after_request
+def _observe_request_time(response):
+    started = g.get("request_started")
+    if started is not None:
+        METRIC_HTTP_SECONDS.observe(time.perf_counter() - started, request.endpoint or "unknown")
+    return response
+
+
+@app_flask.route('/trace', methods=['GET'])
+def get_trace():
+    response = jsonify(TRACER.dump(clear=request.args.get('clear') == '1'))
+    response.headers['Content-Disposition'] = 'attachment; filename="notify-watcher-trace.json"'
+    return response
+
+
+@app_flask.route('/trace', methods=['POST'])
+def configure_trace():
+    data = request.get_json(silent=True) or {}
+    try:
+        TRACER.configure(enabled=data.get('enabled'), sample_rate=data.get('sample_rate'))
+    except (TypeError, ValueError):
+        return jsonify({'status': 'error', 'reason': 'invalid_payload'}), 400
+    return jsonify({'status': 'ok', 'enabled': TRACER.enabled, 'sample_rate': TRACER.sample_rate}), 200
+
+
+@app_flask.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(METRICS.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
+def read_notify_request():
+    """Extrai (payload, captura) de JSON, multipart ou upload binário puro."""
+    if request.mimetype == 'multipart/form-data':
+        try:
+            data = json.loads(request.form.get('payload') or '{}')
+        except json.JSONDecodeError:
+            return None, None
+        if isinstance(data, dict):
+            for key in ('app', 'text'):
+                if key in request.form and key not in data:
+                    data[key] = request.form[key]
+        upload = request.files.get('screenshot')
+        return data, (upload.read() if upload else None)
+    if request.mimetype == 'application/octet-stream' or request.mimetype.startswith('image/'):
+        args = request.args
+        data = {
+            'app': args.get('app', 'Browser'),
+            'text': args.get('text', 'Nenhuma mensagem.'),
+            'rule': {
+                'name': args.get('rule'),
+                'tags': args.get('tags'),
+                'priority': args.get('priority'),
+            },
+        }
+        return data, request.get_data(cache=False) or None
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return None, None
+    return data, data.get('screenshot') or None
+
+
+def invalid_notify_field(data, screenshot=None):
+    """Devolve o primeiro campo de /notify com tipo inválido, ou None.
+
+    app, text e rule.name viram chaves de dicionário (ignore, dedupe, limites),
+    então precisam ser strings; a captura já resolvida tem de ser data URL,
+    base64 ou os bytes de um upload.
+    """
+    if screenshot is not None and not isinstance(screenshot, (str, bytes)):
+        return 'screenshot'
+    for key in ('app', 'text'):
+        if key in data and not isinstance(data[key], str):
+            return key
+    rule = data.get('rule')
+    if rule is not None and not isinstance(rule, dict):
+        return 'rule'
+    if rule and rule.get('name') is not None and not isinstance(rule['name'], str):
+        return 'rule.name'
+    return None
+
+
+def accept_notification(data, screenshot, ignored=None):
+    """Enfileira um payload de /notify e devolve o resultado (status, corpo)."""
+    field = invalid_notify_field(data, screenshot)
+    if field is not None:
+        return 400, {'status': 'error', 'reason': 'invalid_payload', 'field': field}
+    METRIC_INGEST.inc("http")
     app_name = data.get('app', 'Browser')
     text = data.get('text', 'Nenhuma mensagem.')
-    screenshot_b64 = data.get('screenshot')
-    screenshot_bytes = None
-    screenshot_mime = 'image/png'
-    if screenshot_b64:
-        try:
-            if screenshot_b64.startswith('data:image'):
-                header, screenshot_b64 = screenshot_b64.split(',', 1)
-                try:
-                    screenshot_mime = header.split(';')[0].split(':', 1)[1] or screenshot_mime
-                except (IndexError, ValueError):
-                    screenshot_mime = 'image/png'
-            screenshot_bytes = base64.b64decode(screenshot_b64)
-        except Exception as exc:
-            screenshot_bytes = None
-            print(f"⚠️ Falha ao decodificar screenshot: {exc}")
-    if should_ignore(app_name):
+    if ignored is not None:
+        if app_name not in ignored:
+            ignored[app_name] = should_ignore(app_name)
+        skip = ignored[app_name] or should_ignore(None, body=text)
+    else:
+        skip = should_ignore(app_name, body=text)
+    rule = data.get('rule') if isinstance(data.get('rule'), dict) else {}
+    rule_name = clean_string(rule.get('name'))
+    if skip:
         print(f"⏭️ Ignorando notificação HTTP de {app_name}.")
-        return jsonify({'status': 'ignored'}), 200
+        HISTORY.record("http", app_name, "ignored", rule=rule_name, summary=text)
+        METRIC_FILTERED.inc("http", "ignored")
+        return 200, {'status': 'ignored'}
+    dedupe_key = (app_name, rule_name, text, clean_string(rule.get('id')))
+    if DEDUPE.is_duplicate("http", *dedupe_key):
+        HISTORY.record("http", app_name, "duplicate", rule=rule_name, summary=text)
+        METRIC_FILTERED.inc("http", "duplicate")
+        return 200, {'status': 'duplicate'}
     full_message = f"[{app_name}] {text}"
     print(f"📡 Recebido via HTTP: {full_message}")
-    screenshot_title = data.get('rule', {}).get('name') if isinstance(data.get('rule'), dict) else None
-    if screenshot_title:
-        screenshot_title = f"{screenshot_title} – captura"
-    send_notification(full_message, screenshot=screenshot_bytes, screenshot_title=screenshot_title, screenshot_mime=screenshot_mime)
-    return jsonify({'status': 'ok'}), 200
+    EVENT_BUS.emit(EVENT_NOTIFICATION_RECEIVED, {"source": "http", "app": app_name, "message": full_message})
+    if DELIVERY_QUEUE.is_full():
+        DEDUPE.forget(*dedupe_key)
+        DELIVERY_QUEUE.record_drop()
+        HISTORY.record("http", app_name, "queue_full", rule=rule_name, summary=text)
+        return 429, {'status': 'error', 'reason': 'queue_full'}
+    outcome, event_id, wait = ingest_event(
+        f"rule:{rule_name}" if rule_name else f"app:{app_name}",
+        rule_name or app_name,
+        full_message,
+        app_name=app_name,
+        rule_name=rule_name,
+        summary=text,
+        screenshot=screenshot,
+        title=rule_name or None,
+        tags=rule.get('tags') or data.get('tags'),
+        priority=rule.get('priority') or data.get('priority'),
+        source="http",
+    )
+    if outcome in ('queue_full', 'rate_limited'):
+        # O cliente vai reenviar depois do Retry-After; não pode cair no dedupe.
+        DEDUPE.forget(*dedupe_key)
+        body = {'status': 'error', 'reason': outcome}
+        if outcome == 'rate_limited' and wait != float("inf"):
+            body['retry_after'] = round(wait, 3)
+        return 429, body
+    return 202, {'status': outcome, 'id': event_id}
+
+
+@app_flask.route('/notify', methods=['POST'])
+def notify():
+    with TRACER.trace("http.notify"):
+        with TRACER.span("http.parse"):
+            data, screenshot = read_notify_request()
+        if data is None:
+            return jsonify({'status': 'error', 'reason': 'invalid_payload'}), 400
+        status, body = accept_notification(data, screenshot)
+    response = jsonify(body)
+    if 'retry_after' in body:
+        response.headers['Retry-After'] = str(max(1, int(body['retry_after'] + 0.999)))
+    return response, status
+
+
+def read_notify_batch():
+    """Extrai (itens, captura compartilhada) de um array JSON, NDJSON ou {"items": [...]}.
+
+    Itens com "screenshot": true usam a captura compartilhada do envelope.
+    """
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        items = []
+        for line in request.get_data(cache=False, as_text=True).splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                items.append(json.loads(line))
+            except json.JSONDecodeError:
+                items.append(None)
+        return items, None
+    data = request.get_json(silent=True)
+    if isinstance(data, list):
+        return data, None
+    if isinstance(data, dict) and isinstance(data.get('items'), list):
+        return data['items'], data.get('screenshot') or None
+    return None, None
+
+
+@app_flask.route('/notify/batch', methods=['POST'])
+def notify_batch():
+    with TRACER.trace("http.notify_batch"):
+        return _notify_batch()
+
+
+def _notify_batch():
+    with TRACER.span("http.parse"):
+        items, shared_screenshot = read_notify_batch()
+    if items is None:
+        return jsonify({'status': 'error', 'reason': 'invalid_payload'}), 400
+    if len(items) > NOTIFY_BATCH_MAX_ITEMS:
+        return jsonify({'status': 'error', 'reason': 'batch_too_large', 'max_items': NOTIFY_BATCH_MAX_ITEMS}), 413
+    if invalid_notify_field({}, shared_screenshot) is not None:
+        return jsonify({'status': 'error', 'reason': 'invalid_payload', 'field': 'screenshot'}), 400
+    # Uma única passada: should_ignore é avaliado uma vez por app e itens
+    # repetidos dentro do lote (mesmo app, regra e texto) são descartados.
+    ignored = {}
+    seen = {}
+    results = []
+    queued = 0
+    for index, data in enumerate(items):
+        if not isinstance(data, dict):
+            results.append({'index': index, 'status': 'error', 'reason': 'invalid_payload'})
+            continue
+        screenshot = data.get('screenshot') or None
+        if screenshot is True:
+            screenshot = shared_screenshot
+        field = invalid_notify_field(data, screenshot)
+        if field is not None:
+            results.append({'index': index, 'status': 'error', 'reason': 'invalid_payload', 'field': field})
+            continue
+        rule = data.get('rule') or {}
+        key = (data.get('app', 'Browser'), clean_string(rule.get('name')), data.get('text', 'Nenhuma mensagem.'))
+        if key in seen:
+            results.append({'index': index, 'status': 'duplicate', 'of': seen[key]})
+            continue
+        seen[key] = index
+        with TRACER.span("http.accept", index=index):
+            status, body = accept_notification(data, screenshot, ignored)
+        if status == 202:
+            queued += 1
+        results.append({'index': index, **body})
+    return jsonify({'status': 'ok', 'queued': queued, 'results': results}), 200
+
+
+@app_flask.route('/history', methods=['GET'])
+def get_history():
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 1000)
+    items, next_before = HISTORY.query(
+        limit,
+        request.args.get('before', type=int),
+        source=request.args.get('source'),
+        app=request.args.get('app'),
+        rule=request.args.get('rule'),
+        status=request.args.get('status'),
+    )
+    return jsonify({'items': items, 'next_before': next_before, 'last_seq': HISTORY.last_seq}), 200
+
+
+@app_flask.route('/delivery/stats', methods=['GET'])
+def delivery_stats():
+    stats = DELIVERY_QUEUE.snapshot()
+    stats["coalescer"] = COALESCER.snapshot()
+    stats["screenshots"] = SCREENSHOT_CACHE.snapshot()
+    stats["rate_limits"] = RATE_LIMITER.snapshot()
+    stats["dedupe"] = DEDUPE.snapshot()
+    stats["ignore_patterns"] = IGNORE_FILTER.snapshot()
+    stats["url_index"] = RULE_URL_INDEX.snapshot()
+    return jsonify(stats), 200
 
 
 @app_flask.route('/config', methods=['GET'])
 def get_config():
-    try:
-        with open(CONFIG_FILE, 'r') as f:
-            raw_data = json.load(f)
-        if isinstance(raw_data, dict):
-            version = raw_data.get("version", 1)
-            rules = raw_data.get("rules", [])
-        else:
-            version = 1
-            rules = raw_data if isinstance(raw_data, list) else []
-    except FileNotFoundError:
-        version = RULES_SCHEMA_VERSION
-        rules = []
-    except json.JSONDecodeError as exc:
-        print(f"⚠️ Erro ao ler {CONFIG_FILE}: {exc}")
-        version = RULES_SCHEMA_VERSION
-        rules = []
+    snapshot = CONFIG_CACHE.get()
+    since = request.args.get('since', type=int)
+    page_url = request.args.get('url')
+    etag = snapshot.etag
+    if page_url:
+        etag = hashlib.sha1(f"{snapshot.etag}|{page_url}".encode("utf-8")).hexdigest()[:20]
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        response.headers['X-Config-Etag'] = snapshot.etag
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    delta = RULE_STORE.changes_since(since) if since is not None else None
+    index_revision, matching = RULE_URL_INDEX.match(page_url) if page_url else (None, None)
+    if delta is not None:
+        revision, changed, removed = delta
+        if matching is not None:
+            # Regras que deixaram de valer para esta URL saem como removidas.
+            matching_ids = {rule["id"] for rule in matching}
+            removed = removed + [rule["id"] for rule in changed if rule["id"] not in matching_ids]
+            changed = [rule for rule in changed if rule["id"] in matching_ids]
+        response = jsonify({
+            'version': RULES_SCHEMA_VERSION,
+            'delta': True,
+            'since': since,
+            'revision': revision,
+            'changed': changed,
+            'removed': removed,
+            'ignored_apps': sorted(IGNORED_APPS),
+            'pending_rule': read_pending_rule(),
+        })
+    elif matching is not None:
+        response = jsonify({
+            'version': RULES_SCHEMA_VERSION,
+            'revision': index_revision,
+            'url': page_url,
+            'rules': matching,
+            'ignored_apps': sorted(IGNORED_APPS),
+            'pending_rule': read_pending_rule(),
+        })
+    else:
+        response = Response(snapshot.body, status=200, mimetype='application/json')
+    response.set_etag(etag)
+    # O ETag acima depende de ?url=; o /config/stream anuncia o da config
+    # inteira, então a extensão compara os eventos com este.
+    response.headers['X-Config-Etag'] = snapshot.etag
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+@app_flask.route('/rules/export', methods=['GET'])
+def export_rules():
+    return jsonify(RULE_STORE.export_json()), 200
+
+
+class StreamSlots:
+    """Teto de streams SSE abertos ao mesmo tempo."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.active = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Devolve a função que libera a vaga, ou None se não houver vaga."""
+        with self._lock:
+            if self.active >= self.limit:
+                self.rejected += 1
+                return None
+            self.active += 1
+        released = []
+
+        def release():
+            with self._lock:
+                if released:
+                    return
+                released.append(True)
+                self.active -= 1
+
+        return release
+
+
+CONFIG_STREAM_SLOTS = StreamSlots(CONFIG_STREAM_MAX_CLIENTS)
+METRICS.gauge("notify_config_streams", "Streams /config/stream abertos.", lambda: CONFIG_STREAM_SLOTS.active)
+
+
+@app_flask.route('/config/stream', methods=['GET'])
+def config_stream():
+    release = CONFIG_STREAM_SLOTS.acquire()
+    if release is None:
+        # Sem vaga: o background.js da extensão volta ao polling até tentar de novo.
+        response = Response(f"retry: {CONFIG_STREAM_RETRY_MS}\n\n", status=503, mimetype='text/event-stream')
+        response.headers['Retry-After'] = str(CONFIG_STREAM_RETRY_MS // 1000)
+        return response
+    last_etag = request.headers.get('Last-Event-ID')
+
+    def events(last_etag):
+        try:
+            generation = CONFIG_CACHE.generation
+            while not HTTP_SERVER.stopping.is_set():
+                snapshot = CONFIG_CACHE.get()
+                if snapshot.etag != last_etag:
+                    last_etag = snapshot.etag
+                    data = json.dumps({'revision': snapshot.revision, 'etag': snapshot.etag})
+                    yield f"id: {snapshot.etag}\nevent: config\ndata: {data}\n\n"
+                else:
+                    yield ": ping\n\n"
+                generation = CONFIG_CACHE.wait_for_change(generation, CONFIG_STREAM_HEARTBEAT)
+        finally:
+            release()
 
-    ignored = sorted(IGNORED_APPS)
-    pending_rule = read_pending_rule()
-    return jsonify({
-        'version': version,
-        'rules': rules,
-        'ignored_apps': ignored,
-        'pending_rule': pending_rule
-    }), 200
+    response = Response(events(last_etag), mimetype='text/event-stream')
+    response.call_on_close(release)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 
 @app_flask.route('/pending_rule', methods=['POST'])
@@ -328,62 +3491,339 @@ def clear_pending_rule_route():
     print("🗑️ Regra pendente descartada.")
     return jsonify({'status': 'ok'}), 200
 
+
+class HttpServer:
+    """Serve o app Flask no modo escolhido e permite desligamento limpo."""
+
+    def __init__(self, app, mode=SERVER_MODE, host=SERVER_HOST, port=SERVER_PORT):
+        self.app = app
+        self.mode = mode
+        self.host = host
+        self.port = port
+        self.stopping = threading.Event()
+        self._server = None
+
+    def _create(self):
+        if self.mode == "waitress":
+            try:
+                from waitress import create_server
+            except ImportError:
+                print("⚠️ waitress não instalado; usando o servidor Werkzeug multi-thread.")
+                self.mode = "threaded"
+            else:
+                return create_server(
+                    self.app,
+                    host=self.host,
+                    port=self.port,
+                    threads=SERVER_THREADS,
+                    connection_limit=SERVER_CONNECTION_LIMIT,
+                    channel_timeout=SERVER_KEEPALIVE_TIMEOUT,
+                    max_request_body_size=MAX_REQUEST_BYTES,
+                    ident="notify-watcher",
+                )
+        from werkzeug.serving import WSGIRequestHandler, make_server
+
+        handler = WSGIRequestHandler
+        if self.mode == "threaded":
+            class KeepAliveRequestHandler(WSGIRequestHandler):
+                protocol_version = "HTTP/1.1"
+                timeout = SERVER_KEEPALIVE_TIMEOUT
+
+                def log_request(self, *args, **kwargs):
+                    pass
+
+            handler = KeepAliveRequestHandler
+        return make_server(self.host, self.port, self.app, threaded=True, request_handler=handler)
+
+    def serve_forever(self):
+        self._server = self._create()
+        print(f"▶️ Servidor HTTP ({self.mode}) ouvindo em {self.host}:{self.port}...")
+        if self.mode == "waitress":
+            self._server.run()
+        else:
+            self._server.serve_forever()
+
+    def shutdown(self):
+        self.stopping.set()
+        # Acorda os streams SSE para que encerrem antes do servidor.
+        CONFIG_CACHE.invalidate()
+        server, self._server = self._server, None
+        if server is None:
+            return
+        try:
+            if self.mode == "waitress":
+                # Fecha no próprio thread do loop do waitress, via trigger.
+                server.trigger.pull_trigger(lambda: self._close_waitress(server))
+            else:
+                server.shutdown()
+                server.server_close()
+        except Exception as exc:
+            print(f"⚠️ Erro ao encerrar o servidor HTTP: {exc}")
+
+    @staticmethod
+    def _close_waitress(server):
+        from waitress import wasyncore
+
+        server.task_dispatcher.shutdown(timeout=2)
+        wasyncore.close_all(getattr(server, "map", None) or server._map)
+
+
+HTTP_SERVER = HttpServer(app_flask)
+
+
 def start_flask_server():
-    print("▶️ Iniciando thread do servidor Flask na porta 3000...")
-    app_flask.run(host='127.0.0.1', port=3000, use_reloader=False)
+    print(f"▶️ Iniciando thread do servidor Flask na porta {SERVER_PORT}...")
+    HTTP_SERVER.serve_forever()
+
+
+NOTIFY_MATCH_RULE = "type='method_call',interface='org.freedesktop.Notifications',member='Notify'"
+NOTIFY_SIGNATURE = "(susssasa{sv}i)"
+
+
+def _match_rule_quote(value):
+    # Match rules não têm escape dentro das aspas; a aspa simples sai e volta.
+    return "'" + value.replace("'", "'\\''") + "'"
+
+
+def dbus_match_rules(allowlist=None, eavesdrop=False):
+    """Match rules para as chamadas Notify.
+
+    O DBus não tem negação em match rules, então os apps ignorados não viram
+    exclusões no barramento: com allowlist, cada app permitido (e não
+    ignorado) vira uma regra arg0 positiva; sem ela, uma regra ampla, e os
+    ignorados são descartados no filtro antes de qualquer decodificação cara.
+    """
+    base = NOTIFY_MATCH_RULE + (",eavesdrop='true'" if eavesdrop else "")
+    allowlist = DBUS_APP_ALLOWLIST if allowlist is None else allowlist
+    if not allowlist:
+        return [base]
+    return [f"{base},arg0={_match_rule_quote(app)}" for app in sorted(set(allowlist)) if not should_ignore(app)]
+
+
+class LazyVariant:
+    """GLib.Variant decodificado só no primeiro acesso a .value (hints podem trazer image-data)."""
+
+    __slots__ = ("_variant", "_value")
+    _UNSET = object()
+
+    def __init__(self, variant):
+        self._variant = variant
+        self._value = self._UNSET
+
+    @property
+    def value(self):
+        if self._value is self._UNSET:
+            self._value = self._variant.unpack()
+            self._variant = None
+        return self._value
 
 
 class DBusNotificationListener(threading.Thread):
-    """Escuta chamadas Notify no DBus e repassa para um callback Python."""
+    """Escuta chamadas Notify no DBus e repassa para um callback Python.
+
+    Backend "gio": conexão de monitoramento (BecomeMonitor) em que o filtro lê
+    só app, título e corpo do GVariant e descarta os ignorados ali mesmo.
+    Backend "dbus-python": eavesdrop clássico, que decodifica todos os argumentos.
+    """
 
-    def __init__(self, callback):
+    def __init__(self, callback, backend=DBUS_BACKEND, allowlist=None):
         super().__init__(daemon=True)
         self.callback = callback
+        self.backend = backend
+        self.allowlist = DBUS_APP_ALLOWLIST if allowlist is None else list(allowlist)
         self._ready = threading.Event()
         self._error = None
+        self._active = None
         self._loop = None
+        self._gio = None
         self._glib = None
         self._bus = None
+        self._rules = None
+        self._monitor = None
+        self._pending = queue.SimpleQueue()
+        self._token = None
 
     def run(self):
+        self._token = EVENT_BUS.subscribe(lambda _event: self.request_rebuild(), (EVENT_IGNORE_LIST_CHANGED,))
         try:
-            from dbus.mainloop.glib import DBusGMainLoop
-            from gi.repository import GLib
-            import dbus
+            if self.backend in ("auto", "gio"):
+                try:
+                    self._start_gio()
+                except Exception as exc:
+                    if self.backend == "gio":
+                        raise
+                    print(f"⚠️ Monitor DBus via Gio indisponível ({exc}); usando dbus-python.")
+                else:
+                    self._active = "gio"
+                    self._ready.set()
+                    self._run_gio()
+                    return
+            self._start_dbus_python()
+            self._active = "dbus-python"
+            self._ready.set()
+            self._run_dbus_python()
         except Exception as exc:
             self._error = exc
             print(f"❌ Integração DBus indisponível: {exc}")
+        finally:
+            EVENT_BUS.unsubscribe(self._token)
             self._ready.set()
-            return
 
+    def request_rebuild(self):
+        """Reaplica as match rules (a lista de ignorados mudou)."""
+        if self._active == "gio":
+            self._pending.put(("rebuild", None))
+        elif self._active == "dbus-python" and self._glib is not None:
+            def _rebuild():
+                self._apply_dbus_python_rules()
+                return False
+
+            self._glib.idle_add(_rebuild)
+
+    # --- Backend Gio (BecomeMonitor) ---
+    def _start_gio(self):
+        from gi.repository import Gio, GLib
+
+        self._gio = Gio
         self._glib = GLib
-        DBusGMainLoop(set_as_default=True)
+        self._rebuild_monitor()
+        print("✅ Listener de DBus monitorando chamadas 'Notify' (BecomeMonitor).")
 
+    def _rebuild_monitor(self):
+        rules = dbus_match_rules(self.allowlist)
+        if rules == self._rules:
+            return
+        previous = self._monitor
+        # Abre o novo monitor antes de fechar o antigo; duplicatas na troca caem no DEDUPE.
+        self._monitor = self._open_monitor(rules) if rules else None
+        self._rules = rules
+        if previous is not None:
+            previous.close_sync(None)
+        if not rules:
+            print("ℹ️ Todos os apps da allowlist DBus estão ignorados; monitor desligado.")
+
+    def _open_monitor(self, rules):
+        Gio, GLib = self._gio, self._glib
+        address = Gio.dbus_address_get_for_bus_sync(Gio.BusType.SESSION, None)
+        connection = Gio.DBusConnection.new_for_address_sync(
+            address,
+            Gio.DBusConnectionFlags.AUTHENTICATION_CLIENT | Gio.DBusConnectionFlags.MESSAGE_BUS_CONNECTION,
+            None,
+            None,
+        )
+        # O filtro entra antes do BecomeMonitor para não perder mensagens entre as duas chamadas.
+        connection.add_filter(self._on_gio_message)
+        connection.call_sync(
+            "org.freedesktop.DBus",
+            "/org/freedesktop/DBus",
+            "org.freedesktop.DBus.Monitoring",
+            "BecomeMonitor",
+            GLib.Variant("(asu)", (rules, 0)),
+            None,
+            Gio.DBusCallFlags.NONE,
+            -1,
+            None,
+        )
+        return connection
+
+    def _on_gio_message(self, connection, message, incoming):
+        # Roda no thread de I/O do GDBus: só lê os três campos de texto e decide.
+        if not incoming or message.get_member() != "Notify":
+            return message
+        # Monitores não respondem; a chamada Notify é sempre consumida aqui.
         try:
-            self._bus = dbus.SessionBus()
-            match_rule = "type='method_call',interface='org.freedesktop.Notifications',member='Notify',eavesdrop='true'"
-            self._bus.add_match_string(match_rule)
-            self._bus.add_message_filter(self._on_message)
+            body = message.get_body()
+            if body is None or body.get_type_string() != NOTIFY_SIGNATURE:
+                return None
+            METRIC_INGEST.inc("dbus")
+            app_name = body.get_child_value(0).get_string()
+            title = body.get_child_value(3).get_string()
+            text = body.get_child_value(4).get_string()
+            if not self._ignored(app_name, title, text):
+                self._pending.put(("notify", (message.get_sender(), app_name, title, text, body)))
         except Exception as exc:
-            self._error = exc
-            print(f"❌ Erro ao registrar listener DBus: {exc}")
-            self._ready.set()
-            return
+            print(f"❌ Erro ao ler argumentos DBus: {exc}")
+        return None
 
+    def _run_gio(self):
+        while True:
+            kind, item = self._pending.get()
+            if kind == "stop":
+                break
+            if kind == "rebuild":
+                try:
+                    self._rebuild_monitor()
+                except Exception as exc:
+                    print(f"❌ Erro ao refazer o monitor DBus: {exc}")
+                continue
+            started = time.perf_counter()
+            try:
+                with TRACER.trace("dbus.on_message"):
+                    sender, app_name, title, text, body = item
+                    self._dispatch(
+                        sender,
+                        app_name,
+                        title,
+                        text,
+                        body.get_child_value(1).get_uint32(),
+                        body.get_child_value(2).get_string(),
+                        LazyVariant(body.get_child_value(5)),
+                        LazyVariant(body.get_child_value(6)),
+                        body.get_child_value(7).get_int32(),
+                    )
+            finally:
+                METRIC_DBUS_SECONDS.observe(time.perf_counter() - started)
+        if self._monitor is not None:
+            try:
+                self._monitor.close_sync(None)
+            except Exception:
+                pass
+
+    # --- Backend dbus-python (eavesdrop) ---
+    def _start_dbus_python(self):
+        from dbus.mainloop.glib import DBusGMainLoop
+        from gi.repository import GLib
+        import dbus
+
+        self._glib = GLib
+        DBusGMainLoop(set_as_default=True)
+        self._bus = dbus.SessionBus()
+        self._apply_dbus_python_rules()
+        self._bus.add_message_filter(self._on_message)
         print("✅ Listener de DBus configurado para espionar chamadas 'Notify'.")
 
-        self._loop = GLib.MainLoop()
-        self._ready.set()
+    def _apply_dbus_python_rules(self):
+        rules = dbus_match_rules(self.allowlist, eavesdrop=True)
+        if rules == self._rules:
+            return
+        for rule in self._rules or ():
+            try:
+                self._bus.remove_match_string(rule)
+            except Exception:
+                pass
+        for rule in rules:
+            self._bus.add_match_string(rule)
+        self._rules = rules
+
+    def _run_dbus_python(self):
+        self._loop = self._glib.MainLoop()
         try:
             self._loop.run()
         finally:
-            if self._bus is not None:
-                try:
-                    self._bus.remove_message_filter(self._on_message)
-                except Exception:
-                    pass
+            try:
+                self._bus.remove_message_filter(self._on_message)
+            except Exception:
+                pass
 
     def _on_message(self, bus, message):
+        started = time.perf_counter()
+        try:
+            with TRACER.trace("dbus.on_message"):
+                self._handle_message(message)
+        finally:
+            METRIC_DBUS_SECONDS.observe(time.perf_counter() - started)
+
+    def _handle_message(self, message):
         try:
             member = message.get_member()
         except AttributeError:
@@ -400,17 +3840,28 @@ class DBusNotificationListener(threading.Thread):
             sender = message.get_sender()
         except Exception:
             sender = "desconhecido"
-        print(f"👂 Capturado Notify via DBus de {sender}")
+        METRIC_INGEST.inc("dbus")
         # Garante 8 argumentos conforme especificação do método Notify
         if len(args) < 8:
             args += [None] * (8 - len(args))
         elif len(args) > 8:
             args = args[:8]
+        app_name, notif_id, icon, title, text, actions, hints, timeout = args[:8]
+        if self._ignored(app_name, title, text):
+            return
+        self._dispatch(sender, app_name, title, text, notif_id, icon, actions, hints, timeout)
+
+    # --- Comum aos dois backends ---
+    def _ignored(self, app_name, title, text):
+        if not should_ignore(app_name, title, text):
+            return False
+        HISTORY.record("dbus", str(app_name or "Aplicativo"), "ignored", summary=f"{title}: {text}" if title else text)
+        METRIC_FILTERED.inc("dbus", "ignored")
+        return True
+
+    def _dispatch(self, sender, app_name, title, text, notif_id, icon, actions, hints, timeout):
+        print(f"👂 Capturado Notify via DBus de {sender}")
         try:
-            app_name, notif_id, icon, title, text, actions, hints, timeout = args[:8]
-            if should_ignore(app_name):
-                print(f"⏭️ Ignorando Notify DBus de {app_name}.")
-                return
             self.callback(
                 str(app_name or "Aplicativo"),
                 str(title or ""),
@@ -426,432 +3877,114 @@ class DBusNotificationListener(threading.Thread):
 
     def wait_until_ready(self, timeout=5.0):
         self._ready.wait(timeout)
-        return self._error is None and self._loop is not None
+        return self._error is None and self._active is not None
 
     def stop(self):
-        if self._loop is None or self._glib is None:
-            return
-
-        def _quit():
-            try:
-                self._loop.quit()
-            except Exception:
-                pass
-            return False
+        if self._active == "gio":
+            self._pending.put(("stop", None))
+        elif self._loop is not None and self._glib is not None:
+            def _quit():
+                try:
+                    self._loop.quit()
+                except Exception:
+                    pass
+                return False
 
-        self._glib.idle_add(_quit)
+            self._glib.idle_add(_quit)
+        else:
+            return
         self.join(timeout=2.0)
 
-# --- Diálogo para Adicionar/Editar Regra ---
-class RuleDialog(QDialog):
-    def __init__(self, parent=None, rule=None):
-        super().__init__(parent)
-        self.setWindowTitle("Adicionar/Editar Regra")
-        self.form_layout = QFormLayout(self)
-        self.name_input = QLineEdit(self)
-        self.url_input = QLineEdit(self)
-        self.type_input = QComboBox(self)
-        self.selector_input = QLineEdit(self)
-        self.condition_input = QComboBox(self)
-        self.baseline_input = QPlainTextEdit(self)
-        self.baseline_input.setPlaceholderText("Texto base para comparação (opcional)")
-        self.baseline_input.setFixedHeight(60)
-        self.length_threshold_input = QSpinBox(self)
-        self.length_threshold_input.setRange(0, 1_000_000)
-        self.length_threshold_input.setValue(0)
-        self.length_threshold_input.setEnabled(False)
-
-        self.type_input.addItems(["element", "element_text"])
-        self.condition_input.addItems([
-            "element",
-            "element_text",
-            "text_equals",
-            "text_differs",
-            "text_contains",
-            "text_not_contains",
-            "text_length_gt",
-            "text_length_lt",
-        ])
-
-        self.form_layout.addRow("Nome:", self.name_input)
-        self.form_layout.addRow("URL Contém:", self.url_input)
-        self.form_layout.addRow("Tipo:", self.type_input)
-        self.form_layout.addRow("Seletor/Texto:", self.selector_input)
-        self.form_layout.addRow("Condição:", self.condition_input)
-        self.form_layout.addRow("Texto Base:", self.baseline_input)
-        self.form_layout.addRow("Limite de Tamanho:", self.length_threshold_input)
-
-        self.button_box = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel, self)
-        self.button_box.accepted.connect(self.accept)
-        self.button_box.rejected.connect(self.reject)
-        self.form_layout.addRow(self.button_box)
-
-        self.css_selector = ""
-        self.snapshot_text = ""
-        self.page_url = ""
-        self.source = "manual"
-        self.captured_at = None
-        self.metadata = {}
-
-        self.condition_input.currentTextChanged.connect(self._update_condition_fields)
-        self.type_input.currentTextChanged.connect(self._on_type_changed)
-
-        if rule:
-            self.name_input.setText(rule.get("name", ""))
-            self.url_input.setText(rule.get("url_contains", ""))
-            self.type_input.setCurrentText(rule.get("type", "element"))
-            self.selector_input.setText(rule.get("selector", ""))
-            self.condition_input.setCurrentText(rule.get("condition", rule.get("type", "element")))
-            baseline_text = rule.get("baseline_text", "")
-            self.baseline_input.setPlainText(baseline_text)
-            length_threshold = rule.get("length_threshold")
-            if isinstance(length_threshold, (int, float)):
-                self.length_threshold_input.setValue(int(length_threshold))
-                self.length_threshold_input.setEnabled(True)
-            self.css_selector = rule.get("css_selector", "")
-            self.snapshot_text = rule.get("text_snapshot", baseline_text)
-            self.page_url = rule.get("page_url", "")
-            self.source = rule.get("source", "extension")
-            self.captured_at = rule.get("captured_at")
-            metadata = rule.get("metadata")
-            if isinstance(metadata, dict):
-                self.metadata = dict(metadata)
-        self._update_condition_fields()
-
-    def _on_type_changed(self, new_type):
-        if new_type == "element" and self.condition_input.currentText() == "element_text":
-            self.condition_input.setCurrentText("element")
-        elif new_type == "element_text" and self.condition_input.currentText() == "element":
-            self.condition_input.setCurrentText("element_text")
-        self._update_condition_fields()
-
-    def _update_condition_fields(self, *_):
-        condition = self.condition_input.currentText()
-        enable_text = condition in TEXT_MATCH_CONDITIONS or condition == "element_text"
-        enable_length = condition in TEXT_LENGTH_CONDITIONS
-        self.baseline_input.setEnabled(enable_text)
-        self.length_threshold_input.setEnabled(enable_length)
-        if not enable_length:
-            self.length_threshold_input.setValue(
-                self.length_threshold_input.value() if enable_length else 0
-            )
-        elif enable_length and self.length_threshold_input.value() == 0:
-            base_length = len(self.snapshot_text or self.baseline_input.toPlainText().strip())
-            if base_length > 0:
-                self.length_threshold_input.setValue(base_length)
-
-    def get_data(self):
-        baseline_text = self.baseline_input.toPlainText().strip()
-        condition = self.condition_input.currentText()
-        length_threshold = self.length_threshold_input.value() if self.length_threshold_input.isEnabled() else None
-        rule_type = self.type_input.currentText()
-        result = {
-            "name": self.name_input.text(),
-            "url_contains": self.url_input.text(),
-            "type": rule_type,
-            "selector": self.selector_input.text(),
-            "condition": condition,
-            "baseline_text": baseline_text,
-            "text_snapshot": self.snapshot_text or baseline_text,
-            "length_threshold": length_threshold,
-            "css_selector": self.selector_input.text() if rule_type == "element" else self.css_selector,
-        }
-        if self.page_url:
-            result["page_url"] = self.page_url
-        if self.source:
-            result["source"] = self.source
-        if self.captured_at is not None:
-            result["captured_at"] = self.captured_at
-        if self.metadata:
-            result["metadata"] = self.metadata
-        if length_threshold is None:
-            result.pop("length_threshold", None)
-        return result
-
-# --- Janela Principal da Aplicação ---
-class MainWindow(QMainWindow):
-    def __init__(self):
-        super().__init__()
-        self.setWindowTitle("Gerenciador de Notificações")
-        self.setGeometry(100, 100, 700, 500)
-        self.rules = []
-        self.last_message_content = ""
-        self.last_message_time = 0
-        self._notification_lock = threading.Lock()
-        self.dbus_listener = None
-        self.pending_rule = None
-        self.pending_timer = None
-
-        central_widget = QWidget()
-        self.setCentralWidget(central_widget)
-        main_layout = QVBoxLayout(central_widget)
-        main_layout.addWidget(QLabel("Regras de Notificação Ativas:"))
-        self.list_widget = QListWidget()
-        main_layout.addWidget(self.list_widget)
-        button_layout = QHBoxLayout()
-        main_layout.addLayout(button_layout)
-        btn_add = QPushButton("Adicionar")
-        btn_add.clicked.connect(self.add_rule)
-        btn_edit = QPushButton("Editar")
-        btn_edit.clicked.connect(self.edit_rule)
-        btn_remove = QPushButton("Remover")
-        btn_remove.clicked.connect(self.remove_rule)
-        button_layout.addWidget(btn_add)
-        button_layout.addWidget(btn_edit)
-        button_layout.addWidget(btn_remove)
-
-        main_layout.addWidget(QLabel("Aplicativos Ignorados:"))
-        self.ignore_list_widget = QListWidget()
-        main_layout.addWidget(self.ignore_list_widget)
-        ignore_button_layout = QHBoxLayout()
-        main_layout.addLayout(ignore_button_layout)
-        btn_ignore_add = QPushButton("Adicionar Ignorado")
-        btn_ignore_add.clicked.connect(self.add_ignored_app)
-        btn_ignore_remove = QPushButton("Remover Ignorado")
-        btn_ignore_remove.clicked.connect(self.remove_ignored_app)
-        ignore_button_layout.addWidget(btn_ignore_add)
-        ignore_button_layout.addWidget(btn_ignore_remove)
-
-        main_layout.addWidget(QLabel("Regra Pendente da Extensão:"))
-        self.pending_label = QLabel("Nenhuma regra pendente.")
-        self.pending_label.setWordWrap(True)
-        main_layout.addWidget(self.pending_label)
-        pending_button_layout = QHBoxLayout()
-        main_layout.addLayout(pending_button_layout)
-        self.btn_apply_pending = QPushButton("Aplicar Regra Pendente")
-        self.btn_apply_pending.clicked.connect(self.apply_pending_rule)
-        self.btn_discard_pending = QPushButton("Descartar Regra Pendente")
-        self.btn_discard_pending.clicked.connect(self.discard_pending_rule)
-        pending_button_layout.addWidget(self.btn_apply_pending)
-        pending_button_layout.addWidget(self.btn_discard_pending)
-        self.btn_apply_pending.setEnabled(False)
-        self.btn_discard_pending.setEnabled(False)
-
-        self.load_rules()
-        self.load_ignore_list()
-        self.setup_dbus()
-        self.pending_timer = QTimer(self)
-        self.pending_timer.setInterval(2000)
-        self.pending_timer.timeout.connect(self.check_pending_rule)
-        self.check_pending_rule()
-        self.pending_timer.start()
-
-    def load_ignore_list(self):
-        load_ignored_apps_from_disk()
-        self.refresh_ignore_list()
-
-    def setup_dbus(self):
-        print("▶️ Iniciando listener de DBus (dbus-python)...")
-        self.dbus_listener = DBusNotificationListener(self.handle_dbus_notification)
-        self.dbus_listener.start()
-        if not self.dbus_listener.wait_until_ready():
-            print("❌ Listener DBus não pôde ser iniciado.")
-
-    def handle_dbus_notification(self, app_name, title, text, notif_id, icon, actions, hints, timeout):
-        full_message = f"[{app_name}] {title}: {text}"
-        current_time = time.time()
 
-        with self._notification_lock:
-            if full_message == self.last_message_content and (current_time - self.last_message_time) < 1.0:
-                return
-            self.last_message_content = full_message
-            self.last_message_time = current_time
+def handle_dbus_notification(app_name, title, text, notif_id, icon, actions, hints, timeout):
+    """Callback do DBusNotificationListener: dedupe e ingestão de um Notify capturado."""
+    with TRACER.span("dbus.handle", app=app_name):
+        full_message = f"[{app_name}] {title}: {text}"
+        if DEDUPE.is_duplicate("dbus", app_name, title, text):
+            HISTORY.record("dbus", app_name, "duplicate", summary=f"{title}: {text}" if title else text)
+            METRIC_FILTERED.inc("dbus", "duplicate")
+            return
 
         print(f"📩 Capturado do sistema: {full_message}")
-        send_notification(full_message)
-
-    def refresh_rule_list(self):
-        self.list_widget.clear()
-        for rule in self.rules:
-            name = rule.get("name", "Sem nome")
-            url_contains = rule.get("url_contains", "")
-            rule_type = rule.get("type", "element")
-            selector = rule.get("selector") or ""
-            condition = rule.get("condition", rule_type)
-            display_text = f'{name} (URL: {url_contains}) -> {condition}: {selector!r}'
-            self.list_widget.addItem(display_text)
-
-    def refresh_ignore_list(self):
-        self.ignore_list_widget.clear()
-        for app in sorted(IGNORED_APPS):
-            self.ignore_list_widget.addItem(app)
-
-    def _format_pending_rule_summary(self, rule):
-        name = rule.get("name", "Sem nome")
-        condition = rule.get("condition", rule.get("type", "element"))
-        selector = rule.get("selector") or rule.get("css_selector") or ""
-        snippet = rule.get("text_snapshot") or rule.get("baseline_text") or ""
-        url_info = rule.get("url_contains") or rule.get("page_url") or ""
-
-        def shorten(text, limit=80):
-            text = str(text)
-            return text if len(text) <= limit else text[: limit - 1] + "…"
-
-        parts = [
-            f"{name}",
-            f"condição: {condition}",
-        ]
-        if selector:
-            parts.append(f"alvo: {shorten(selector)}")
-        if snippet:
-            parts.append(f"texto: {shorten(snippet)}")
-        if url_info:
-            parts.append(f"url: {shorten(url_info)}")
-        return "Regra pendente → " + " | ".join(parts)
-
-    def _normalize_rule(self, rule):
-        if not isinstance(rule, dict):
-            return {}
-        condition = rule.get("condition") or rule.get("type", "element")
-        rule["condition"] = condition
-        if condition not in TEXT_MATCH_CONDITIONS and condition != "element_text":
-            rule.pop("baseline_text", None)
-        if condition not in TEXT_LENGTH_CONDITIONS:
-            rule.pop("length_threshold", None)
-        return rule
-
-    def check_pending_rule(self):
-        pending = read_pending_rule()
-        if not pending:
-            if self.pending_rule:
-                self.pending_rule = None
-                self.pending_label.setText("Nenhuma regra pendente.")
-                self.btn_apply_pending.setEnabled(False)
-                self.btn_discard_pending.setEnabled(False)
-            return
-        if self.pending_rule != pending:
-            self.pending_rule = pending
-            self.pending_label.setText(self._format_pending_rule_summary(pending))
-        self.btn_apply_pending.setEnabled(True)
-        self.btn_discard_pending.setEnabled(True)
+        EVENT_BUS.emit(EVENT_NOTIFICATION_RECEIVED, {"source": "dbus", "app": app_name, "message": full_message})
+        ingest_event(
+            f"dbus:{app_name}",
+            app_name,
+            full_message,
+            app_name=app_name,
+            summary=f"{title}: {text}" if title else text,
+            source="dbus",
+        )
 
-    def load_rules(self):
-        try:
-            with open(CONFIG_FILE, 'r') as f:
-                data = json.load(f)
-            if isinstance(data, dict):
-                self.rules = data.get("rules", [])
-            else:
-                self.rules = data if isinstance(data, list) else []
-            self.refresh_rule_list()
-        except (FileNotFoundError, json.JSONDecodeError) as e:
-            self.rules = []
-            print(f"Erro ao carregar config: {e}")
 
-    def save_rules(self):
-        try:
-            with open(CONFIG_FILE, 'w') as f:
-                json.dump({
-                    "version": RULES_SCHEMA_VERSION,
-                    "rules": self.rules
-                }, f, indent=2)
-        except Exception as e:
-            print(f"Erro ao salvar config: {e}")
-
-    def apply_pending_rule(self):
-        pending = self.pending_rule or read_pending_rule()
-        if not pending:
-            return
-        dialog = RuleDialog(self, rule=pending)
-        if dialog.exec() == QDialog.DialogCode.Accepted:
-            new_rule = self._normalize_rule(dialog.get_data())
-            self.rules.append(new_rule)
-            self.save_rules()
-            self.refresh_rule_list()
-            clear_pending_rule()
-            self.pending_rule = None
-            self.pending_label.setText("Nenhuma regra pendente.")
-            self.btn_apply_pending.setEnabled(False)
-            self.btn_discard_pending.setEnabled(False)
-            print("✅ Regra pendente aplicada.")
-        else:
-            print("ℹ️ Regra pendente mantida para revisão posterior.")
-
-    def discard_pending_rule(self):
-        clear_pending_rule()
-        self.pending_rule = None
-        self.pending_label.setText("Nenhuma regra pendente.")
-        self.btn_apply_pending.setEnabled(False)
-        self.btn_discard_pending.setEnabled(False)
-        print("🗑️ Regra pendente descartada pelo usuário.")
-
-    def add_rule(self):
-        dialog = RuleDialog(self)
-        if dialog.exec() == QDialog.DialogCode.Accepted:
-            new_rule = self._normalize_rule(dialog.get_data())
-            self.rules.append(new_rule)
-            self.save_rules()
-            self.refresh_rule_list()
-            print("Nova regra adicionada.")
-
-    def edit_rule(self):
-        current_row = self.list_widget.currentRow()
-        if current_row == -1:
-            return
-        rule_to_edit = self.rules[current_row]
-        dialog = RuleDialog(self, rule=rule_to_edit)
-        if dialog.exec() == QDialog.DialogCode.Accepted:
-            updated_rule = self._normalize_rule(dialog.get_data())
-            self.rules[current_row] = updated_rule
-            self.save_rules()
-            self.refresh_rule_list()
-            print(f"Regra {current_row + 1} atualizada.")
-
-    def remove_rule(self):
-        current_row = self.list_widget.currentRow()
-        if current_row == -1:
-            return
-        del self.rules[current_row]
-        self.list_widget.takeItem(current_row)
-        self.save_rules()
-        print(f"Regra {current_row + 1} removida.")
-
-    def add_ignored_app(self):
-        name, ok = QInputDialog.getText(self, "Adicionar aplicativo ignorado", "Nome do aplicativo:")
-        if not ok:
-            return
-        cleaned = name.strip()
-        if not cleaned:
-            return
-        if cleaned in IGNORED_APPS:
-            print(f"ℹ️ '{cleaned}' já está na lista de ignorados.")
-            return
-        IGNORED_APPS.add(cleaned)
-        save_ignored_apps_to_disk()
-        self.refresh_ignore_list()
-        print(f"Aplicativo '{cleaned}' adicionado à lista de ignorados.")
-
-    def remove_ignored_app(self):
-        item = self.ignore_list_widget.currentItem()
-        if not item:
-            return
-        name = item.text()
-        if name in IGNORED_APPS:
-            IGNORED_APPS.remove(name)
-            save_ignored_apps_to_disk()
-            self.refresh_ignore_list()
-            print(f"Aplicativo '{name}' removido da lista de ignorados.")
-
-    def closeEvent(self, event):
-        if self.dbus_listener:
-            self.dbus_listener.stop()
-        if self.pending_timer:
-            self.pending_timer.stop()
-        super().closeEvent(event)
-
-def start_gui():
-    app_qt = QApplication(sys.argv)
-    window = MainWindow()
-    window.show()
-    sys.exit(app_qt.exec())
+def start_services():
+    DELIVERY_QUEUE.start()
+    COALESCER.start()
+    config_watcher = ConfigFileWatcher()
+    config_watcher.start()
+    if hasattr(signal, "SIGUSR1"):
+        # kill -USR1 <pid> salva o buffer de spans em notify-watcher/traces/.
+        signal.signal(signal.SIGUSR1, lambda *_: TRACER.dump_to_file())
+    if hasattr(signal, "SIGHUP"):
+        # kill -HUP <pid> relê config.json e ignore.json sem reiniciar.
+        signal.signal(
+            signal.SIGHUP,
+            lambda *_: threading.Thread(target=reload_config, name="config-reload", daemon=True).start(),
+        )
+    return config_watcher
+
+
+def stop_services():
+    RATE_LIMITER.stop()
+    COALESCER.stop()
+    DELIVERY_QUEUE.stop()
+    SCREENSHOT_PROCESSOR.shutdown()
+    NTFY_TRANSPORT.close()
+    RULE_STORE.close()
+
+
+def run_headless(dbus=True):
+    """Roda só servidor HTTP, listener DBus e entrega, no thread principal e sem Qt."""
+    listener = None
+    if dbus:
+        listener = DBusNotificationListener(handle_dbus_notification)
+        listener.start()
+
+    def _stop(*_):
+        threading.Thread(target=HTTP_SERVER.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+    try:
+        HTTP_SERVER.serve_forever()
+    finally:
+        if listener is not None:
+            listener.stop()
+        stop_services()
+    print("🛑 Notificador encerrado.")
+
 
 # --- Ponto de Entrada Principal ---
 if __name__ == "__main__":
-    print("🚀 Iniciando Aplicativo Notificador...")
+    parser = argparse.ArgumentParser(description="Encaminha notificações do sistema e do navegador para o ntfy.")
+    parser.add_argument("--headless", action="store_true", help="sem interface gráfica: só servidor HTTP, DBus e entrega")
+    args = parser.parse_args()
+    # gui.py faz "from app import ..."; aponta esse nome para este módulo em vez de carregar uma segunda cópia.
+    sys.modules.setdefault("app", sys.modules[__name__])
 
-    server_thread = threading.Thread(target=start_flask_server, daemon=True)
-    server_thread.start()
+    print("🚀 Iniciando Aplicativo Notificador...")
+    start_gui = None
+    if not args.headless:
+        try:
+            from gui import start_gui
+        except ImportError as exc:
+            print(f"⚠️ Interface gráfica indisponível ({exc}); seguindo em modo headless.")
 
-    print("✅ Servidor está rodando em background.")
-    
-    start_gui()
+    start_services()
+    if start_gui is None:
+        run_headless()
+    else:
+        server_thread = threading.Thread(target=start_flask_server, daemon=True)
+        server_thread.start()
+        print("✅ Servidor está rodando em background.")
+        start_gui()
@@ -0,0 +1,120 @@
+"""Injetor sintético de chamadas Notify para o DBusNotificationListener.
+
+Modos:
+  bus        chama org.freedesktop.Notifications.Notify no barramento de sessão
+             (precisa de dbus-python e de um serve.py rodando com --dbus);
+  inprocess  importa o app num diretório isolado e entrega mensagens falsas
+             direto ao _on_message do listener, medindo o caminho completo
+             (ignore, dedupe, histórico, limites e coalescência) sem DBus.
+
+Uso: python notify-watcher/bench/dbus_inject.py --mode inprocess --ntfy-url http://127.0.0.1:8090
+"""
+import argparse
+import json
+import shutil
+import tempfile
+import time
+
+from loadgen import summarize
+
+
+class FakeNotifyMessage:
+    """Imita o dbus.lowlevel.MethodCallMessage que o listener inspeciona."""
+
+    __slots__ = ("_args", "_sender")
+
+    def __init__(self, args, sender=":1.bench"):
+        self._args = args
+        self._sender = sender
+
+    def get_member(self):
+        return "Notify"
+
+    def get_args_list(self):
+        return list(self._args)
+
+    def get_sender(self):
+        return self._sender
+
+
+def notify_args(seq, app_name):
+    return [app_name, 0, "", f"Notificação {seq}", f"Corpo sintético {seq}", [], {}, -1]
+
+
+def _paced(rate, duration):
+    total = max(1, int(rate * duration))
+    interval = 1.0 / rate
+    started = time.perf_counter()
+    for seq in range(total):
+        scheduled = started + seq * interval
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        yield seq, scheduled
+
+
+def inject_bus(rate, duration, app_name="BenchDBus"):
+    import dbus
+
+    bus = dbus.SessionBus()
+    proxy = bus.get_object("org.freedesktop.Notifications", "/org/freedesktop/Notifications")
+    notify = dbus.Interface(proxy, "org.freedesktop.Notifications").Notify
+    latencies = []
+    errors = 0
+    started = time.perf_counter()
+    for seq, scheduled in _paced(rate, duration):
+        app, notif_id, icon, title, body, actions, hints, timeout = notify_args(seq, app_name)
+        try:
+            # Sem esperar resposta: o listener só espiona, quem responde é o daemon de notificações.
+            notify(app, dbus.UInt32(notif_id), icon, title, body, dbus.Array(actions, signature="s"),
+                   dbus.Dictionary(hints, signature="sv"), dbus.Int32(timeout), ignore_reply=True)
+        except dbus.DBusException:
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - scheduled)
+    return summarize(latencies, time.perf_counter() - started, mode="bus", rate=rate, duration=duration, errors=errors)
+
+
+def inject_inprocess(rate, duration, ntfy_url, app_name="BenchDBus", overrides=None):
+    from serve import load_app, prepare_workdir
+
+    workdir = tempfile.mkdtemp(prefix="notify-bench-dbus-")
+    prepare_workdir(workdir, ntfy_url, overrides=overrides)
+    app = load_app(workdir)
+    app.DELIVERY_QUEUE.start()
+    app.COALESCER.start()
+    listener = app.DBusNotificationListener(app.handle_dbus_notification)
+    latencies = []
+    started = time.perf_counter()
+    try:
+        for seq, scheduled in _paced(rate, duration):
+            listener._on_message(None, FakeNotifyMessage(notify_args(seq, app_name)))
+            latencies.append(time.perf_counter() - scheduled)
+    finally:
+        elapsed = time.perf_counter() - started
+        app.COALESCER.stop()
+        app.DELIVERY_QUEUE.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+    return summarize(latencies, elapsed, mode="inprocess", rate=rate, duration=duration)
+
+
+def main(argv=None):
+    from serve import parse_overrides
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", choices=("bus", "inprocess"), default="inprocess")
+    parser.add_argument("--rate", type=float, default=200.0, help="chamadas Notify por segundo")
+    parser.add_argument("--duration", type=float, default=10.0, help="segundos")
+    parser.add_argument("--app-name", default="BenchDBus")
+    parser.add_argument("--ntfy-url", default="http://127.0.0.1:8090", help="só no modo inprocess")
+    parser.add_argument("--set", action="append", metavar="CHAVE=JSON", help="só no modo inprocess")
+    args = parser.parse_args(argv)
+    if args.mode == "bus":
+        result = inject_bus(args.rate, args.duration, args.app_name)
+    else:
+        result = inject_inprocess(args.rate, args.duration, args.ntfy_url, args.app_name, parse_overrides(args.set))
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""Servidor ntfy falso para benchmarks: aceita publicações com latência e erros configuráveis.
+
+Uso: python notify-watcher/bench/fake_ntfy.py --port 8090 --latency 0.05 --error-rate 0.01
+GET /_stats devolve os contadores; DELETE /_reset zera.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeNtfyStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clear()
+
+    def _clear(self):
+        self.received = 0
+        self.accepted = 0
+        self.failed = 0
+        self.bytes = 0
+        self.topics = {}
+
+    def reset(self):
+        with self._lock:
+            self._clear()
+
+    def record(self, topic, size, ok):
+        with self._lock:
+            self.received += 1
+            self.bytes += size
+            self.topics[topic] = self.topics.get(topic, 0) + 1
+            if ok:
+                self.accepted += 1
+            else:
+                self.failed += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "received": self.received,
+                "accepted": self.accepted,
+                "failed": self.failed,
+                "bytes": self.bytes,
+                "topics": dict(self.topics),
+            }
+
+
+def make_handler(stats, latency=0.0, jitter=0.0, error_rate=0.0, error_status=503, retry_after=None):
+    class FakeNtfyHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send_json(self, status, payload, headers=None):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _read_body(self):
+            if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+                size = 0
+                while True:
+                    chunk_len = int(self.rfile.readline().split(b";")[0].strip() or b"0", 16)
+                    if chunk_len == 0:
+                        self.rfile.readline()
+                        return size
+                    self.rfile.read(chunk_len + 2)
+                    size += chunk_len
+            length = int(self.headers.get("Content-Length") or 0)
+            if length:
+                self.rfile.read(length)
+            return length
+
+        def _publish(self):
+            size = self._read_body()
+            topic = self.path.split("?", 1)[0].strip("/") or "(raiz)"
+            delay = latency + (random.uniform(0, jitter) if jitter else 0.0)
+            if delay > 0:
+                time.sleep(delay)
+            if error_rate and random.random() < error_rate:
+                stats.record(topic, size, ok=False)
+                headers = {"Retry-After": str(retry_after)} if retry_after is not None else None
+                self._send_json(error_status, {"code": error_status, "error": "erro simulado"}, headers)
+                return
+            stats.record(topic, size, ok=True)
+            self._send_json(200, {
+                "id": f"{random.getrandbits(48):012x}",
+                "time": int(time.time()),
+                "event": "message",
+                "topic": topic,
+            })
+
+        do_POST = _publish
+        do_PUT = _publish
+
+        def do_GET(self):
+            if self.path.startswith("/_stats"):
+                self._send_json(200, stats.snapshot())
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def do_DELETE(self):
+            if self.path.startswith("/_reset"):
+                stats.reset()
+                self._send_json(200, {"status": "ok"})
+            else:
+                self._send_json(404, {"error": "not found"})
+
+    return FakeNtfyHandler
+
+
+def make_server(host="127.0.0.1", port=0, **options):
+    stats = FakeNtfyStats()
+    server = ThreadingHTTPServer((host, port), make_handler(stats, **options))
+    server.daemon_threads = True
+    server.stats = stats
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency", type=float, default=0.0, help="atraso fixo por publicação (s)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="atraso aleatório extra, até N segundos")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fração de publicações que falham (0-1)")
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--retry-after", type=int, default=None, help="valor do cabeçalho Retry-After nas falhas")
+    args = parser.parse_args(argv)
+
+    server = make_server(
+        args.host,
+        args.port,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        retry_after=args.retry_after,
+    )
+    print(f"▶️ ntfy falso ouvindo em http://{args.host}:{server.server_address[1]}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
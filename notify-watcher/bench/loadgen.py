@@ -0,0 +1,205 @@
+"""Gerador de carga em malha aberta para as rotas HTTP do notify-watcher.
+
+As requisições são agendadas a uma taxa fixa e a latência é medida a partir
+do instante agendado, para que a fila do próprio gerador entre na conta.
+
+Uso: python notify-watcher/bench/loadgen.py --scenario notify --rate 50 --concurrency 8 --duration 10
+"""
+import argparse
+import json
+import math
+import queue
+import struct
+import threading
+import time
+import zlib
+
+import requests
+
+SCREENSHOT_VARIANTS = 16
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies, elapsed, **extra):
+    """Resumo padrão: contagem, vazão e p50/p95/p99 em milissegundos."""
+    ordered = sorted(latencies)
+    summary = dict(extra)
+    summary["completed"] = len(ordered)
+    summary["elapsed"] = round(elapsed, 3)
+    summary["throughput"] = round(len(ordered) / elapsed, 2) if elapsed > 0 else 0.0
+    summary["latency_ms"] = {
+        "p50": _ms(percentile(ordered, 0.50)),
+        "p95": _ms(percentile(ordered, 0.95)),
+        "p99": _ms(percentile(ordered, 0.99)),
+        "max": _ms(ordered[-1] if ordered else None),
+        "mean": _ms(sum(ordered) / len(ordered) if ordered else None),
+    }
+    return summary
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000.0, 3)
+
+
+def make_png(width, height, seed=0):
+    """PNG RGB sintético, sem depender do Pillow."""
+    rows = []
+    for y in range(height):
+        shade = (y * 255 // max(1, height - 1) + seed * 37) & 0xFF
+        pixel = bytes(((shade + seed * 11) & 0xFF, (255 - shade) & 0xFF, (seed * 53) & 0xFF))
+        rows.append(b"\x00" + pixel * width)
+
+    def chunk(tag, data):
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(b"".join(rows), 6)) + chunk(b"IEND", b"")
+
+
+class Scenario:
+    """Monta a requisição número `seq` de um cenário."""
+
+    def __init__(self, name, screenshot_size=(1280, 800)):
+        if name not in SCENARIOS:
+            raise ValueError(f"cenário desconhecido: {name}")
+        self.name = name
+        self._screenshots = []
+        if name == "notify_screenshot":
+            width, height = screenshot_size
+            self._screenshots = [make_png(width, height, seed) for seed in range(SCREENSHOT_VARIANTS)]
+
+    def build(self, seq):
+        return SCENARIOS[self.name](self, seq)
+
+    def _notify(self, seq):
+        payload = {
+            "app": "Benchmark",
+            "text": f"Mensagem de teste {seq}",
+            "rule": {"name": f"bench-{seq % 8}", "tags": "bench"},
+        }
+        return "POST", "/notify", {"json": payload}
+
+    def _notify_screenshot(self, seq):
+        payload = {
+            "app": "Benchmark",
+            "text": f"Captura de teste {seq}",
+            "rule": {"name": f"bench-{seq % 8}", "tags": "bench"},
+        }
+        image = self._screenshots[seq % len(self._screenshots)]
+        return "POST", "/notify", {
+            "data": {"payload": json.dumps(payload)},
+            "files": {"screenshot": ("screenshot.png", image, "image/png")},
+        }
+
+    def _config(self, seq):
+        return "GET", "/config", {"params": {"url": f"https://bench{seq % 16}.example.com/pagina/{seq % 64}"}}
+
+    def _pending_rule(self, seq):
+        payload = {
+            "name": f"Regra de benchmark {seq}",
+            "page_url": f"https://bench{seq % 16}.example.com/pagina",
+            "type": "element",
+            "selector": f"#item-{seq}",
+        }
+        return "POST", "/pending_rule", {"json": payload}
+
+
+SCENARIOS = {
+    "notify": Scenario._notify,
+    "notify_screenshot": Scenario._notify_screenshot,
+    "config": Scenario._config,
+    "pending_rule": Scenario._pending_rule,
+}
+
+
+def run_load(base_url, scenario, rate, concurrency, duration, timeout=10.0):
+    """Dispara `rate` req/s durante `duration` segundos com `concurrency` workers."""
+    if not isinstance(scenario, Scenario):
+        scenario = Scenario(scenario)
+    base_url = base_url.rstrip("/")
+    total = max(1, int(rate * duration))
+    interval = 1.0 / rate
+    pending = queue.Queue()
+    lock = threading.Lock()
+    latencies = []
+    statuses = {}
+    errors = {}
+
+    def worker():
+        session = requests.Session()
+        while True:
+            item = pending.get()
+            if item is None:
+                return
+            scheduled, seq = item
+            method, path, kwargs = scenario.build(seq)
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                response = session.request(method, base_url + path, timeout=timeout, **kwargs)
+                response.content
+                key = str(response.status_code)
+                error = None
+            except requests.RequestException as exc:
+                key = None
+                error = type(exc).__name__
+            finished = time.perf_counter()
+            with lock:
+                if key is not None:
+                    statuses[key] = statuses.get(key, 0) + 1
+                    if response.ok:
+                        latencies.append(finished - scheduled)
+                else:
+                    errors[error] = errors.get(error, 0) + 1
+
+    workers = [threading.Thread(target=worker, daemon=True) for _ in range(max(1, concurrency))]
+    for thread in workers:
+        thread.start()
+    started = time.perf_counter()
+    for seq in range(total):
+        scheduled = started + seq * interval
+        # Enfileira um pouco antes do horário; o worker espera até o instante exato.
+        wait = scheduled - time.perf_counter() - 0.005
+        if wait > 0:
+            time.sleep(wait)
+        pending.put((scheduled, seq))
+    for _ in workers:
+        pending.put(None)
+    for thread in workers:
+        thread.join(timeout=timeout + duration)
+    elapsed = time.perf_counter() - started
+    return summarize(
+        latencies,
+        elapsed,
+        scenario=scenario.name,
+        rate=rate,
+        concurrency=concurrency,
+        duration=duration,
+        sent=total,
+        status=statuses,
+        errors=errors,
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:3000")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="notify")
+    parser.add_argument("--rate", type=float, default=50.0, help="requisições por segundo")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0, help="segundos")
+    parser.add_argument("--timeout", type=float, default=10.0)
+    args = parser.parse_args(argv)
+    result = run_load(args.url, args.scenario, args.rate, args.concurrency, args.duration, args.timeout)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
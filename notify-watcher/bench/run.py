@@ -0,0 +1,311 @@
+"""Executa a suíte de benchmark completa e salva o resultado em bench/results/<data>.json.
+
+Sobe o ntfy falso e o serve.py em subprocessos, roda cada cenário de carga
+amostrando o RSS do servidor e, opcionalmente, o injetor de Notify DBus.
+
+Uso:
+  python notify-watcher/bench/run.py --duration 10 --ntfy-latency 0.05
+  python notify-watcher/bench/run.py --compare results/a.json results/b.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+
+from loadgen import run_load
+from serve import BENCH_OVERRIDES, parse_overrides
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+# (cenário, req/s, concorrência)
+DEFAULT_SUITE = (
+    ("notify", 50, 8),
+    ("notify_screenshot", 10, 4),
+    ("config", 200, 8),
+    ("pending_rule", 20, 4),
+)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def read_rss(pid):
+    """RSS atual do processo em bytes (Linux, via /proc)."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+class RssSampler(threading.Thread):
+    def __init__(self, pid, interval=0.1):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.is_set():
+            rss = read_rss(self.pid)
+            if rss is not None:
+                self.samples.append(rss)
+            self._done.wait(self.interval)
+
+    def stop(self):
+        self._done.set()
+        self.join()
+        rss = read_rss(self.pid)
+        if rss is not None:
+            self.samples.append(rss)
+        if not self.samples:
+            return {"rss_peak": None, "rss_end": None}
+        return {"rss_peak": max(self.samples), "rss_end": self.samples[-1]}
+
+
+def wait_http(url, process, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"❌ Processo encerrou antes de ficar pronto (código {process.returncode}).")
+        try:
+            requests.get(url, timeout=1.0)
+            return
+        except requests.RequestException:
+            time.sleep(0.01)
+    raise SystemExit(f"❌ Tempo esgotado esperando {url}.")
+
+
+def spawn(script, *args, log=None):
+    return subprocess.Popen(
+        [sys.executable, os.path.join(BENCH_DIR, script), *map(str, args)],
+        cwd=BENCH_DIR,
+        stdout=log or subprocess.DEVNULL,
+        stderr=subprocess.STDOUT,
+    )
+
+
+def stop_process(process, timeout=10.0):
+    if process.poll() is not None:
+        return
+    process.terminate()
+    try:
+        process.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BENCH_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_dbus_inprocess(args, ntfy_url):
+    command = [sys.executable, os.path.join(BENCH_DIR, "dbus_inject.py"), "--mode", "inprocess",
+               "--rate", str(args.dbus_rate), "--duration", str(args.duration), "--ntfy-url", ntfy_url]
+    for pair in args.set or ():
+        command += ["--set", pair]
+    process = subprocess.Popen(command, cwd=BENCH_DIR, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    sampler = RssSampler(process.pid)
+    sampler.start()
+    output, _ = process.communicate()
+    memory = sampler.stop()
+    lines = [line for line in output.splitlines() if line.startswith("{")]
+    if process.returncode != 0 or not lines:
+        print(f"⚠️ Injetor DBus falhou (código {process.returncode}).")
+        return None
+    result = json.loads(lines[-1])
+    result["scenario"] = "dbus_inprocess"
+    result.update(memory)
+    return result
+
+
+def run_suite(args):
+    started_at = datetime.datetime.now().isoformat(timespec="seconds")
+    ntfy_port = free_port()
+    app_port = args.port or free_port()
+    ntfy_url = f"http://127.0.0.1:{ntfy_port}"
+    base_url = f"http://127.0.0.1:{app_port}"
+    log = open(args.log, "w") if args.log else None
+
+    ntfy = spawn(
+        "fake_ntfy.py", "--port", ntfy_port, "--latency", args.ntfy_latency,
+        "--jitter", args.ntfy_jitter, "--error-rate", args.ntfy_error_rate, log=log,
+    )
+    serve_args = ["--ntfy-url", ntfy_url, "--port", app_port]
+    if args.dbus == "bus":
+        serve_args.append("--dbus")
+    for pair in args.set or ():
+        serve_args += ["--set", pair]
+    scenarios = []
+    server = None
+    try:
+        wait_http(f"{ntfy_url}/_stats", ntfy)
+        # Partida a frio: do spawn até o servidor responder à primeira requisição.
+        spawned = time.perf_counter()
+        server = spawn("serve.py", *serve_args, log=log)
+        wait_http(f"{base_url}/delivery/stats", server)
+        startup = time.perf_counter() - spawned
+        baseline_rss = read_rss(server.pid)
+        print(f"▶️ Servidor pronto em {base_url} após {startup * 1000:.0f} ms (RSS inicial {_mb(baseline_rss)}).")
+
+        selected = [entry for entry in DEFAULT_SUITE if not args.scenario or entry[0] in args.scenario]
+        for name, rate, concurrency in selected:
+            rate *= args.rate_scale
+            print(f"⏱️ {name}: {rate:g} req/s, concorrência {concurrency}, {args.duration:g}s...")
+            sampler = RssSampler(server.pid)
+            sampler.start()
+            result = run_load(base_url, name, rate, concurrency, args.duration)
+            result.update(sampler.stop())
+            scenarios.append(result)
+            _print_result(result)
+
+        if args.dbus == "bus":
+            from dbus_inject import inject_bus
+
+            print(f"⏱️ dbus_bus: {args.dbus_rate:g} Notify/s, {args.duration:g}s...")
+            sampler = RssSampler(server.pid)
+            sampler.start()
+            result = inject_bus(args.dbus_rate, args.duration)
+            result["scenario"] = "dbus_bus"
+            result.update(sampler.stop())
+            scenarios.append(result)
+            _print_result(result)
+
+        if args.dbus == "inprocess":
+            print(f"⏱️ dbus_inprocess: {args.dbus_rate:g} Notify/s, {args.duration:g}s...")
+            result = run_dbus_inprocess(args, ntfy_url)
+            if result is not None:
+                scenarios.append(result)
+                _print_result(result)
+
+        # Dá tempo para a fila de entrega esvaziar antes de ler os contadores.
+        time.sleep(min(5.0, args.duration))
+        delivery = requests.get(f"{base_url}/delivery/stats", timeout=5).json()
+        ntfy_stats = requests.get(f"{ntfy_url}/_stats", timeout=5).json()
+        final_rss = read_rss(server.pid)
+    finally:
+        if server is not None:
+            stop_process(server)
+        stop_process(ntfy)
+        if log:
+            log.close()
+
+    return {
+        "started_at": started_at,
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "settings": {
+            "duration": args.duration,
+            "rate_scale": args.rate_scale,
+            "ntfy_latency": args.ntfy_latency,
+            "ntfy_jitter": args.ntfy_jitter,
+            "ntfy_error_rate": args.ntfy_error_rate,
+            "dbus": args.dbus,
+            "overrides": args.set or [],
+            "spool_enabled": bool({**BENCH_OVERRIDES, **parse_overrides(args.set)}["spool_enabled"]),
+        },
+        "server": {"startup_seconds": round(startup, 3), "rss_start": baseline_rss, "rss_end": final_rss, "delivery": delivery},
+        "fake_ntfy": ntfy_stats,
+        "scenarios": scenarios,
+    }
+
+
+def _mb(value):
+    return "-" if value is None else f"{value / (1024 * 1024):.1f} MB"
+
+
+def _print_result(result):
+    latency = result["latency_ms"]
+    print(
+        f"   p50 {latency['p50']} ms | p95 {latency['p95']} ms | p99 {latency['p99']} ms | "
+        f"{result['throughput']} req/s | RSS pico {_mb(result.get('rss_peak'))}"
+    )
+
+
+def _delta(old, new):
+    if old in (None, 0) or new is None:
+        return ""
+    return f" ({(new - old) / old * 100:+.1f}%)"
+
+
+def compare(path_a, path_b):
+    with open(path_a) as f:
+        before = json.load(f)
+    with open(path_b) as f:
+        after = json.load(f)
+    print(f"📊 {os.path.basename(path_a)} ({before.get('git_revision')}) → {os.path.basename(path_b)} ({after.get('git_revision')})")
+    previous = {entry["scenario"]: entry for entry in before.get("scenarios", [])}
+    for entry in after.get("scenarios", []):
+        name = entry["scenario"]
+        old = previous.get(name)
+        if old is None:
+            print(f"  {name}: sem referência")
+            continue
+        print(f"  {name}")
+        for key in ("p50", "p95", "p99"):
+            a, b = old["latency_ms"].get(key), entry["latency_ms"].get(key)
+            print(f"    {key:<10} {a} → {b} ms{_delta(a, b)}")
+        print(f"    {'vazão':<10} {old['throughput']} → {entry['throughput']} req/s{_delta(old['throughput'], entry['throughput'])}")
+        a, b = old.get("rss_peak"), entry.get("rss_peak")
+        print(f"    {'RSS pico':<10} {_mb(a)} → {_mb(b)}{_delta(a, b)}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=float, default=10.0, help="segundos por cenário")
+    parser.add_argument("--scenario", action="append", choices=[entry[0] for entry in DEFAULT_SUITE],
+                        help="roda só os cenários indicados (repetível)")
+    parser.add_argument("--rate-scale", type=float, default=1.0, help="multiplica as taxas da suíte")
+    parser.add_argument("--ntfy-latency", type=float, default=0.0)
+    parser.add_argument("--ntfy-jitter", type=float, default=0.0)
+    parser.add_argument("--ntfy-error-rate", type=float, default=0.0)
+    parser.add_argument("--dbus", choices=("off", "inprocess", "bus"), default="inprocess")
+    parser.add_argument("--dbus-rate", type=float, default=200.0)
+    parser.add_argument("--port", type=int, default=None, help="porta do servidor; padrão: livre")
+    parser.add_argument("--set", action="append", metavar="CHAVE=JSON", help="sobrescreve uma chave do config.json")
+    parser.add_argument("--log", help="arquivo para a saída dos subprocessos")
+    parser.add_argument("--output", help="arquivo de resultado; padrão: bench/results/<data>.json")
+    parser.add_argument("--compare", nargs=2, metavar=("ANTES", "DEPOIS"), help="compara dois resultados salvos")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    result = run_suite(args)
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, datetime.datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"💾 Resultado salvo em {output}")
+
+
+if __name__ == "__main__":
+    main()
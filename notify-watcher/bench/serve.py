@@ -0,0 +1,100 @@
+"""Sobe o notify-watcher em modo headless num diretório de trabalho isolado, para benchmarks.
+
+O config.json do repositório é copiado com ajustes de benchmark (ntfy falso,
+limites de envio e dedupe desligados) e pode ser sobrescrito com --set chave=json.
+O spool fica ligado como em produção; --set spool_enabled=false mede a fila só
+em memória.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BENCH_OVERRIDES = {
+    "ntfy_topic": "bench",
+    "rate_limits": {
+        "app": {"per_minute": 0},
+        "rule": {"per_minute": 0},
+        "topic": {"per_minute": 0},
+    },
+    "dedupe_http_ttl": 0,
+    "dedupe_dbus_ttl": 0,
+    # Cada envio passa pelo outbox SQLite, como em produção (o spool fica no workdir).
+    "spool_enabled": True,
+}
+
+
+def parse_overrides(pairs):
+    overrides = {}
+    for pair in pairs or ():
+        key, sep, raw = pair.partition("=")
+        if not sep:
+            raise SystemExit(f"❌ --set espera chave=valor, recebido: {pair}")
+        try:
+            overrides[key] = json.loads(raw)
+        except json.JSONDecodeError:
+            overrides[key] = raw
+    return overrides
+
+
+def prepare_workdir(workdir, ntfy_url, port=None, overrides=None):
+    """Cria <workdir>/notify-watcher com config.json e ignore.json prontos para o app."""
+    target = os.path.join(workdir, "notify-watcher")
+    os.makedirs(target, exist_ok=True)
+    try:
+        with open(os.path.join(APP_DIR, "config.json"), "r") as f:
+            config = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        config = {}
+    if not isinstance(config, dict):
+        config = {}
+    config.update(BENCH_OVERRIDES)
+    config["ntfy_base_url"] = ntfy_url
+    if port is not None:
+        config["server_port"] = port
+    config.update(overrides or {})
+    with open(os.path.join(target, "config.json"), "w") as f:
+        json.dump(config, f, indent=2)
+    ignore_src = os.path.join(APP_DIR, "ignore.json")
+    if os.path.exists(ignore_src):
+        shutil.copy(ignore_src, os.path.join(target, "ignore.json"))
+    return config
+
+
+def load_app(workdir):
+    """Importa app.py a partir do repositório com o diretório de trabalho isolado."""
+    os.chdir(workdir)
+    if APP_DIR not in sys.path:
+        sys.path.insert(0, APP_DIR)
+    import app
+
+    return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ntfy-url", required=True, help="URL base do ntfy (normalmente o fake_ntfy.py)")
+    parser.add_argument("--port", type=int, default=3000)
+    parser.add_argument("--workdir", help="diretório de trabalho; padrão: temporário")
+    parser.add_argument("--dbus", action="store_true", help="também escuta Notify no barramento de sessão")
+    parser.add_argument("--set", action="append", metavar="CHAVE=JSON", help="sobrescreve uma chave do config.json")
+    args = parser.parse_args(argv)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="notify-bench-")
+    prepare_workdir(workdir, args.ntfy_url, args.port, parse_overrides(args.set))
+    app = load_app(workdir)
+
+    app.start_services()
+    try:
+        app.run_headless(dbus=args.dbus)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
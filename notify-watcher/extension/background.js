@@ -1,5 +1,129 @@
 'use strict';
 
+const API_BASE = 'http://localhost:3000';
+const CONFIG_STREAM_MIN_RETRY_MS = 2000;
+const CONFIG_STREAM_RETRY_MS = 60000;
+
+// Um único stream de /config/stream para o perfil inteiro: com um EventSource
+// por aba, seis abas bastavam para ocupar todos os sockets HTTP/1.1 do host
+// e travar os fetch de /notify e /config. As mudanças vão às abas por mensagem.
+let configStream = null;
+let configStreamConnected = false;
+let configStreamEtag = '';
+let configStreamRetryMs = CONFIG_STREAM_MIN_RETRY_MS;
+let configStreamRetryTimer = null;
+
+function broadcastToTabs(message) {
+  chrome.tabs.query({}, tabs => {
+    for (const tab of tabs) {
+      if (tab.id == null) {
+        continue;
+      }
+      // Abas sem o content script (chrome://, loja) recusam a mensagem.
+      chrome.tabs.sendMessage(tab.id, message).catch(() => {});
+    }
+  });
+}
+
+function setConfigStreamConnected(connected) {
+  if (configStreamConnected === connected) {
+    return;
+  }
+  configStreamConnected = connected;
+  broadcastToTabs({ type: 'config_stream_state', connected });
+}
+
+function scheduleConfigStream(delay) {
+  if (configStreamRetryTimer) {
+    return;
+  }
+  configStreamRetryTimer = setTimeout(() => {
+    configStreamRetryTimer = null;
+    connectConfigStream();
+  }, delay);
+}
+
+function handleConfigEvent(block) {
+  let type = 'message';
+  let id = null;
+  const data = [];
+  for (const line of block.split('\n')) {
+    if (!line || line.startsWith(':')) {
+      continue;
+    }
+    const separator = line.indexOf(':');
+    const field = separator === -1 ? line : line.slice(0, separator);
+    const value = separator === -1 ? '' : line.slice(separator + 1).replace(/^ /, '');
+    if (field === 'event') {
+      type = value;
+    } else if (field === 'data') {
+      data.push(value);
+    } else if (field === 'id') {
+      id = value;
+    }
+  }
+  if (type !== 'config' || !data.length) {
+    return;
+  }
+  let payload = null;
+  try {
+    payload = JSON.parse(data.join('\n'));
+  } catch (error) {
+    return;
+  }
+  if (id) {
+    configStreamEtag = id;
+  }
+  broadcastToTabs({ type: 'config_changed', revision: payload.revision, etag: payload.etag });
+}
+
+async function readConfigEvents(body) {
+  const reader = body.pipeThrough(new TextDecoderStream()).getReader();
+  let buffer = '';
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) {
+      return;
+    }
+    buffer += value.replace(/\r\n?/g, '\n');
+    let boundary = buffer.indexOf('\n\n');
+    while (boundary !== -1) {
+      handleConfigEvent(buffer.slice(0, boundary));
+      buffer = buffer.slice(boundary + 2);
+      boundary = buffer.indexOf('\n\n');
+    }
+  }
+}
+
+async function connectConfigStream() {
+  if (configStream || configStreamRetryTimer) {
+    return;
+  }
+  configStream = new AbortController();
+  try {
+    const headers = configStreamEtag ? { 'Last-Event-ID': configStreamEtag } : {};
+    const response = await fetch(`${API_BASE}/config/stream`, {
+      cache: 'no-store',
+      headers,
+      signal: configStream.signal
+    });
+    if (!response.ok || !response.body) {
+      // 503: o servidor está no limite de streams; as abas seguem no polling.
+      configStreamRetryMs = CONFIG_STREAM_RETRY_MS;
+      return;
+    }
+    configStreamRetryMs = CONFIG_STREAM_MIN_RETRY_MS;
+    setConfigStreamConnected(true);
+    await readConfigEvents(response.body);
+  } catch (error) {
+    configStreamRetryMs = Math.min(configStreamRetryMs * 2, CONFIG_STREAM_RETRY_MS);
+  } finally {
+    configStream = null;
+    setConfigStreamConnected(false);
+    scheduleConfigStream(configStreamRetryMs);
+  }
+}
+
 chrome.runtime.onMessage.addListener((message, sender, sendResponse) => {
   if (!message || typeof message !== 'object') {
     return false;
@@ -17,5 +141,15 @@ chrome.runtime.onMessage.addListener((message, sender, sendResponse) => {
     return true; // keep the message channel open for async response
   }
 
+  if (message.type === 'config_stream_subscribe') {
+    // As abas mandam isto a cada ciclo de polling; se o service worker foi
+    // suspenso e perdeu o stream, a mensagem o acorda e o stream é reaberto.
+    connectConfigStream();
+    sendResponse({ connected: configStreamConnected });
+    return false;
+  }
+
   return false;
 });
+
+connectConfigStream();
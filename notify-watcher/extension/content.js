@@ -2,8 +2,11 @@
 
 const API_BASE = 'http://localhost:3000';
 const CONFIG_REFRESH_INTERVAL_MS = 15000;
+const CONFIG_FALLBACK_INTERVAL_MS = 300000;
 const RESCAN_INTERVAL_MS = 10000;
 const RECENT_BUFFER_LIMIT = 50;
+const NOTIFY_BATCH_DELAY_MS = 30;
+const NOTIFY_BATCH_MAX_ITEMS = 50;
 const TEXTUAL_CONDITIONS = new Set([
   'element_text',
   'text_equals',
@@ -17,10 +20,20 @@ const LENGTH_CONDITIONS = new Set(['text_length_gt', 'text_length_lt']);
 
 let rawRules = [];
 let preparedRules = [];
+let preparedRulesById = new Map();
+let configRevision = null;
+let configUrl = '';
 let activeRules = [];
 let ignoredApps = new Set();
 let rulesSignature = '';
+let configEtag = '';
+// ETag da config inteira (sem o ?url=), o mesmo que o /config/stream anuncia.
+let configStreamEtag = '';
+let configStreamConnected = false;
+let lastConfigLoadAt = 0;
 let lastTitle = document.title || '';
+let pendingNotifications = [];
+let notifyFlushTimer = null;
 
 const recentKeys = [];
 const recentKeySet = new Set();
@@ -276,12 +289,57 @@ function refreshRuleStateCache(rules) {
   ruleElementState = nextState;
 }
 
-async function notifyServer(payload) {
+function notifyServer(payload) {
+  pendingNotifications.push(payload);
+  if (pendingNotifications.length >= NOTIFY_BATCH_MAX_ITEMS) {
+    flushNotifications();
+  } else if (!notifyFlushTimer) {
+    notifyFlushTimer = setTimeout(flushNotifications, NOTIFY_BATCH_DELAY_MS);
+  }
+}
+
+function captureScreenshot() {
+  if (document.visibilityState !== 'visible' || !chrome?.runtime?.sendMessage) {
+    return Promise.resolve(null);
+  }
+  return new Promise(resolve => {
+    try {
+      chrome.runtime.sendMessage({ type: 'capture_screenshot' }, response => {
+        resolve(response && response.image ? response.image : null);
+      });
+    } catch (err) {
+      console.warn('[notify-watcher] Falha ao capturar screenshot:', err);
+      resolve(null);
+    }
+  });
+}
+
+async function flushNotifications() {
+  if (notifyFlushTimer) {
+    clearTimeout(notifyFlushTimer);
+    notifyFlushTimer = null;
+  }
+  const items = pendingNotifications;
+  pendingNotifications = [];
+  if (!items.length) {
+    return;
+  }
+  // Uma única captura por rajada; os itens marcados com screenshot: true a compartilham.
+  const screenshot = items.some(item => item.screenshot === true) ? await captureScreenshot() : null;
+  let url = `${API_BASE}/notify`;
+  let body;
+  if (items.length === 1) {
+    const { screenshot: wantsScreenshot, ...item } = items[0];
+    body = wantsScreenshot && screenshot ? { ...item, screenshot } : item;
+  } else {
+    url = `${API_BASE}/notify/batch`;
+    body = screenshot ? { items, screenshot } : { items };
+  }
   try {
-    const response = await fetch(`${API_BASE}/notify`, {
+    const response = await fetch(url, {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify(payload)
+      body: JSON.stringify(body)
     });
     if (!response.ok) {
       throw new Error(`Status ${response.status}`);
@@ -335,12 +393,10 @@ function triggerNotification(rule, details) {
     return;
   }
   console.log(`[notify-watcher] Regra acionada (${appName}): ${summary}`);
-  dispatchNotification(rule, summary).catch(error => {
-    console.error('[notify-watcher] Falha ao despachar notificação:', error);
-  });
+  dispatchNotification(rule, summary);
 }
 
-async function dispatchNotification(rule, summary) {
+function dispatchNotification(rule, summary) {
   const payload = {
     app: rule.appName || 'WebApp',
     text: summary,
@@ -349,28 +405,13 @@ async function dispatchNotification(rule, summary) {
       name: rule.name,
       condition: rule.condition,
       selector: rule.displaySelector,
-      url_contains: rule.url_contains
-    }
+      url_contains: rule.url_contains,
+      tags: rule.tags,
+      priority: rule.priority
+    },
+    screenshot: true
   };
-
-  if (document.visibilityState === 'visible' && chrome?.runtime?.sendMessage) {
-    try {
-      const response = await new Promise(resolve => {
-        try {
-          chrome.runtime.sendMessage({ type: 'capture_screenshot' }, resolve);
-        } catch (err) {
-          resolve({ error: err?.message || String(err) });
-        }
-      });
-      if (response && response.image) {
-        payload.screenshot = response.image;
-      }
-    } catch (error) {
-      console.warn('[notify-watcher] Falha ao capturar screenshot:', error);
-    }
-  }
-
-  await notifyServer(payload);
+  notifyServer(payload);
 }
 
 function sanitizeRule(rawRule) {
@@ -396,6 +437,8 @@ function sanitizeRule(rawRule) {
   const source = typeof rawRule.source === 'string' ? rawRule.source : 'manual';
   const capturedAt = rawRule.captured_at != null ? rawRule.captured_at : null;
   const metadata = typeof rawRule.metadata === 'object' && rawRule.metadata ? rawRule.metadata : undefined;
+  const tags = Array.isArray(rawRule.tags) || typeof rawRule.tags === 'string' ? rawRule.tags : undefined;
+  const priority = rawRule.priority != null ? rawRule.priority : undefined;
 
   if (type === 'element' && !cssSelector) {
     return null;
@@ -414,6 +457,8 @@ function sanitizeRule(rawRule) {
   }
 
   return {
+    id: rawRule.id != null ? String(rawRule.id) : undefined,
+    rev: Number.isFinite(rawRule.rev) ? rawRule.rev : undefined,
     name: name || 'Regra',
     url_contains: urlContains,
     page_url: pageUrl,
@@ -426,7 +471,9 @@ function sanitizeRule(rawRule) {
     length_threshold: lengthThreshold,
     source,
     captured_at: capturedAt,
-    metadata
+    metadata,
+    tags,
+    priority
   };
 }
 
@@ -438,7 +485,7 @@ function prepareRule(rule, index) {
   const textSnapshot = typeof rule.text_snapshot === 'string' && rule.text_snapshot ? rule.text_snapshot : baselineText;
   const lengthThreshold = Number.isFinite(rule.length_threshold) ? rule.length_threshold : null;
   const requiresText = TEXTUAL_CONDITIONS.has(condition);
-  const id = `${rule.name || 'Regra'}|${condition}|${cssSelector || textPattern || index}`;
+  const id = rule.id || `${rule.name || 'Regra'}|${condition}|${cssSelector || textPattern || index}`;
   const displaySelector = cssSelector || textPattern || '[sem seletor]';
   const fallbackCandidates = [];
   const meta = rule.metadata || {};
@@ -506,6 +553,10 @@ function updateActiveRules() {
 }
 
 function applyConfig(data, initialScan) {
+  if (data?.delta) {
+    applyConfigDelta(data);
+    return;
+  }
   const incomingRules = Array.isArray(data?.rules) ? data.rules : Array.isArray(data) ? data : [];
   const sanitized = incomingRules.map(sanitizeRule).filter(Boolean);
   const incomingIgnored = Array.isArray(data?.ignored_apps) ? data.ignored_apps : [];
@@ -514,9 +565,11 @@ function applyConfig(data, initialScan) {
   const nextSignature = JSON.stringify({ rules: sanitized, ignored });
   const changed = nextSignature !== rulesSignature;
   rulesSignature = nextSignature;
+  configRevision = Number.isFinite(data?.revision) ? data.revision : null;
 
   rawRules = sanitized;
   preparedRules = sanitized.map(prepareRule);
+  preparedRulesById = new Map(preparedRules.map(rule => [rule.id, rule]));
   ignoredApps = new Set(ignored);
   selectorErrorCache.clear();
   if (initialScan || changed) {
@@ -531,19 +584,114 @@ function applyConfig(data, initialScan) {
   }
 }
 
+function applyConfigDelta(data) {
+  const removed = Array.isArray(data.removed) ? data.removed.map(String) : [];
+  const changedRules = [];
+  for (const id of removed) {
+    preparedRulesById.delete(id);
+    ruleElementState.delete(id);
+  }
+  const incoming = Array.isArray(data.changed) ? data.changed : [];
+  incoming.forEach((rawRule, index) => {
+    const sanitized = sanitizeRule(rawRule);
+    if (!sanitized || !sanitized.id) {
+      return;
+    }
+    const prepared = prepareRule(sanitized, preparedRulesById.size + index);
+    preparedRulesById.set(prepared.id, prepared);
+    ruleElementState.set(prepared.id, new WeakMap());
+    changedRules.push(prepared);
+  });
+  const incomingIgnored = Array.isArray(data.ignored_apps) ? data.ignored_apps : [];
+  const ignored = incomingIgnored.map(item => String(item).trim()).filter(Boolean);
+  const ignoredChanged = ignored.length !== ignoredApps.size || ignored.some(item => !ignoredApps.has(item));
+  if (ignoredChanged) {
+    ignoredApps = new Set(ignored);
+  }
+  configRevision = Number.isFinite(data.revision) ? data.revision : configRevision;
+  if (!removed.length && !changedRules.length) {
+    return;
+  }
+
+  preparedRules = Array.from(preparedRulesById.values());
+  rulesSignature = '';
+  updateActiveRules();
+  const changedActive = changedRules.filter(ruleMatchesCurrentUrl);
+  console.log(`[notify-watcher] Config atualizada (rev ${configRevision}): ${changedRules.length} alteradas, ${removed.length} removidas`);
+  rescanRules(changedActive);
+}
+
 async function loadConfig(initialScan = false) {
   try {
-    const response = await fetch(`${API_BASE}/config`, { cache: 'no-store' });
+    // O servidor só devolve as regras desta URL; ao navegar, o conjunto é pedido de novo inteiro.
+    const pageUrl = window.location.href;
+    const full = initialScan || pageUrl !== configUrl;
+    const headers = {};
+    if (configEtag && !full) {
+      headers['If-None-Match'] = configEtag;
+    }
+    const params = new URLSearchParams({ url: pageUrl });
+    if (configRevision != null && !full) {
+      params.set('since', String(configRevision));
+    }
+    const response = await fetch(`${API_BASE}/config?${params}`, { cache: 'no-store', headers });
+    if (response.status === 304) {
+      configStreamEtag = response.headers.get('X-Config-Etag') || configStreamEtag;
+      lastConfigLoadAt = Date.now();
+      return;
+    }
     if (!response.ok) {
       throw new Error(`Status ${response.status}`);
     }
     const data = await response.json();
+    configEtag = response.headers.get('ETag') || '';
+    configStreamEtag = response.headers.get('X-Config-Etag') || '';
+    configUrl = pageUrl;
+    lastConfigLoadAt = Date.now();
     applyConfig(data, initialScan);
   } catch (error) {
     console.error('[notify-watcher] Erro ao carregar config:', error);
   }
 }
 
+// O stream de /config/stream fica no background.js (um por perfil, não por aba);
+// aqui só chegam as mensagens que ele repassa.
+function handleRuntimeMessage(message) {
+  if (!message || typeof message !== 'object') {
+    return;
+  }
+  if (message.type === 'config_stream_state') {
+    configStreamConnected = Boolean(message.connected);
+  } else if (message.type === 'config_changed') {
+    if (message.etag && message.etag === configStreamEtag) {
+      return;
+    }
+    loadConfig(false);
+  }
+}
+
+function subscribeConfigStream() {
+  if (!chrome?.runtime?.sendMessage) {
+    return;
+  }
+  try {
+    chrome.runtime.sendMessage({ type: 'config_stream_subscribe' }, response => {
+      configStreamConnected = !chrome.runtime.lastError && Boolean(response && response.connected);
+    });
+  } catch (error) {
+    // Extensão recarregada: o contexto antigo não fala mais com o background.
+    configStreamConnected = false;
+  }
+}
+
+function refreshConfigFallback() {
+  subscribeConfigStream();
+  if (configStreamConnected && Date.now() - lastConfigLoadAt < CONFIG_FALLBACK_INTERVAL_MS) {
+    return;
+  }
+  loadConfig(false);
+}
+
 function evaluateCondition(rule, element, elementText, state) {
   const baseline = rule.baselineText || '';
   const pattern = baseline || rule.textPattern || '';
@@ -712,10 +860,14 @@ function scanDocument() {
 }
 
 function rescanAllRules() {
-  if (!document.body || !activeRules.length) {
+  rescanRules(activeRules);
+}
+
+function rescanRules(rules) {
+  if (!document.body || !rules.length) {
     return;
   }
-  for (const rule of activeRules) {
+  for (const rule of rules) {
     let matchedPrimary = false;
     if (rule.cssSelector) {
       try {
@@ -797,6 +949,9 @@ function observeTitlePoller() {
 function handleUrlChange() {
   updateActiveRules();
   scanDocument();
+  if (window.location.href !== configUrl) {
+    loadConfig(false);
+  }
 }
 
 function instrumentHistory() {
@@ -1095,7 +1250,9 @@ async function initialize() {
   window.addEventListener('popstate', handleUrlChange);
   document.addEventListener('keydown', handleGlobalKeydown, false);
   instrumentHistory();
-  setInterval(() => loadConfig(false), CONFIG_REFRESH_INTERVAL_MS);
+  chrome.runtime.onMessage.addListener(handleRuntimeMessage);
+  subscribeConfigStream();
+  setInterval(refreshConfigFallback, CONFIG_REFRESH_INTERVAL_MS);
   setInterval(rescanAllRules, RESCAN_INTERVAL_MS);
 }
 
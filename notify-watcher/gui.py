@@ -0,0 +1,642 @@
+"""Interface gráfica (PyQt6) do notify-watcher.
+
+Importado só no modo com janela; o modo --headless nunca carrega o Qt.
+"""
+import bisect
+import sys
+import time
+
+from PyQt6.QtCore import QAbstractListModel, QModelIndex, QObject, QSortFilterProxyModel, Qt, QTimer, pyqtSignal
+from PyQt6.QtWidgets import (
+    QApplication, QMainWindow, QLabel, QWidget, QVBoxLayout, QHBoxLayout,
+    QListView, QPushButton, QDialog, QLineEdit, QComboBox, QFormLayout, QDialogButtonBox,
+    QInputDialog, QPlainTextEdit, QSpinBox
+)
+
+import app as core  # IGNORED_APPS é reatribuído a cada recarga; sempre ler via módulo
+from app import (
+    EVENT_BUS, EVENT_DELIVERY_FAILED, EVENT_IGNORE_LIST_CHANGED, EVENT_NOTIFICATION_RECEIVED,
+    EVENT_PENDING_RULE_CLEARED, EVENT_PENDING_RULE_SET, HISTORY, HTTP_SERVER, RATE_LIMITER,
+    RATE_LIMIT_ACTIONS, RATE_LIMIT_SCOPES, RULE_STORE, TEXT_LENGTH_CONDITIONS, TEXT_MATCH_CONDITIONS,
+    DBusNotificationListener, clear_pending_rule, handle_dbus_notification, load_ignored_apps_from_disk,
+    normalize_ntfy_priority, normalize_ntfy_tags, normalize_rate_limits, read_pending_rule,
+    save_ignored_apps_to_disk, stop_services,
+)
+
+
+# --- Diálogo para Adicionar/Editar Regra ---
+class RuleDialog(QDialog):
+    def __init__(self, parent=None, rule=None):
+        super().__init__(parent)
+        self.setWindowTitle("Adicionar/Editar Regra")
+        self.form_layout = QFormLayout(self)
+        self.name_input = QLineEdit(self)
+        self.url_input = QLineEdit(self)
+        self.type_input = QComboBox(self)
+        self.selector_input = QLineEdit(self)
+        self.condition_input = QComboBox(self)
+        self.baseline_input = QPlainTextEdit(self)
+        self.baseline_input.setPlaceholderText("Texto base para comparação (opcional)")
+        self.baseline_input.setFixedHeight(60)
+        self.length_threshold_input = QSpinBox(self)
+        self.length_threshold_input.setRange(0, 1_000_000)
+        self.length_threshold_input.setValue(0)
+        self.length_threshold_input.setEnabled(False)
+        self.tags_input = QLineEdit(self)
+        self.tags_input.setPlaceholderText("tag1, tag2 (opcional)")
+        self.priority_input = QComboBox(self)
+        self.priority_input.addItems(["", "min", "low", "default", "high", "max"])
+
+        self.type_input.addItems(["element", "element_text"])
+        self.condition_input.addItems([
+            "element",
+            "element_text",
+            "text_equals",
+            "text_differs",
+            "text_contains",
+            "text_not_contains",
+            "text_length_gt",
+            "text_length_lt",
+        ])
+
+        self.form_layout.addRow("Nome:", self.name_input)
+        self.form_layout.addRow("URL Contém:", self.url_input)
+        self.form_layout.addRow("Tipo:", self.type_input)
+        self.form_layout.addRow("Seletor/Texto:", self.selector_input)
+        self.form_layout.addRow("Condição:", self.condition_input)
+        self.form_layout.addRow("Texto Base:", self.baseline_input)
+        self.form_layout.addRow("Limite de Tamanho:", self.length_threshold_input)
+        self.form_layout.addRow("Tags ntfy:", self.tags_input)
+        self.form_layout.addRow("Prioridade ntfy:", self.priority_input)
+
+        self.button_box = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel, self)
+        self.button_box.accepted.connect(self.accept)
+        self.button_box.rejected.connect(self.reject)
+        self.form_layout.addRow(self.button_box)
+
+        self.css_selector = ""
+        self.snapshot_text = ""
+        self.page_url = ""
+        self.source = "manual"
+        self.captured_at = None
+        self.metadata = {}
+
+        self.condition_input.currentTextChanged.connect(self._update_condition_fields)
+        self.type_input.currentTextChanged.connect(self._on_type_changed)
+
+        if rule:
+            self.name_input.setText(rule.get("name", ""))
+            self.url_input.setText(rule.get("url_contains", ""))
+            self.type_input.setCurrentText(rule.get("type", "element"))
+            self.selector_input.setText(rule.get("selector", ""))
+            self.condition_input.setCurrentText(rule.get("condition", rule.get("type", "element")))
+            baseline_text = rule.get("baseline_text", "")
+            self.baseline_input.setPlainText(baseline_text)
+            length_threshold = rule.get("length_threshold")
+            if isinstance(length_threshold, (int, float)):
+                self.length_threshold_input.setValue(int(length_threshold))
+                self.length_threshold_input.setEnabled(True)
+            self.css_selector = rule.get("css_selector", "")
+            self.snapshot_text = rule.get("text_snapshot", baseline_text)
+            self.page_url = rule.get("page_url", "")
+            self.source = rule.get("source", "extension")
+            self.captured_at = rule.get("captured_at")
+            metadata = rule.get("metadata")
+            if isinstance(metadata, dict):
+                self.metadata = dict(metadata)
+            self.tags_input.setText(", ".join(normalize_ntfy_tags(rule.get("tags"))))
+            priority = normalize_ntfy_priority(rule.get("priority"))
+            if priority is not None:
+                self.priority_input.setCurrentText(["min", "low", "default", "high", "max"][priority - 1])
+        self._update_condition_fields()
+
+    def _on_type_changed(self, new_type):
+        if new_type == "element" and self.condition_input.currentText() == "element_text":
+            self.condition_input.setCurrentText("element")
+        elif new_type == "element_text" and self.condition_input.currentText() == "element":
+            self.condition_input.setCurrentText("element_text")
+        self._update_condition_fields()
+
+    def _update_condition_fields(self, *_):
+        condition = self.condition_input.currentText()
+        enable_text = condition in TEXT_MATCH_CONDITIONS or condition == "element_text"
+        enable_length = condition in TEXT_LENGTH_CONDITIONS
+        self.baseline_input.setEnabled(enable_text)
+        self.length_threshold_input.setEnabled(enable_length)
+        if not enable_length:
+            self.length_threshold_input.setValue(
+                self.length_threshold_input.value() if enable_length else 0
+            )
+        elif enable_length and self.length_threshold_input.value() == 0:
+            base_length = len(self.snapshot_text or self.baseline_input.toPlainText().strip())
+            if base_length > 0:
+                self.length_threshold_input.setValue(base_length)
+
+    def get_data(self):
+        baseline_text = self.baseline_input.toPlainText().strip()
+        condition = self.condition_input.currentText()
+        length_threshold = self.length_threshold_input.value() if self.length_threshold_input.isEnabled() else None
+        rule_type = self.type_input.currentText()
+        result = {
+            "name": self.name_input.text(),
+            "url_contains": self.url_input.text(),
+            "type": rule_type,
+            "selector": self.selector_input.text(),
+            "condition": condition,
+            "baseline_text": baseline_text,
+            "text_snapshot": self.snapshot_text or baseline_text,
+            "length_threshold": length_threshold,
+            "css_selector": self.selector_input.text() if rule_type == "element" else self.css_selector,
+        }
+        if self.page_url:
+            result["page_url"] = self.page_url
+        if self.source:
+            result["source"] = self.source
+        if self.captured_at is not None:
+            result["captured_at"] = self.captured_at
+        if self.metadata:
+            result["metadata"] = self.metadata
+        tags = normalize_ntfy_tags(self.tags_input.text())
+        if tags:
+            result["tags"] = tags
+        if self.priority_input.currentText():
+            result["priority"] = self.priority_input.currentText()
+        if length_threshold is None:
+            result.pop("length_threshold", None)
+        return result
+
+class QtEventBridge(QObject):
+    """Repassa eventos do EVENT_BUS para o thread da GUI via sinal enfileirado."""
+
+    event_received = pyqtSignal(object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._token = EVENT_BUS.subscribe(self.event_received.emit)
+
+    def close(self):
+        EVENT_BUS.unsubscribe(self._token)
+
+
+# --- Janela Principal da Aplicação ---
+class RateLimitDialog(QDialog):
+    SCOPE_LABELS = {"app": "Por aplicativo", "rule": "Por regra", "topic": "Tópico ntfy"}
+
+    def __init__(self, parent=None, limits=None):
+        super().__init__(parent)
+        self.setWindowTitle("Limites de Envio")
+        limits = normalize_rate_limits(limits)
+        self.form_layout = QFormLayout(self)
+        self.action_input = QComboBox(self)
+        self.action_input.addItems(list(RATE_LIMIT_ACTIONS))
+        self.action_input.setCurrentText(limits["action"])
+        self.form_layout.addRow("Ao exceder:", self.action_input)
+        self.inputs = {}
+        for scope in RATE_LIMIT_SCOPES:
+            per_minute = QSpinBox(self)
+            per_minute.setRange(0, 100_000)
+            per_minute.setSpecialValueText("sem limite")
+            per_minute.setValue(limits[scope]["per_minute"])
+            burst = QSpinBox(self)
+            burst.setRange(1, 100_000)
+            burst.setValue(limits[scope]["burst"])
+            self.form_layout.addRow(f"{self.SCOPE_LABELS[scope]} (por minuto):", per_minute)
+            self.form_layout.addRow(f"{self.SCOPE_LABELS[scope]} (rajada):", burst)
+            self.inputs[scope] = (per_minute, burst)
+        self.button_box = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel, self)
+        self.button_box.accepted.connect(self.accept)
+        self.button_box.rejected.connect(self.reject)
+        self.form_layout.addRow(self.button_box)
+        self._max_deferred = limits["max_deferred"]
+
+    def get_limits(self):
+        limits = {"action": self.action_input.currentText(), "max_deferred": self._max_deferred}
+        for scope, (per_minute, burst) in self.inputs.items():
+            limits[scope] = {"per_minute": per_minute.value(), "burst": burst.value()}
+        return limits
+
+
+class RuleListModel(QAbstractListModel):
+    """Regras exibidas na janela; edições notificam só a linha afetada."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rules = []
+
+    @staticmethod
+    def describe(rule):
+        name = rule.get("name", "Sem nome")
+        url_contains = rule.get("url_contains", "")
+        selector = rule.get("selector") or ""
+        condition = rule.get("condition", rule.get("type", "element"))
+        return f'{name} (URL: {url_contains}) -> {condition}: {selector!r}'
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rules)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.ItemDataRole.DisplayRole:
+            return self.describe(self._rules[index.row()])
+        if role == Qt.ItemDataRole.UserRole:
+            return self._rules[index.row()]
+        return None
+
+    def rule_at(self, row):
+        return self._rules[row]
+
+    def set_rules(self, rules):
+        self.beginResetModel()
+        self._rules = list(rules)
+        self.endResetModel()
+
+    def append_rule(self, rule):
+        row = len(self._rules)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._rules.append(rule)
+        self.endInsertRows()
+
+    def replace_rule(self, row, rule):
+        self._rules[row] = rule
+        index = self.index(row)
+        self.dataChanged.emit(index, index)
+
+    def remove_rule(self, row):
+        self.beginRemoveRows(QModelIndex(), row, row)
+        removed = self._rules.pop(row)
+        self.endRemoveRows()
+        return removed
+
+
+class IgnoreListModel(QAbstractListModel):
+    """Apps ignorados em ordem alfabética; inserções usam bisect em vez de reordenar tudo."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._names = []
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._names)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if index.isValid() and role == Qt.ItemDataRole.DisplayRole:
+            return self._names[index.row()]
+        return None
+
+    def name_at(self, row):
+        return self._names[row]
+
+    def set_names(self, names):
+        self.beginResetModel()
+        self._names = sorted(names)
+        self.endResetModel()
+
+    def sync_names(self, names):
+        """Aplica só a diferença para `names`, sem resetar o modelo (seleção e filtro ficam)."""
+        target = set(names)
+        for name in [name for name in self._names if name not in target]:
+            self.remove_name(name)
+        for name in target.difference(self._names):
+            self.add_name(name)
+
+    def add_name(self, name):
+        row = bisect.bisect_left(self._names, name)
+        if row < len(self._names) and self._names[row] == name:
+            return
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._names.insert(row, name)
+        self.endInsertRows()
+
+    def remove_name(self, name):
+        row = bisect.bisect_left(self._names, name)
+        if row == len(self._names) or self._names[row] != name:
+            return
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self._names[row]
+        self.endRemoveRows()
+
+
+class HistoryListModel(QAbstractListModel):
+    """Últimos eventos do HISTORY, mais novos no topo; atualizado por sondagem."""
+
+    MAX_ROWS = 500
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._entries = []
+        self._last_seq = 0
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._entries)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role != Qt.ItemDataRole.DisplayRole:
+            return None
+        entry = self._entries[index.row()]
+        when = time.strftime("%H:%M:%S", time.localtime(entry.timestamp))
+        rule = f" ({entry.rule})" if entry.rule else ""
+        latency = f" [{entry.latency:.2f}s]" if entry.latency is not None else ""
+        return f"{when} {entry.status:<12} {entry.source} {entry.app}{rule}: {entry.summary or ''}{latency}"
+
+    def poll(self):
+        fresh = HISTORY.since(self._last_seq)[-self.MAX_ROWS:]
+        if fresh:
+            self._last_seq = fresh[-1].seq
+            self.beginInsertRows(QModelIndex(), 0, len(fresh) - 1)
+            self._entries[:0] = reversed(fresh)
+            self.endInsertRows()
+            overflow = len(self._entries) - self.MAX_ROWS
+            if overflow > 0:
+                self.beginRemoveRows(QModelIndex(), self.MAX_ROWS, len(self._entries) - 1)
+                del self._entries[self.MAX_ROWS:]
+                self.endRemoveRows()
+        if self._entries:
+            # Status e latência mudam quando a entrega termina.
+            self.dataChanged.emit(self.index(0), self.index(len(self._entries) - 1))
+
+
+def _filtered_list_view(model, placeholder, parent_layout):
+    """Monta campo de busca + QListView sobre um proxy de filtro para `model`."""
+    proxy = QSortFilterProxyModel(model)
+    proxy.setSourceModel(model)
+    proxy.setFilterCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
+    search = QLineEdit()
+    search.setPlaceholderText(placeholder)
+    search.setClearButtonEnabled(True)
+    search.textChanged.connect(proxy.setFilterFixedString)
+    view = QListView()
+    view.setModel(proxy)
+    view.setUniformItemSizes(True)
+    view.setSelectionMode(QListView.SelectionMode.SingleSelection)
+    parent_layout.addWidget(search)
+    parent_layout.addWidget(view)
+    return proxy, view
+
+
+class MainWindow(QMainWindow):
+    def __init__(self):
+        super().__init__()
+        self.setWindowTitle("Gerenciador de Notificações")
+        self.setGeometry(100, 100, 700, 700)
+        self.dbus_listener = None
+        self.pending_rule = None
+        self.event_bridge = None
+
+        central_widget = QWidget()
+        self.setCentralWidget(central_widget)
+        main_layout = QVBoxLayout(central_widget)
+        main_layout.addWidget(QLabel("Regras de Notificação Ativas:"))
+        self.rule_model = RuleListModel(self)
+        self.rule_proxy, self.rule_view = _filtered_list_view(self.rule_model, "Filtrar regras...", main_layout)
+        self.rule_view.doubleClicked.connect(self.edit_rule)
+        button_layout = QHBoxLayout()
+        main_layout.addLayout(button_layout)
+        btn_add = QPushButton("Adicionar")
+        btn_add.clicked.connect(self.add_rule)
+        btn_edit = QPushButton("Editar")
+        btn_edit.clicked.connect(self.edit_rule)
+        btn_remove = QPushButton("Remover")
+        btn_remove.clicked.connect(self.remove_rule)
+        btn_limits = QPushButton("Limites de Envio")
+        btn_limits.clicked.connect(self.edit_rate_limits)
+        button_layout.addWidget(btn_add)
+        button_layout.addWidget(btn_edit)
+        button_layout.addWidget(btn_remove)
+        button_layout.addWidget(btn_limits)
+
+        main_layout.addWidget(QLabel("Aplicativos Ignorados:"))
+        self.ignore_model = IgnoreListModel(self)
+        self.ignore_proxy, self.ignore_view = _filtered_list_view(self.ignore_model, "Filtrar aplicativos...", main_layout)
+        ignore_button_layout = QHBoxLayout()
+        main_layout.addLayout(ignore_button_layout)
+        btn_ignore_add = QPushButton("Adicionar Ignorado")
+        btn_ignore_add.clicked.connect(self.add_ignored_app)
+        btn_ignore_remove = QPushButton("Remover Ignorado")
+        btn_ignore_remove.clicked.connect(self.remove_ignored_app)
+        ignore_button_layout.addWidget(btn_ignore_add)
+        ignore_button_layout.addWidget(btn_ignore_remove)
+
+        main_layout.addWidget(QLabel("Histórico Recente:"))
+        self.history_model = HistoryListModel(self)
+        self.history_proxy, self.history_view = _filtered_list_view(self.history_model, "Filtrar histórico...", main_layout)
+        self.history_timer = QTimer(self)
+        self.history_timer.timeout.connect(self.history_model.poll)
+        self.history_timer.start(1000)
+
+        main_layout.addWidget(QLabel("Regra Pendente da Extensão:"))
+        self.pending_label = QLabel("Nenhuma regra pendente.")
+        self.pending_label.setWordWrap(True)
+        main_layout.addWidget(self.pending_label)
+        pending_button_layout = QHBoxLayout()
+        main_layout.addLayout(pending_button_layout)
+        self.btn_apply_pending = QPushButton("Aplicar Regra Pendente")
+        self.btn_apply_pending.clicked.connect(self.apply_pending_rule)
+        self.btn_discard_pending = QPushButton("Descartar Regra Pendente")
+        self.btn_discard_pending.clicked.connect(self.discard_pending_rule)
+        pending_button_layout.addWidget(self.btn_apply_pending)
+        pending_button_layout.addWidget(self.btn_discard_pending)
+        self.btn_apply_pending.setEnabled(False)
+        self.btn_discard_pending.setEnabled(False)
+
+        self.load_rules()
+        self.load_ignore_list()
+        self.setup_dbus()
+        self.event_bridge = QtEventBridge(self)
+        self.event_bridge.event_received.connect(self.on_bus_event, Qt.ConnectionType.QueuedConnection)
+        self.check_pending_rule()
+
+    def on_bus_event(self, event):
+        if event.type in (EVENT_PENDING_RULE_SET, EVENT_PENDING_RULE_CLEARED):
+            self.check_pending_rule()
+        elif event.type == EVENT_NOTIFICATION_RECEIVED:
+            self.statusBar().showMessage(f"Recebido: {event.payload.get('message', '')[:120]}", 5000)
+        elif event.type == EVENT_DELIVERY_FAILED:
+            suffix = " (guardada no spool)" if event.payload.get("spooled") else ""
+            self.statusBar().showMessage(f"Falha na entrega{suffix}: {event.payload.get('message', '')[:100]}", 10000)
+        elif event.type == EVENT_IGNORE_LIST_CHANGED:
+            # Só relê core.IGNORED_APPS: chamar load_ignore_list aqui emitiria o evento de novo.
+            # Salvamentos feitos pela própria GUI viram edições incrementais; só
+            # uma recarga do disco reseta o modelo.
+            self.refresh_ignore_list(reset=(event.payload or {}).get("reloaded", True))
+
+    def load_ignore_list(self):
+        load_ignored_apps_from_disk()
+        self.refresh_ignore_list()
+
+    def setup_dbus(self):
+        print("▶️ Iniciando listener de DBus...")
+        self.dbus_listener = DBusNotificationListener(handle_dbus_notification)
+        self.dbus_listener.start()
+        if not self.dbus_listener.wait_until_ready():
+            print("❌ Listener DBus não pôde ser iniciado.")
+
+    def refresh_rule_list(self):
+        self.rule_model.set_rules(RULE_STORE.rules())
+
+    def refresh_ignore_list(self, reset=True):
+        if reset:
+            self.ignore_model.set_names(core.IGNORED_APPS)
+        else:
+            self.ignore_model.sync_names(core.IGNORED_APPS)
+
+    def _current_source_row(self, view, proxy):
+        index = view.currentIndex()
+        if not index.isValid():
+            return -1
+        return proxy.mapToSource(index).row()
+
+    def _format_pending_rule_summary(self, rule):
+        name = rule.get("name", "Sem nome")
+        condition = rule.get("condition", rule.get("type", "element"))
+        selector = rule.get("selector") or rule.get("css_selector") or ""
+        snippet = rule.get("text_snapshot") or rule.get("baseline_text") or ""
+        url_info = rule.get("url_contains") or rule.get("page_url") or ""
+
+        def shorten(text, limit=80):
+            text = str(text)
+            return text if len(text) <= limit else text[: limit - 1] + "…"
+
+        parts = [
+            f"{name}",
+            f"condição: {condition}",
+        ]
+        if selector:
+            parts.append(f"alvo: {shorten(selector)}")
+        if snippet:
+            parts.append(f"texto: {shorten(snippet)}")
+        if url_info:
+            parts.append(f"url: {shorten(url_info)}")
+        return "Regra pendente → " + " | ".join(parts)
+
+    def _normalize_rule(self, rule):
+        if not isinstance(rule, dict):
+            return {}
+        condition = rule.get("condition") or rule.get("type", "element")
+        rule["condition"] = condition
+        if condition not in TEXT_MATCH_CONDITIONS and condition != "element_text":
+            rule.pop("baseline_text", None)
+        if condition not in TEXT_LENGTH_CONDITIONS:
+            rule.pop("length_threshold", None)
+        return rule
+
+    def check_pending_rule(self):
+        pending = read_pending_rule()
+        if not pending:
+            if self.pending_rule:
+                self.pending_rule = None
+                self.pending_label.setText("Nenhuma regra pendente.")
+                self.btn_apply_pending.setEnabled(False)
+                self.btn_discard_pending.setEnabled(False)
+            return
+        if self.pending_rule != pending:
+            self.pending_rule = pending
+            self.pending_label.setText(self._format_pending_rule_summary(pending))
+        self.btn_apply_pending.setEnabled(True)
+        self.btn_discard_pending.setEnabled(True)
+
+    def load_rules(self):
+        self.refresh_rule_list()
+
+    def apply_pending_rule(self):
+        pending = self.pending_rule or read_pending_rule()
+        if not pending:
+            return
+        dialog = RuleDialog(self, rule=pending)
+        if dialog.exec() == QDialog.DialogCode.Accepted:
+            new_rule = self._normalize_rule(dialog.get_data())
+            self.rule_model.append_rule(RULE_STORE.add(new_rule))
+            clear_pending_rule()
+            self.pending_rule = None
+            self.pending_label.setText("Nenhuma regra pendente.")
+            self.btn_apply_pending.setEnabled(False)
+            self.btn_discard_pending.setEnabled(False)
+            print("✅ Regra pendente aplicada.")
+        else:
+            print("ℹ️ Regra pendente mantida para revisão posterior.")
+
+    def discard_pending_rule(self):
+        clear_pending_rule()
+        self.pending_rule = None
+        self.pending_label.setText("Nenhuma regra pendente.")
+        self.btn_apply_pending.setEnabled(False)
+        self.btn_discard_pending.setEnabled(False)
+        print("🗑️ Regra pendente descartada pelo usuário.")
+
+    def add_rule(self):
+        dialog = RuleDialog(self)
+        if dialog.exec() == QDialog.DialogCode.Accepted:
+            new_rule = self._normalize_rule(dialog.get_data())
+            self.rule_model.append_rule(RULE_STORE.add(new_rule))
+            print("Nova regra adicionada.")
+
+    def edit_rule(self):
+        current_row = self._current_source_row(self.rule_view, self.rule_proxy)
+        if current_row == -1:
+            return
+        rule_to_edit = self.rule_model.rule_at(current_row)
+        dialog = RuleDialog(self, rule=rule_to_edit)
+        if dialog.exec() == QDialog.DialogCode.Accepted:
+            updated_rule = self._normalize_rule(dialog.get_data())
+            stored = RULE_STORE.update(rule_to_edit["id"], updated_rule)
+            if stored is None:
+                stored = RULE_STORE.add(updated_rule)
+            self.rule_model.replace_rule(current_row, stored)
+            print(f"Regra {current_row + 1} atualizada.")
+
+    def remove_rule(self):
+        current_row = self._current_source_row(self.rule_view, self.rule_proxy)
+        if current_row == -1:
+            return
+        removed = self.rule_model.remove_rule(current_row)
+        RULE_STORE.remove(removed["id"])
+        print(f"Regra {current_row + 1} removida.")
+
+    def edit_rate_limits(self):
+        dialog = RateLimitDialog(self, RATE_LIMITER.limits)
+        if dialog.exec() == QDialog.DialogCode.Accepted:
+            limits = normalize_rate_limits(dialog.get_limits())
+            RATE_LIMITER.configure(limits)
+            RULE_STORE.save_setting("rate_limits", limits)
+            print("⏳ Limites de envio atualizados.")
+
+    def add_ignored_app(self):
+        name, ok = QInputDialog.getText(self, "Adicionar aplicativo ignorado", "Nome do aplicativo:")
+        if not ok:
+            return
+        cleaned = name.strip()
+        if not cleaned:
+            return
+        if cleaned in core.IGNORED_APPS:
+            print(f"ℹ️ '{cleaned}' já está na lista de ignorados.")
+            return
+        core.IGNORED_APPS.add(cleaned)
+        save_ignored_apps_to_disk()
+        self.ignore_model.add_name(cleaned)
+        print(f"Aplicativo '{cleaned}' adicionado à lista de ignorados.")
+
+    def remove_ignored_app(self):
+        current_row = self._current_source_row(self.ignore_view, self.ignore_proxy)
+        if current_row == -1:
+            return
+        name = self.ignore_model.name_at(current_row)
+        if name in core.IGNORED_APPS:
+            core.IGNORED_APPS.remove(name)
+            save_ignored_apps_to_disk()
+            self.ignore_model.remove_name(name)
+            print(f"Aplicativo '{name}' removido da lista de ignorados.")
+
+    def closeEvent(self, event):
+        HTTP_SERVER.shutdown()
+        if self.dbus_listener:
+            self.dbus_listener.stop()
+        if self.event_bridge:
+            self.event_bridge.close()
+        stop_services()
+        super().closeEvent(event)
+
+def start_gui():
+    app_qt = QApplication(sys.argv)
+    window = MainWindow()
+    window.show()
+    sys.exit(app_qt.exec())
@@ -0,0 +1,91 @@
+"""Decodificação e recompressão de capturas, isoladas do resto do app.
+
+Módulo folha: só a biblioteca padrão (e Pillow, se houver) no import, sem
+ler config nem criar estado. É o alvo do pool de processos do
+ScreenshotProcessor, então um worker "spawn" não paga a inicialização do
+app.py para recomprimir uma imagem.
+"""
+import base64
+import io
+
+
+def decode_screenshot(raw, default_mime='image/png'):
+    """Converte a captura recebida (data URL, base64 ou bytes) em bytes + MIME."""
+    if not raw:
+        return None, default_mime
+    if isinstance(raw, (bytes, bytearray)):
+        return bytes(raw), default_mime
+    screenshot_mime = default_mime
+    try:
+        if raw.startswith('data:image'):
+            header, raw = raw.split(',', 1)
+            try:
+                screenshot_mime = header.split(';')[0].split(':', 1)[1] or screenshot_mime
+            except (IndexError, ValueError):
+                screenshot_mime = default_mime
+        return base64.b64decode(raw), screenshot_mime
+    except Exception as exc:
+        print(f"⚠️ Falha ao decodificar screenshot: {exc}")
+        return None, default_mime
+
+
+def sniff_image_mime(data, default='image/png'):
+    if data[:3] == b"\xff\xd8\xff":
+        return 'image/jpeg'
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return 'image/png'
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return 'image/webp'
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return 'image/gif'
+    return default
+
+
+def _difference_hash(image):
+    """dHash de 64 bits: resiste a recompressão e pequenas mudanças de escala."""
+    pixels = list(image.convert("L").resize((9, 8)).getdata())
+    value = 0
+    for row in range(8):
+        for column in range(8):
+            left = pixels[row * 9 + column]
+            right = pixels[row * 9 + column + 1]
+            value = (value << 1) | (1 if left > right else 0)
+    return value
+
+
+def process_screenshot(raw, max_dimension=1600, max_bytes=600 * 1024, quality=80):
+    """Decodifica, reduz e recodifica a captura. Roda no pool de processos.
+
+    Devolve (bytes, mime, phash); phash é None sem Pillow.
+    """
+    data, mime = decode_screenshot(raw)
+    if not data:
+        return None, mime, None
+    mime = sniff_image_mime(data, mime)
+    try:
+        from PIL import Image
+    except ImportError:
+        if len(data) > max_bytes:
+            print(f"⚠️ Captura de {len(data)} bytes acima do limite e Pillow indisponível; descartada.")
+            return None, mime, None
+        return data, mime, None
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            phash = _difference_hash(image)
+            if max(image.size) <= max_dimension and len(data) <= max_bytes:
+                return data, mime, phash
+            image = image.convert("RGB")
+            image.thumbnail((max_dimension, max_dimension))
+            while True:
+                buffer = io.BytesIO()
+                image.save(buffer, "JPEG", quality=quality, optimize=True)
+                if buffer.tell() <= max_bytes or max(image.size) <= 64:
+                    return buffer.getvalue(), 'image/jpeg', phash
+                if quality > 40:
+                    quality = max(40, quality - 15)
+                else:
+                    width, height = image.size
+                    image = image.resize((max(1, int(width * 0.75)), max(1, int(height * 0.75))))
+    except Exception as exc:
+        print(f"⚠️ Falha ao processar screenshot: {exc}")
+        return (data, mime, None) if len(data) <= max_bytes else (None, mime, None)
@@ -0,0 +1,80 @@
+"""Apoio aos testes: diretório de trabalho isolado com notify-watcher/config.json próprio.
+
+Rodar da pasta notify-watcher: python -m unittest discover -s tests
+"""
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TEST_CONFIG = {
+    # Porta fechada: entregas falham na hora, sem sair da máquina.
+    "ntfy_base_url": "http://127.0.0.1:9",
+    "ntfy_max_retries": 0,
+    "spool_enabled": False,
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def make_workdir(config=None):
+    workdir = tempfile.mkdtemp(prefix="notify-test-")
+    os.makedirs(os.path.join(workdir, "notify-watcher"))
+    with open(os.path.join(workdir, "notify-watcher", "config.json"), "w") as f:
+        json.dump({**TEST_CONFIG, **(config or {})}, f)
+    return workdir
+
+
+def import_app(config=None):
+    """Importa app.py com um config isolado; vale para o processo todo."""
+    if "app" not in sys.modules:
+        os.chdir(make_workdir(config))
+        if APP_DIR not in sys.path:
+            sys.path.insert(0, APP_DIR)
+    import app
+
+    return app
+
+
+def start_server(config=None, timeout=30.0):
+    """Sobe app.py --headless num subprocesso; devolve (processo, url base)."""
+    port = free_port()
+    workdir = make_workdir({"server_port": port, **(config or {})})
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(APP_DIR, "app.py"), "--headless"],
+        cwd=workdir,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"app.py encerrou na partida (código {process.returncode})")
+        try:
+            requests.get(f"{base_url}/delivery/stats", timeout=1.0)
+            return process, base_url
+        except requests.RequestException:
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError("app.py não ficou pronto a tempo")
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
@@ -0,0 +1,75 @@
+import unittest
+
+import requests
+
+from support import import_app, start_server, stop_server
+
+SERVER_THREADS = 6
+
+
+class ConfigStreamLimitTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.process, cls.base_url = start_server({"server_mode": "waitress", "server_threads": SERVER_THREADS})
+
+    @classmethod
+    def tearDownClass(cls):
+        stop_server(cls.process)
+
+    def test_notify_answers_with_more_streams_than_threads(self):
+        sessions = []
+        statuses = []
+        try:
+            for _ in range(SERVER_THREADS * 2):
+                session = requests.Session()
+                sessions.append(session)
+                response = session.get(f"{self.base_url}/config/stream", stream=True, timeout=5)
+                statuses.append(response.status_code)
+
+            self.assertIn(200, statuses)
+            self.assertIn(503, statuses)
+            self.assertLess(statuses.count(200), SERVER_THREADS)
+
+            response = requests.post(
+                f"{self.base_url}/notify",
+                json={"app": "Teste", "text": "ainda respondendo"},
+                timeout=5,
+            )
+            self.assertEqual(response.status_code, 202)
+            self.assertEqual(requests.get(f"{self.base_url}/config", timeout=5).status_code, 200)
+        finally:
+            for session in sessions:
+                session.close()
+
+    def test_rejected_stream_tells_client_when_to_retry(self):
+        sessions = [requests.Session() for _ in range(SERVER_THREADS)]
+        try:
+            responses = [s.get(f"{self.base_url}/config/stream", stream=True, timeout=5) for s in sessions]
+            rejected = [r for r in responses if r.status_code == 503]
+            self.assertTrue(rejected)
+            self.assertIn("Retry-After", rejected[0].headers)
+            self.assertTrue(rejected[0].text.startswith("retry: "))
+        finally:
+            for session in sessions:
+                session.close()
+
+
+class ConfigStreamEtagTest(unittest.TestCase):
+    def test_config_exposes_the_etag_the_stream_announces(self):
+        app = import_app()
+        client = app.app_flask.test_client()
+        response = client.get("/config", query_string={"url": "https://exemplo.com/"})
+        stream_etag = app.CONFIG_CACHE.get().etag
+        # O ETag HTTP é qualificado pela URL; o do stream não.
+        self.assertNotEqual(response.headers["ETag"], f'"{stream_etag}"')
+        self.assertEqual(response.headers["X-Config-Etag"], stream_etag)
+
+        cached = client.get(
+            "/config", query_string={"url": "https://exemplo.com/"},
+            headers={"If-None-Match": response.headers["ETag"]},
+        )
+        self.assertEqual((cached.status_code, cached.headers["X-Config-Etag"]), (304, stream_etag))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,36 @@
+import unittest
+from unittest import mock
+
+from support import import_app
+
+app = import_app()
+
+LIMITS = {"action": "drop", "app": {"per_minute": 1, "burst": 1}, "rule": {"per_minute": 0}, "topic": {"per_minute": 0}}
+
+
+class DedupeAfterRateLimitTest(unittest.TestCase):
+    def setUp(self):
+        self.limiter = app.RateLimiter(LIMITS)
+        for name, value in (("RATE_LIMITER", self.limiter), ("DEDUPE", app.DedupeEngine({"http": 60.0}))):
+            patcher = mock.patch.object(app, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.client = app.app_flask.test_client()
+
+    def _post(self, text):
+        return self.client.post("/notify", json={"app": "Dedupe", "text": text})
+
+    def test_retry_after_429_is_not_a_duplicate(self):
+        self.assertEqual(self._post("primeira").status_code, 202)
+        self.assertEqual(self._post("segunda").status_code, 429)
+        # O reenvio ainda limitado volta a receber 429, e não 200 "duplicate".
+        self.assertEqual(self._post("segunda").status_code, 429)
+
+        self.limiter._buckets[("app", "Dedupe")].tokens = 1.0
+        response = self._post("segunda")
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(self._post("segunda").get_json()["status"], "duplicate")
+
+
+if __name__ == "__main__":
+    unittest.main()
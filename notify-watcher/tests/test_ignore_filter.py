@@ -0,0 +1,48 @@
+import unittest
+
+from support import import_app
+
+app = import_app()
+
+
+def regex(pattern, field="body", **extra):
+    return {"field": field, "match": "regex", "pattern": pattern, **extra}
+
+
+class IgnoreFilterTest(unittest.TestCase):
+    def test_global_flag_not_at_start_of_combination(self):
+        ignore = app.IgnoreFilter([regex("^ok$"), regex("(?i)is typing")])
+        self.assertEqual(ignore.match("body", "Ana IS TYPING..."), 1)
+        self.assertEqual(ignore.match("body", "ok"), 0)
+        # O flag continua restrito ao próprio padrão.
+        self.assertIsNone(ignore.match("body", "OK"))
+
+    def test_verbose_flag_with_trailing_comment(self):
+        ignore = app.IgnoreFilter([regex("x"), regex("(?x) digitando  # indicador de digitação")])
+        self.assertEqual(ignore.match("body", "está digitando"), 1)
+
+    def test_numbered_backreference(self):
+        ignore = app.IgnoreFilter([regex("spam"), regex(r"(a)\1"), regex("promo")])
+        self.assertEqual(ignore.match("body", "xaay"), 1)
+        self.assertEqual(ignore.match("body", "promo"), 2)
+        self.assertIsNone(ignore.match("body", "ab"))
+
+    def test_group_named_like_an_internal_wrapper(self):
+        ignore = app.IgnoreFilter([regex("(?P<p1>foo)"), regex("(?P<p0>bar)"), regex("baz")])
+        self.assertEqual(ignore.match("body", "bar"), 1)
+        self.assertEqual(ignore.match("body", "foo"), 0)
+        self.assertEqual(ignore.match("body", "baz"), 2)
+
+    def test_duplicate_group_names_fall_back_to_single_patterns(self):
+        ignore = app.IgnoreFilter([regex("(?P<x>foo)"), regex("(?P<x>bar)")])
+        self.assertEqual(ignore.match("body", "bar"), 1)
+        self.assertEqual(ignore.match("body", "foo"), 0)
+
+    def test_invalid_pattern_is_skipped(self):
+        ignore = app.IgnoreFilter([regex("(unclosed"), regex("ok")])
+        self.assertEqual(len(ignore.patterns), 1)
+        self.assertEqual(ignore.match("body", "ok"), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+from unittest import mock
+
+from support import import_app
+
+app = import_app()
+
+
+class NotifyValidationTest(unittest.TestCase):
+    def setUp(self):
+        self.client = app.app_flask.test_client()
+
+    def test_non_string_fields_are_rejected(self):
+        for payload, field in (
+            ({"app": ["x"], "text": "oi"}, "app"),
+            ({"app": "Teste", "text": {"a": 1}}, "text"),
+            ({"app": "Teste", "text": "oi", "rule": "nome"}, "rule"),
+            ({"app": "Teste", "text": "oi", "rule": {"name": ["x"]}}, "rule.name"),
+            ({"app": "Teste", "text": "oi", "screenshot": 42}, "screenshot"),
+            ({"app": "Teste", "text": "oi", "screenshot": ["x"]}, "screenshot"),
+        ):
+            with self.subTest(field=field):
+                response = self.client.post("/notify", json=payload)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.get_json()["field"], field)
+
+    def test_batch_reports_invalid_items_and_keeps_going(self):
+        response = self.client.post("/notify/batch", json=[
+            {"app": ["x"], "text": "oi"},
+            {"app": "Lote", "text": "válido"},
+        ])
+        self.assertEqual(response.status_code, 200)
+        results = response.get_json()["results"]
+        self.assertEqual((results[0]["status"], results[0]["field"]), ("error", "app"))
+        self.assertNotEqual(results[1]["status"], "error")
+
+    def test_batch_rejects_non_string_screenshots(self):
+        response = self.client.post("/notify/batch", json={"items": [{"app": "Lote", "text": "oi"}], "screenshot": 1})
+        self.assertEqual((response.status_code, response.get_json()["field"]), (400, "screenshot"))
+
+        response = self.client.post("/notify/batch", json=[{"app": "Lote", "text": "oi", "screenshot": {"a": 1}}])
+        result = response.get_json()["results"][0]
+        self.assertEqual((result["status"], result["field"]), ("error", "screenshot"))
+
+
+class RateLimiterBucketsTest(unittest.TestCase):
+    def test_buckets_are_a_bounded_lru(self):
+        limiter = app.RateLimiter({"app": {"per_minute": 60, "burst": 1}, "rule": {"per_minute": 0}, "topic": {"per_minute": 0}})
+        with mock.patch.object(app.RateLimiter, "MAX_BUCKETS", 3):
+            for name in ("a", "b", "c"):
+                limiter.check(name)
+            # "a" está sem ficha e foi usado por último: não pode ser o despejado.
+            self.assertEqual(limiter.check("a")[1], "app")
+            limiter.check("d")
+            self.assertEqual(list(limiter._buckets), [("app", "c"), ("app", "a"), ("app", "d")])
+            for name in "efgh":
+                limiter.check(name)
+            self.assertEqual(len(limiter._buckets), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
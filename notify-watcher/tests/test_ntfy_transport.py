@@ -0,0 +1,43 @@
+import unittest
+
+import requests
+
+from support import import_app
+
+app = import_app()
+
+
+class InvalidHeaderSession:
+    def request(self, *args, **kwargs):
+        raise requests.exceptions.InvalidHeader("cabeçalho inválido")
+
+
+class HalfOpenProbeTest(unittest.TestCase):
+    def test_invalid_request_releases_the_probe(self):
+        breaker = app.CircuitBreaker(threshold=1, cooldown=0.0)
+        breaker.record_failure()
+        transport = app.NtfyTransport(base_url="http://ntfy.invalid", breaker=breaker)
+        transport._session = InvalidHeaderSession()
+
+        with self.assertRaises(app.NtfyRejectedError):
+            transport.publish("topico")
+        # A sondagem terminou: a próxima tentativa não fica barrada para sempre.
+        self.assertFalse(breaker._probing)
+        self.assertTrue(breaker.allow())
+
+
+class ScreenshotContentTypeTest(unittest.TestCase):
+    def test_only_known_image_types_pass_through(self):
+        for mime, expected in (
+            ("image/png", "image/png"),
+            ("IMAGE/JPG", "image/jpeg"),
+            ("image/gif", "image/gif"),
+            ("text/html", "application/octet-stream"),
+            ("image/png\r\nX-Injetado: 1", "application/octet-stream"),
+        ):
+            with self.subTest(mime=mime):
+                self.assertEqual(app.screenshot_content_type(mime), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
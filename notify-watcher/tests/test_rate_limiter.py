@@ -0,0 +1,39 @@
+import unittest
+from unittest import mock
+
+from support import import_app
+
+app = import_app()
+
+LIMITS = {"app": {"per_minute": 0}, "rule": {"per_minute": 0}, "topic": {"per_minute": 1, "burst": 10}}
+
+
+class TopicChargeTest(unittest.TestCase):
+    def setUp(self):
+        self.limiter = app.RateLimiter(LIMITS, topic="teste")
+        patcher = mock.patch.object(app, "RATE_LIMITER", self.limiter)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _topic_tokens(self):
+        return self.limiter._buckets[("topic", "teste")].tokens
+
+    def test_admission_only_checks_the_topic(self):
+        for _ in range(20):
+            self.assertEqual(self.limiter.check("Teste"), (0.0, None))
+        self.limiter.charge_topic()
+        self.assertAlmostEqual(self._topic_tokens(), 9.0, places=2)
+
+    def test_folded_events_pay_one_topic_token_per_publish(self):
+        coalescer = app.BurstCoalescer(app.DeliveryQueue(workers=1), window=60.0, max_events=100)
+        for n in range(6):
+            self.limiter.check("Teste")
+            coalescer.add("app:Teste", "Teste", f"mensagem {n}")
+        bucket = coalescer._buckets.pop("app:Teste")
+        coalescer._flush(bucket["label"], bucket["events"])
+        # O primeiro evento saiu sozinho e os outros cinco viraram um resumo.
+        self.assertAlmostEqual(self._topic_tokens(), 8.0, places=2)
+
+
+if __name__ == "__main__":
+    unittest.main()
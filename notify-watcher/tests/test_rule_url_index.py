@@ -0,0 +1,58 @@
+import random
+import unittest
+
+from support import import_app
+
+app = import_app()
+
+PATTERNS = ["a", "ab", "t", "x", "ab@a", "Example.com", "example", "com/", "8080", "b@", "/x", "a/"]
+
+URLS = [
+    "https://ab@a/",
+    "http://t/x",
+    "http://user:pw@t:8080/a?x=ab",
+    "https://Example.COM/example/com/",
+    "https://a.example.com:443/ab",
+    "http://[::1]:8080/t",
+    "https://x/",
+    "file:///tmp/a/x",
+]
+
+
+class FixedStore:
+    revision = 1
+
+    def __init__(self, rules):
+        self.rules = rules
+
+    def snapshot(self):
+        return self.revision, self.rules
+
+
+class RuleUrlIndexTest(unittest.TestCase):
+    def _check(self, patterns, urls):
+        rules = [{"name": f"r{n}", "url_contains": pattern} for n, pattern in enumerate(patterns)]
+        index = app.RuleUrlIndex(FixedStore(rules))
+        for url in urls:
+            with self.subTest(url=url):
+                expected = [rule["name"] for rule in rules if rule["url_contains"] in url]
+                # Duas vezes: a segunda passa pelo cache de hosts.
+                for _ in range(2):
+                    _, matched = index.match(url)
+                    self.assertEqual([rule["name"] for rule in matched], expected)
+
+    def test_matches_brute_force_substring(self):
+        self._check(PATTERNS, URLS)
+
+    def test_matches_brute_force_on_random_urls(self):
+        rng = random.Random(17)
+        alphabet = "abt.@:/"
+        urls = [
+            f"{rng.choice(['http', 'https'])}://" + "".join(rng.choice(alphabet) for _ in range(rng.randint(1, 12)))
+            for _ in range(300)
+        ]
+        self._check(PATTERNS, urls)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+from support import APP_DIR, import_app, make_workdir
+
+app = import_app()
+
+# Roda como script (com __file__), que é o caso em que o spawn reimporta o __main__.
+PROBE = """
+import json, sys
+sys.path.insert(0, {app_dir!r})
+import app
+
+if __name__ == "__main__":
+    processor = app.ScreenshotProcessor(workers=1)
+    processor.process(b"nao e imagem")
+    modules = processor._executor.submit(eval, "sorted(__import__('sys').modules)").result()
+    processor.shutdown()
+    print(json.dumps({{"app": "app" in modules, "flask": "flask" in modules, "screenshots": "screenshots" in modules}}))
+"""
+
+
+class ScreenshotWorkerTest(unittest.TestCase):
+    def test_worker_imports_only_the_leaf_module(self):
+        workdir = make_workdir()
+        script = os.path.join(workdir, "probe.py")
+        with open(script, "w") as f:
+            f.write(PROBE.format(app_dir=APP_DIR))
+        output = subprocess.run(
+            [sys.executable, script], cwd=workdir, capture_output=True, text=True, timeout=60, check=True,
+        ).stdout
+        modules = json.loads(output.strip().splitlines()[-1])
+        self.assertEqual(modules, {"app": False, "flask": False, "screenshots": True})
+
+
+class FixedProcessor:
+    def process(self, raw):
+        return b"imagem", "image/png", 0
+
+
+class ScreenshotCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = app.ScreenshotCache(FixedProcessor(), window=300.0)
+
+    def test_failed_send_does_not_suppress_the_retry(self):
+        data, _, receipt = self.cache.prepare(b"raw", rule_key="Regra")
+        self.assertEqual(data, b"imagem")
+        # O envio falhou: nada de commit, e o reenvio ainda leva o anexo.
+        data, _, receipt = self.cache.prepare(b"raw", rule_key="Regra")
+        self.assertEqual(data, b"imagem")
+
+        self.cache.commit(receipt)
+        data, _, receipt = self.cache.prepare(b"raw", rule_key="Regra")
+        self.assertIsNone(data)
+        self.assertIsNone(receipt)
+
+
+if __name__ == "__main__":
+    unittest.main()
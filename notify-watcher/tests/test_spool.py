@@ -0,0 +1,131 @@
+import os
+import tempfile
+import unittest
+
+from support import import_app
+
+app = import_app()
+
+
+def open_spool(directory):
+    spool = app.DeliverySpool(
+        path=os.path.join(directory, "spool.db"),
+        blob_dir=os.path.join(directory, "blobs"),
+        max_age=60.0,
+    )
+    spool.open()
+    return spool
+
+
+class DeliverySpoolDeadLetterTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp(prefix="notify-spool-")
+        self.spool = open_spool(directory)
+        self.addCleanup(self.spool.close)
+
+    def _spool_failed(self, *messages):
+        jobs = [app.DeliveryJob(message) for message in messages]
+        for job in jobs:
+            self.spool.append(job)
+            self.spool.mark_failed(job.event_id)
+        return jobs
+
+    def test_rejected_head_does_not_block_queue(self):
+        rejected, ok = self._spool_failed("recusada", "entregue")
+        outcomes = {rejected.event_id: app.DELIVERY_REJECTED, ok.event_id: app.DELIVERY_DELIVERED}
+        calls = []
+
+        def deliver(job):
+            calls.append(job.event_id)
+            return outcomes[job.event_id]
+
+        self.assertEqual(self.spool._replay_once(deliver), 1)
+        self.assertEqual(calls, [rejected.event_id, ok.event_id])
+        stats = self.spool.snapshot()
+        self.assertEqual((stats["pending"], stats["dead"], stats["dead_lettered"]), (0, 1, 1))
+
+        # Entradas mortas não são reenviadas.
+        calls.clear()
+        self.assertEqual(self.spool._replay_once(deliver), 0)
+        self.assertEqual(calls, [])
+
+    def test_transient_failures_never_dead_letter_a_young_entry(self):
+        stuck, behind = self._spool_failed("sempre falha", "atrás")
+
+        def deliver(job):
+            return app.DELIVERY_FAILED if job.event_id == stuck.event_id else app.DELIVERY_DELIVERED
+
+        # Circuito aberto ou ntfy fora do ar: quantas rodadas forem, a ordem é mantida.
+        for _ in range(20):
+            self.assertEqual(self.spool._replay_once(deliver), 0)
+        stats = self.spool.snapshot()
+        self.assertEqual((stats["pending"], stats["dead"]), (2, 0))
+
+    def test_failing_head_is_dead_lettered_after_max_age(self):
+        stuck, behind = self._spool_failed("sempre falha", "atrás")
+        with self.spool._lock:
+            self.spool._conn.execute(
+                "UPDATE outbox SET created_at = created_at - 120 WHERE event_id = ?", (stuck.event_id,)
+            )
+
+        def deliver(job):
+            return app.DELIVERY_FAILED if job.event_id == stuck.event_id else app.DELIVERY_DELIVERED
+
+        # Passou de max_age: vai para o dead-letter e libera quem estava atrás.
+        self.assertEqual(self.spool._replay_once(deliver), 1)
+        stats = self.spool.snapshot()
+        self.assertEqual((stats["pending"], stats["dead"]), (0, 1))
+
+    def test_replay_updates_history(self):
+        delivered, rejected = self._spool_failed("reenviada", "recusada")
+        for job in (delivered, rejected):
+            app.HISTORY.record("http", "Teste", "received", event_id=job.event_id, summary=job.message)
+            app.HISTORY.complete(job.event_id, "failed", job.created_at)
+
+        def deliver(job):
+            return app.DELIVERY_DELIVERED if job.event_id == delivered.event_id else app.DELIVERY_REJECTED
+
+        self.spool._replay_once(deliver)
+        self.assertEqual(app.HISTORY._by_event[delivered.event_id].status, "delivered")
+        self.assertEqual(app.HISTORY._by_event[rejected.event_id].status, "rejected")
+
+
+class CoalescerSpoolTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="notify-spool-")
+        self.spool = open_spool(self.directory)
+        self.addCleanup(self.spool.close)
+        # Fila sem workers: os jobs ficam parados em memória, como num pico.
+        self.queue = app.DeliveryQueue(workers=1, spool=self.spool)
+        self.coalescer = app.BurstCoalescer(self.queue, window=60.0, max_events=100)
+
+    def _add(self, count):
+        return [self.coalescer.add("app:Teste", "Teste", f"mensagem {n}", source="http") for n in range(count)]
+
+    def test_coalesced_events_are_retained_until_the_digest(self):
+        self._add(3)
+        stats = self.spool.snapshot()
+        self.assertEqual((stats["pending"], stats["retained"]), (1, 2))
+
+        bucket = self.coalescer._buckets.pop("app:Teste")
+        self.coalescer._flush(bucket["label"], bucket["events"])
+        stats = self.spool.snapshot()
+        # O resumo substitui as duas entradas retidas por uma só.
+        self.assertEqual((stats["pending"], stats["retained"]), (2, 0))
+
+    def test_retained_events_survive_a_restart(self):
+        self._add(3)
+        self.spool.close()
+
+        replayed = []
+        reopened = open_spool(self.directory)
+        try:
+            self.assertEqual(reopened.snapshot()["pending"], 3)
+            reopened._replay_once(lambda job: replayed.append(job.message) or app.DELIVERY_DELIVERED)
+        finally:
+            reopened.close()
+        self.assertEqual(replayed, ["mensagem 0", "mensagem 1", "mensagem 2"])
+
+
+if __name__ == "__main__":
+    unittest.main()
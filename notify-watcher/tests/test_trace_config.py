@@ -0,0 +1,40 @@
+import json
+import unittest
+
+from support import import_app
+
+app = import_app()
+
+
+class TraceConfigReloadTest(unittest.TestCase):
+    def setUp(self):
+        with open(app.CONFIG_FILE) as f:
+            self.original = f.read()
+        state = (app.TRACER.enabled, app.TRACER.sample_rate, app._applied_trace_config)
+        self.addCleanup(self._restore, state)
+
+    def _restore(self, state):
+        with open(app.CONFIG_FILE, "w") as f:
+            f.write(self.original)
+        app.TRACER.enabled, app.TRACER.sample_rate, app._applied_trace_config = state
+
+    def _write_config(self, **changes):
+        config = {**json.loads(self.original), **changes}
+        with open(app.CONFIG_FILE, "w") as f:
+            json.dump(config, f)
+
+    def test_unrelated_change_keeps_runtime_trace_settings(self):
+        app.TRACER.configure(enabled=True, sample_rate=1.0)
+        self._write_config(rate_limits={"app": {"per_minute": 5}})
+        app.apply_config_file()
+        self.assertEqual((app.TRACER.enabled, app.TRACER.sample_rate), (True, 1.0))
+
+    def test_changed_trace_keys_are_applied(self):
+        app.TRACER.configure(enabled=True, sample_rate=1.0)
+        self._write_config(trace_enabled=False, trace_sample_rate=0.25)
+        app.apply_config_file()
+        self.assertEqual((app.TRACER.enabled, app.TRACER.sample_rate), (False, 0.25))
+
+
+if __name__ == "__main__":
+    unittest.main()